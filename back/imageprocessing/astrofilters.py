@@ -1,12 +1,17 @@
 import numpy as np
 from scipy import ndimage, signal
-from scipy.fft import fft2, ifft2, fftfreq
 from skimage import filters, restoration, exposure, morphology
 from scipy.optimize import curve_fit
 from skimage.filters import gaussian, unsharp_mask
 from skimage.restoration import denoise_wavelet, denoise_bilateral
 import cv2
 import warnings
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+from astropy.io import fits
+from imageprocessing.imagestats import ImageStats, channel_histogram, histogram_percentiles
+from imageprocessing.fftengine import FFTEngine
 
 
 import numpy as np
@@ -18,26 +23,33 @@ Pleiades Astrophoto and its contributors (http://pixinsight.com/).
 """
 
 
+# Bornes de la balance des tons moyens : m == 0 ou 1 donnerait 0/0 en x == 0 ou 1
+MTF_EPSILON = 1e-6
+
+
 class Stretch:
 
+    # Nombre maximal de pixels par canal utilisés pour les statistiques des images flottantes
+    MAX_STAT_SAMPLES = 1 << 20
+
     def __init__(self, target_bkg=0.25, shadows_clip=-2):
         self.shadows_clip = shadows_clip
         self.target_bkg = target_bkg
 
  
-    def _get_avg_dev(self, data):
+    def _get_avg_dev(self, data, median=None):
         """Return the average deviation from the median.
 
         Args:
             data (np.array): array of floats, presumably the image data
+            median (float): median of data, computed if not given
         """
-        median = np.median(data)
-        n = data.size
-        median_deviation = lambda x: abs(x - median)
-        avg_dev = np.sum( median_deviation(data) / n )
-        return avg_dev
+        if median is None:
+            median = np.median(data)
+        return float(np.mean(np.abs(data - median)))
 
-    def _mtf(self, m, x):
+    @staticmethod
+    def _mtf(m, x, out=None):
         """Midtones Transfer Function
 
         MTF(m, x) = {
@@ -50,27 +62,30 @@ class Stretch:
             (2m - 1)x - m
         }
 
+        m is clamped to [MTF_EPSILON, 1 - MTF_EPSILON]: the general expression
+        then gives 0, 1/2 and 1 for the special points and its denominator
+        stays negative on [0, 1], so it is evaluated in a single vectorized
+        expression. Without the clamp, m == 0 (channel median at 0, black
+        background of 8-bit frames) would give 0/0 = NaN for x == 0.
+
         See the section "Midtones Balance" from
         https://pixinsight.com/doc/tools/HistogramTransformation/HistogramTransformation.html
 
         Args:
-            m (float): midtones balance parameter
+            m (float or np.array): midtones balance parameter (broadcastable against x)
                        a value below 0.5 darkens the midtones
                        a value above 0.5 lightens the midtones
-            x (np.array): the data that we want to copy and transform.
-        """
-        shape = x.shape
-        x = x.flatten()
-        zeros = x==0
-        halfs = x==m
-        ones = x==1
-        others = np.logical_xor((x==x), (zeros + halfs + ones))
-
-        x[zeros] = 0
-        x[halfs] = 0.5
-        x[ones] = 1
-        x[others] = (m - 1) * x[others] / ((((2 * m) - 1) * x[others]) - m)
-        return x.reshape(shape)
+            x (np.array): the data that we want to transform, left untouched unless it is `out`.
+            out (np.array): float array receiving the result (may be x itself)
+        """
+        m = np.clip(m, MTF_EPSILON, 1 - MTF_EPSILON)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if out is None:
+                return (m - 1) * x / ((2 * m - 1) * x - m)
+            numerator = x * (m - 1)
+            np.multiply(x, 2 * m - 1, out=out)
+            out -= m
+            return np.divide(numerator, out, out=out)
 
     def _get_stretch_parameters(self, data):
         """ Get the stretch parameters automatically.
@@ -79,10 +94,12 @@ class Stretch:
         c1 (float) is the highlights clipping point
         """
         median = np.median(data)
-        avg_dev = self._get_avg_dev(data)
+        avg_dev = self._get_avg_dev(data, median)
+        return self._parameters_from_stats(median, avg_dev)
 
-        c0 = np.clip(median + (self.shadows_clip * avg_dev), 0, 1)
-        m = self._mtf(self.target_bkg, median - c0)
+    def _parameters_from_stats(self, median, avg_dev):
+        c0 = float(np.clip(median + (self.shadows_clip * avg_dev), 0, 1))
+        m = float(self._mtf(self.target_bkg, median - c0))
 
         return {
             "c0": c0,
@@ -90,35 +107,189 @@ class Stretch:
             "m": m
         }
 
+    def _histogram_stats(self, channel, maximum):
+        """
+        Exact median and average deviation of an integer channel, normalized by `maximum`,
+        computed from a single np.bincount.
+        """
+        hist = np.bincount(channel.ravel(), minlength=maximum + 1)
+        values = np.arange(len(hist), dtype=np.float64) / maximum
+        cdf = np.cumsum(hist)
+        n = cdf[-1]
+        # Comme np.median : moyenne des deux valeurs centrales pour un nombre pair de pixels
+        low = np.searchsorted(cdf, (n - 1) // 2, side='right')
+        high = np.searchsorted(cdf, n // 2, side='right')
+        median = (values[low] + values[high]) / 2
+        avg_dev = float(np.dot(hist, np.abs(values - median)) / n)
+        return median, avg_dev
+
+    def _sampled_stats(self, channel, maximum):
+        """
+        Median and average deviation of a float channel normalized by `maximum`,
+        computed on a regular subsample of at most MAX_STAT_SAMPLES pixels.
+        """
+        step = max(1, int(np.ceil(np.sqrt(channel.size / self.MAX_STAT_SAMPLES))))
+        sample = channel[::step, ::step].astype(np.float32) / maximum
+        median = float(np.median(sample))
+        return median, self._get_avg_dev(sample, median)
+
     def stretch(self, data):
         """ Stretch the image.
 
+        Statistics are computed per channel (exact histogram for 8/16-bit
+        integers, subsample for floats), then the clipping and the MTF are
+        applied to all channels at once: through a lookup table for integer
+        data, as a single float32 expression otherwise.
+
         Args:
-            data (np.array): the original image data array.
+            data (np.array): the original image data array, (H, W) or (H, W, C).
 
         Returns:
-            np.array: the stretched image data
-        """
+            np.array: the stretched image data (float32)
+        """
+        channels = [data] if data.ndim == 2 else [data[:, :, c] for c in range(data.shape[2])]
+        use_lut = data.dtype in (np.uint8, np.uint16)
+
+        maxima, c0s, ms = [], [], []
+        for channel in channels:
+            # Normalize the data by the channel maximum
+            maximum = channel.max()
+            if maximum <= 0:
+                maximum = 1
+            if use_lut:
+                median, avg_dev = self._histogram_stats(channel, int(maximum))
+            else:
+                median, avg_dev = self._sampled_stats(channel, float(maximum))
+
+            # Obtain the stretch parameters
+            stretch_params = self._parameters_from_stats(median, avg_dev)
+            maxima.append(float(maximum))
+            c0s.append(min(stretch_params["c0"], 1 - 1e-6))
+            ms.append(stretch_params["m"])
+
+        maxima = np.array(maxima, dtype=np.float32)
+        c0 = np.array(c0s, dtype=np.float32)
+        m = np.array(ms, dtype=np.float32)
+        if data.ndim == 2:
+            maxima, c0, m = maxima[0], c0[0], m[0]
+
+        if use_lut:
+            result = np.empty(data.shape, dtype=np.float32)
+            outputs = [result] if data.ndim == 2 else [result[:, :, c] for c in range(data.shape[2])]
+            levels = np.arange(np.iinfo(data.dtype).max + 1, dtype=np.float32)
+            for channel, output, maximum, c0_c, m_c in zip(channels, outputs, np.atleast_1d(maxima), np.atleast_1d(c0), np.atleast_1d(m)):
+                lut = np.maximum((levels / maximum - c0_c) / (1 - c0_c), 0)
+                lut = self._mtf(m_c, lut).astype(np.float32)
+                np.take(lut, channel, out=output)
+            return result
 
-        # Normalize the data
-        d = data / np.max(data)
+        # Clip everything below the shadows clipping point, rescale the rest to [0, 1]
+        x = data.astype(np.float32)
+        x *= 1 / (maxima * (1 - c0))
+        x -= c0 / (1 - c0)
+        np.maximum(x, 0, out=x)
 
-        # Obtain the stretch parameters
-        stretch_params = self._get_stretch_parameters(d)
-        m = stretch_params["m"]
-        c0 = stretch_params["c0"]
-        c1 = stretch_params["c1"]
+        # Apply the midtones transfer function in place
+        return self._mtf(m, x, out=x)
 
-        # Selectors for pixels that lie below or above the shadows clipping point
-        below = d < c0
-        above = d >= c0
 
-        # Clip everything below the shadows clipping point
-        d[below] = 0
+# Nombre de copies de la pile de travail (pile, écarts, masque...) par méthode de combinaison
+COMBINE_WORK_COPIES = {'median': 2, 'mean': 2, 'sigma_clip': 4}
 
-        # For the rest of the pixels: apply the midtones transfer function
-        d[above] = self._mtf(m, (d[above] - c0)/(1 - c0))
-        return d
+
+class _CombineSource:
+    """
+    Image à combiner lue par bandes de lignes : tableau numpy, memmap ou
+    chemin d'un fichier .fit/.fits/.npy ouvert en memmap. Les images couleur
+    FITS (C, H, W) sont lues en (H, W, C) comme dans FitsImageManager.
+    
+    Sérialisée vers un autre processus, une source fichier ne transmet que
+    son chemin, une source tableau seulement la bande demandée (for_band).
+    """
+    
+    def __init__(self, image, row_offset=0):
+        self.path = None
+        self.array = None
+        self.row_offset = row_offset
+        self._hdul = None
+        self._data = None
+        self._channel_first = False
+        if isinstance(image, (str, Path)):
+            self.path = str(image)
+            self._open()
+        else:
+            self.array = np.asarray(image)
+            self.shape = self.array.shape
+    
+    def _open(self):
+        if self.path.lower().endswith(".npy"):
+            self._data = np.load(self.path, mmap_mode='r')
+            self.shape = self._data.shape
+            return
+        # Sans memmap, section lit les lignes demandées directement dans le fichier (compatible BZERO/BSCALE)
+        self._hdul = fits.open(self.path, memmap=False)
+        hdu = self._hdul[0]
+        self._data = hdu.section
+        shape = hdu.shape
+        self._channel_first = len(shape) == 3 and shape[0] == 3
+        self.shape = (shape[1], shape[2], shape[0]) if self._channel_first else tuple(shape)
+    
+    def read(self, start, stop):
+        if self.array is not None:
+            return self.array[start - self.row_offset:stop - self.row_offset]
+        if self._data is None:
+            self._open()
+        if self._channel_first:
+            return np.moveaxis(np.asarray(self._data[:, start:stop, :]), 0, -1)
+        return np.asarray(self._data[start:stop])
+    
+    def for_band(self, start, stop):
+        if self.array is None:
+            return self
+        return _CombineSource(np.ascontiguousarray(self.array[start:stop]), row_offset=start)
+    
+    def close(self):
+        if self._hdul is not None:
+            self._hdul.close()
+        self._hdul = None
+        self._data = None
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_hdul'] = None
+        if self.path is not None:
+            state['_data'] = None
+        return state
+
+
+def _combine_band(method, sources, start, stop, weights=None, sigma=None):
+    """
+    Combine les lignes [start, stop[ des images, avec exactement les mêmes
+    opérations que sur la pile complète.
+    """
+    bands = [source.read(start, stop) for source in sources]
+    if method == 'median':
+        return np.median(np.stack(bands, axis=0), axis=0)
+    
+    if method == 'mean':
+        if weights is None:
+            return np.mean(np.stack(bands, axis=0), axis=0)
+        weighted_sum = np.sum([w * band for w, band in zip(weights, bands)], axis=0)
+        return weighted_sum / np.sum(weights)
+    
+    stack = np.stack(bands, axis=0)
+    mean = np.mean(stack, axis=0)
+    std = np.std(stack, axis=0)
+    
+    # Masque pour les pixels à conserver
+    mask = np.abs(stack - mean) <= sigma * std
+    
+    # Moyenne des pixels non rejetés, calculée comme np.nanmean sans copie masquée par NaN
+    total = np.sum(stack, axis=0, where=mask, dtype=np.result_type(stack, np.nan))
+    count = np.sum(mask, axis=0, dtype=np.intp)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        np.true_divide(total, count, out=total, casting='unsafe')
+    return total
 
 
 class AstroFilters:
@@ -128,9 +299,86 @@ class AstroFilters:
     Gère automatiquement la normalisation selon les besoins de chaque filtre
     """
     
-    def __init__(self, auto_normalize=False):
+    def __init__(self, auto_normalize=False, tile_size=1024, workers=0, combine_memory_budget=512 * 2**20, combine_processes=1):
+        """
+        Args:
+            auto_normalize: Normalise automatiquement les entrées des filtres qui le nécessitent
+            tile_size: Taille des tuiles pour les filtres lourds (0 pour traiter l'image entière)
+            workers: Nombre de threads pour les filtres lourds (0 = nombre de cœurs)
+            combine_memory_budget: Mémoire de travail en octets des combinaisons d'images
+            combine_processes: Nombre de processus des combinaisons d'images (0 = nombre de cœurs)
+        """
         self.version = "1.0.0"
         self.auto_normalize = auto_normalize
+        self.tile_size = tile_size
+        self.workers = workers or os.cpu_count() or 1
+        self.combine_memory_budget = combine_memory_budget
+        self.combine_processes = combine_processes or os.cpu_count() or 1
+        self.fft = FFTEngine(workers=self.workers)
+
+    # ===========================================
+    # Exécution par tuiles
+    # ===========================================
+    def _run_tiled(self, func, image, halo, blend=False, align=1):
+        """
+        Applique `func` sur des tuiles chevauchantes de l'image dans un pool de threads
+        (OpenCV, scipy et pywt relâchent le GIL pendant les calculs).
+
+        Chaque tuile est étendue d'une marge `halo` couvrant le support du filtre, de sorte
+        que le cœur de la tuile est identique au calcul sur l'image entière. Pour les
+        filtres dont le résultat dépend aussi de statistiques calculées sur la tuile,
+        `blend` fond les marges des tuiles voisines avec des poids linéaires.
+
+        Args:
+            func: Fonction tableau -> tableau de même taille (H, W[, C])
+            image: Image d'entrée
+            halo: Marge en pixels autour de chaque tuile
+            blend: Fusion pondérée des zones de recouvrement au lieu d'un simple découpage
+            align: Les origines des tuiles sont multiples de `align` (transformées décimées)
+
+        Returns:
+            Image filtrée
+        """
+        h, w = image.shape[:2]
+        tile = self.tile_size
+        if tile and align > 1:
+            tile = max(align, tile // align * align)
+            halo = -(-halo // align) * align
+        if not tile or self.workers <= 1 or (h <= tile and w <= tile):
+            return func(image)
+
+        def process(origin):
+            y, x = origin
+            y0, y1 = max(0, y - halo), min(h, y + tile + halo)
+            x0, x1 = max(0, x - halo), min(w, x + tile + halo)
+            return y, x, y0, x0, func(image[y0:y1, x0:x1])
+
+        def ramp(start, stop, core_start, core_stop, size):
+            # 1 dans le cœur, décroissance linéaire dans la marge, sauf aux bords de l'image
+            index = np.arange(start, stop)
+            distance = np.maximum(core_start - index, 0) * (core_start > 0) + np.maximum(index - core_stop + 1, 0) * (core_stop < size)
+            return np.clip(1.0 - distance / (halo + 1.0), 0, 1).astype(np.float32)
+
+        origins = [(y, x) for y in range(0, h, tile) for x in range(0, w, tile)]
+        result = weights = None
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for y, x, y0, x0, part in pool.map(process, origins):
+                th, tw = part.shape[:2]
+                if result is None:
+                    dtype = np.float32 if blend else part.dtype
+                    result = np.zeros(image.shape[:2] + part.shape[2:], dtype=dtype)
+                    weights = np.zeros((h, w), dtype=np.float32) if blend else None
+                if blend:
+                    weight = np.outer(ramp(y0, y0 + th, y, min(h, y + tile), h), ramp(x0, x0 + tw, x, min(w, x + tile), w))
+                    result[y0:y0 + th, x0:x0 + tw] += part * (weight if part.ndim == 2 else weight[:, :, None])
+                    weights[y0:y0 + th, x0:x0 + tw] += weight
+                else:
+                    core_h, core_w = min(tile, h - y), min(tile, w - x)
+                    result[y:y + core_h, x:x + core_w] = part[y - y0:y - y0 + core_h, x - x0:x - x0 + core_w]
+
+        if blend:
+            result /= weights if result.ndim == 2 else weights[:, :, None]
+        return result
         
     def _auto_normalize_input(self, image):
         """Normalise automatiquement l'image si nécessaire"""
@@ -480,6 +728,122 @@ class AstroFilters:
         
         return image - gradient
     
+    def remove_gradient_samples(self, image, grid=16, box_size=None, sigma=2.5, method='polynomial', degree=2, smoothing=1.0, model_size=128):
+        """
+        Suppression du gradient par extraction de fond sur une grille d'échantillons
+        (beaucoup plus rapide que l'ajustement sur tous les pixels ou le filtre médian,
+        utilisable à chaque mise à jour du live stacking)
+
+        Le fond est mesuré dans grid x (grid * H / W) boîtes régulièrement réparties : les pixels
+        d'étoiles sont écartés par sigma-clipping dans chaque boîte, puis les boîtes aberrantes
+        (nébuleuse, étoile brillante) sont rejetées. La surface est ajustée sur les quelques
+        centaines d'échantillons restants, évaluée sur une grille réduite de `model_size`
+        puis agrandie par interpolation bicubique.
+
+        Args:
+            image: Image numpy array 2D ou (H, W, C) - valeurs RAW acceptées
+            grid: Nombre de boîtes sur la largeur
+            box_size: Taille des boîtes en pixels (par défaut la moitié du pas de la grille)
+            sigma: Seuil de rejet en écarts-types (robustes)
+            method: 'polynomial' ou 'rbf' (thin plate spline lissée)
+            degree: Degré du polynôme
+            smoothing: Lissage de la surface RBF
+            model_size: Taille (plus grand côté) de la grille d'évaluation du modèle
+        """
+        image_f = image.astype(np.float32, copy=False)
+        h, w = image_f.shape[:2]
+        nx = max(2, int(grid))
+        ny = max(2, int(round(grid * h / w)))
+        step_x, step_y = w / nx, h / ny
+        half = max(1, int(box_size or min(step_x, step_y) / 2) // 2)
+
+        # Centres des boîtes et indices de leurs pixels
+        cx = ((np.arange(nx) + 0.5) * step_x).astype(int).clip(half, w - half - 1)
+        cy = ((np.arange(ny) + 0.5) * step_y).astype(int).clip(half, h - half - 1)
+        centers_y, centers_x = [a.ravel() for a in np.meshgrid(cy, cx, indexing='ij')]
+        # Au plus ~32 x 32 pixels par boîte suffisent pour une médiane robuste
+        offsets = np.arange(-half, half + 1, max(1, -(-(2 * half + 1) // 32)))
+        rows = (centers_y[:, None, None] + offsets[None, :, None])
+        cols = (centers_x[:, None, None] + offsets[None, None, :])
+
+        # Grille d'évaluation réduite, alignée sur les centres des pixels de cv2.resize
+        scale = max(1.0, max(h, w) / max(2, int(model_size)))
+        mh, mw = max(2, int(round(h / scale))), max(2, int(round(w / scale)))
+        grid_y = (np.arange(mh) + 0.5) * (h / mh) - 0.5
+        grid_x = (np.arange(mw) + 0.5) * (w / mw) - 0.5
+
+        channels = [image_f] if image_f.ndim == 2 else [image_f[:, :, c] for c in range(image_f.shape[2])]
+        models = []
+        for channel in channels:
+            samples = channel[rows, cols].reshape(len(centers_y), -1)
+            values = self._sigma_clipped_medians(samples, sigma)
+
+            # Rejet des boîtes aberrantes par rapport à l'ensemble des boîtes
+            keep = np.isfinite(values)
+            for _ in range(3):
+                median = np.median(values[keep])
+                spread = 1.4826 * np.median(np.abs(values[keep] - median)) + 1e-12
+                new_keep = np.isfinite(values) & (np.abs(values - median) <= sigma * spread)
+                if new_keep.sum() < 3 or np.array_equal(new_keep, keep):
+                    break
+                keep = new_keep
+
+            models.append(self._fit_background_surface(
+                centers_x[keep] / w, centers_y[keep] / h, values[keep],
+                grid_x / w, grid_y / h, method, degree, smoothing
+            ))
+
+        model = models[0] if image_f.ndim == 2 else np.stack(models, axis=-1)
+        background = cv2.resize(model.astype(np.float32), (w, h), interpolation=cv2.INTER_CUBIC)
+        return image_f - background.reshape(image_f.shape)
+
+    @staticmethod
+    def _nan_row_median(data):
+        """Médiane de chaque ligne en ignorant les NaN (tri vectorisé, plus rapide que np.nanmedian par ligne)"""
+        ordered = np.sort(data, axis=1)
+        count = np.isfinite(ordered).sum(axis=1)
+        rows = np.arange(len(ordered))
+        low = np.maximum((count - 1) // 2, 0)
+        high = np.maximum(count // 2, 0)
+        median = (ordered[rows, low] + ordered[rows, high]) / 2
+        median[count == 0] = np.nan
+        return median
+
+    def _sigma_clipped_medians(self, samples, sigma, iterations=3):
+        """Médiane sigma-clippée (MAD) de chaque ligne de `samples`, les étoiles sont écartées"""
+        data = samples.astype(np.float32, copy=True)
+        with np.errstate(invalid='ignore'):
+            for _ in range(iterations):
+                median = self._nan_row_median(data)[:, None]
+                deviation = np.abs(data - median)
+                spread = 1.4826 * self._nan_row_median(deviation)[:, None]
+                data[deviation > sigma * spread + 1e-12] = np.nan
+        return self._nan_row_median(data)
+
+    def _fit_background_surface(self, x, y, values, grid_x, grid_y, method, degree, smoothing):
+        """
+        Ajuste une surface sur les échantillons (coordonnées normalisées dans [0, 1])
+        et l'évalue sur la grille grid_y x grid_x
+        """
+        if method == 'rbf':
+            from scipy.interpolate import RBFInterpolator
+            surface = RBFInterpolator(np.column_stack([y, x]), values, kernel='thin_plate_spline', smoothing=smoothing)
+            gy, gx = np.meshgrid(grid_y, grid_x, indexing='ij')
+            return surface(np.column_stack([gy.ravel(), gx.ravel()])).reshape(gy.shape)
+
+        if method != 'polynomial':
+            raise ValueError("Méthode non supportée. Utilisez 'polynomial' ou 'rbf'")
+
+        # Coordonnées centrées dans [-1, 1] pour un système bien conditionné
+        powers = [(i, j) for i in range(degree + 1) for j in range(degree + 1 - i)]
+        x, y, grid_x, grid_y = 2 * x - 1, 2 * y - 1, 2 * grid_x - 1, 2 * grid_y - 1
+        A = np.column_stack([x**i * y**j for i, j in powers])
+        coeffs, _, _, _ = np.linalg.lstsq(A, values, rcond=None)
+        surface = np.zeros((len(grid_y), len(grid_x)))
+        for c, (i, j) in zip(coeffs, powers):
+            surface += c * np.outer(grid_y**j, grid_x**i)
+        return surface
+
     def remove_gradient_median(self, image, kernel_size=51):
         """
         Suppression du gradient par filtrage médian
@@ -488,15 +852,18 @@ class AstroFilters:
             image: Image numpy array
             kernel_size: Taille du noyau de filtrage médian
         """
-        if len(image.shape) == 3:
-            result = np.zeros_like(image)
-            for i in range(image.shape[2]):
-                background = ndimage.median_filter(image[:, :, i], size=kernel_size)
-                result[:, :, i] = image[:, :, i] - background
-            return result
-        else:
-            background = ndimage.median_filter(image, size=kernel_size)
-            return image - background
+        def apply(tile):
+            if len(tile.shape) == 3:
+                result = np.zeros_like(tile)
+                for i in range(tile.shape[2]):
+                    background = ndimage.median_filter(tile[:, :, i], size=kernel_size)
+                    result[:, :, i] = tile[:, :, i] - background
+                return result
+            else:
+                background = ndimage.median_filter(tile, size=kernel_size)
+                return tile - background
+
+        return self._run_tiled(apply, image, halo=kernel_size // 2)
     
     # ===========================================
     # FILTRES WAVELET
@@ -518,13 +885,18 @@ class AstroFilters:
             print("PyWavelets requis pour les filtres wavelet")
             return image
         
-        if len(image.shape) == 3:
-            result = np.zeros_like(image, dtype=np.float32)
-            for i in range(image.shape[2]):
-                result[:, :, i] = self._wavelet_sharpen_2d(image[:, :, i], wavelet, levels, sigma)
-            return result
-        else:
-            return self._wavelet_sharpen_2d(image, wavelet, levels, sigma)
+        def apply(tile):
+            if len(tile.shape) == 3:
+                result = np.zeros_like(tile, dtype=np.float32)
+                for i in range(tile.shape[2]):
+                    result[:, :, i] = self._wavelet_sharpen_2d(tile[:, :, i], wavelet, levels, sigma)
+                return result
+            else:
+                return self._wavelet_sharpen_2d(tile, wavelet, levels, sigma)
+
+        # Support des filtres d'analyse et de synthèse sur tous les niveaux, tuiles alignées sur la décimation
+        support = 2 * (pywt.Wavelet(wavelet).dec_len - 1) * 2 ** levels
+        return self._run_tiled(apply, image, halo=support, align=2 ** levels)
     
     def _wavelet_sharpen_2d(self, image, wavelet, levels, sigma):
         """Fonction auxiliaire pour l'amélioration wavelet 2D"""
@@ -540,8 +912,8 @@ class AstroFilters:
                 cH, cV, cD = coeffs[i]
                 coeffs_enhanced.append((cH * sigma, cV * sigma, cD * sigma))
             
-            # Reconstruction
-            enhanced = pywt.waverec2(coeffs_enhanced, wavelet)
+            # Reconstruction (waverec2 ajoute une ligne/colonne pour les tailles impaires)
+            enhanced = pywt.waverec2(coeffs_enhanced, wavelet)[:image.shape[0], :image.shape[1]]
             
             # Combinaison avec l'image originale
             return np.clip(image + 0.5 * (enhanced - image), 0, 1)
@@ -560,8 +932,33 @@ class AstroFilters:
             sigma: Écart-type du bruit (auto si None)
             mode: Mode de seuillage ('soft' ou 'hard')
         """
-        return denoise_wavelet(image, wavelet=wavelet, sigma=sigma, 
-                             mode=mode, rescale_sigma=True)
+        import pywt
+        from scipy.stats import norm
+
+        # Bruit et nombre de niveaux sont fixés sur l'image entière, comme le fait denoise_wavelet
+        # (par canal, même ondelette, détail diagonal le plus fin), pour que toutes les tuiles
+        # utilisent les mêmes paramètres. Les canaux couleur sont traités séparément
+        channel_axis = -1 if image.ndim == 3 else None
+        dec_len = pywt.Wavelet(wavelet).dec_len
+        levels = max(pywt.dwt_max_level(min(image.shape[:2]), dec_len) - 3, 1)
+        if sigma is None and self.tile_size and self.workers > 1 and max(image.shape[:2]) > self.tile_size:
+            channels = [image[..., c] for c in range(image.shape[2])] if channel_axis is not None else [image]
+            sigma = []
+            for channel in channels:
+                detail = pywt.dwtn(channel, wavelet)['dd']
+                detail = np.abs(detail[np.nonzero(detail)])
+                sigma.append(float(np.median(detail) / norm.ppf(0.75)) if detail.size else 0.0)
+            if channel_axis is None:
+                sigma = sigma[0]
+
+        def apply(tile):
+            return denoise_wavelet(tile, wavelet=wavelet, sigma=sigma, wavelet_levels=levels,
+                                 mode=mode, rescale_sigma=True, channel_axis=channel_axis)
+
+        # Les seuils BayesShrink dépendent du contenu de la tuile : les recouvrements sont fondus.
+        # Les niveaux grossiers ont un support plus large que la marge, limitée à une demi-tuile
+        support = min(2 * (dec_len - 1) * 2 ** levels, max(self.tile_size // 2, 1))
+        return self._run_tiled(apply, image, halo=support, blend=True, align=2 ** levels)
     
     # ===========================================
     # DÉBRUITAGE
@@ -596,16 +993,24 @@ class AstroFilters:
         # Normalisation automatique
         image_norm, orig_min, orig_max = self._auto_normalize_input(image)
         
+        def apply(tile):
+            if len(tile.shape) == 3:
+                # Conversion pour cv2
+                img_8bit = (np.clip(tile, 0, 1) * 255).astype(np.uint8)
+                denoised = cv2.bilateralFilter(img_8bit, -1, 
+                                             sigma_color * 255, sigma_spatial)
+                return denoised.astype(np.float32) / 255.0
+            else:
+                # Pour image N&B, utilisation scikit-image
+                return denoise_bilateral(tile, sigma_color=sigma_color, 
+                                       sigma_spatial=sigma_spatial)
+
+        # Rayon du noyau : round(1.5 * sigma) pour OpenCV, 3 sigma pour scikit-image
         if len(image_norm.shape) == 3:
-            # Conversion pour cv2
-            img_8bit = (np.clip(image_norm, 0, 1) * 255).astype(np.uint8)
-            denoised = cv2.bilateralFilter(img_8bit, -1, 
-                                         sigma_color * 255, sigma_spatial)
-            result = denoised.astype(np.float32) / 255.0
+            halo = int(np.ceil(1.5 * sigma_spatial))
         else:
-            # Pour image N&B, utilisation scikit-image
-            result = denoise_bilateral(image_norm, sigma_color=sigma_color, 
-                                   sigma_spatial=sigma_spatial)
+            halo = max(2, int(np.ceil(3 * sigma_spatial)))
+        result = self._run_tiled(apply, image_norm, halo=halo)
         
         # Retour à l'échelle originale si pas de normalisation auto
         if not self.auto_normalize:
@@ -638,16 +1043,20 @@ class AstroFilters:
             template_window_size: Taille de la fenêtre template
             search_window_size: Taille de la fenêtre de recherche
         """
-        if len(image.shape) == 3:
-            img_8bit = (np.clip(image, 0, 1) * 255).astype(np.uint8)
-            denoised = cv2.fastNlMeansDenoisingColored(img_8bit, None, h*255, h*255,
-                                                      template_window_size, search_window_size)
-            return denoised.astype(np.float32) / 255.0
-        else:
-            img_8bit = (np.clip(image, 0, 1) * 255).astype(np.uint8)
-            denoised = cv2.fastNlMeansDenoising(img_8bit, None, h*255,
-                                              template_window_size, search_window_size)
-            return denoised.astype(np.float32) / 255.0
+        def apply(tile):
+            if len(tile.shape) == 3:
+                img_8bit = (np.clip(tile, 0, 1) * 255).astype(np.uint8)
+                denoised = cv2.fastNlMeansDenoisingColored(img_8bit, None, h*255, h*255,
+                                                          template_window_size, search_window_size)
+                return denoised.astype(np.float32) / 255.0
+            else:
+                img_8bit = (np.clip(tile, 0, 1) * 255).astype(np.uint8)
+                denoised = cv2.fastNlMeansDenoising(img_8bit, None, h*255,
+                                                  template_window_size, search_window_size)
+                return denoised.astype(np.float32) / 255.0
+
+        # Un pixel dépend des patchs centrés dans sa fenêtre de recherche
+        return self._run_tiled(apply, image, halo=search_window_size // 2 + template_window_size // 2)
     
     # ===========================================
     # AMÉLIORATION DE LA NETTETÉ
@@ -767,102 +1176,137 @@ class AstroFilters:
         Suppression du bruit périodique par filtrage fréquentiel
         
         Args:
-            image: Image numpy array (2D seulement)
+            image: Image numpy array (2D ou couleur, canaux filtrés indépendamment)
             frequencies_to_remove: Liste des fréquences à supprimer
             threshold: Seuil pour la détection automatique
         """
+        result = self._remove_periodic_noise_2d(image, frequencies_to_remove, threshold)
         if len(image.shape) == 3:
-            result = np.zeros_like(image)
-            for i in range(image.shape[2]):
-                result[:, :, i] = self._remove_periodic_noise_2d(image[:, :, i], 
-                                                               frequencies_to_remove, threshold)
-            return result
-        else:
-            return self._remove_periodic_noise_2d(image, frequencies_to_remove, threshold)
+            return result.astype(image.dtype, copy=False)
+        return result
     
     def _remove_periodic_noise_2d(self, image, frequencies_to_remove, threshold):
-        """Fonction auxiliaire pour la suppression du bruit périodique 2D"""
-        # Transformée de Fourier
-        f_transform = fft2(image)
-        f_shift = np.fft.fftshift(f_transform)
-        
-        # Si pas de fréquences spécifiées, détection automatique
-        if frequencies_to_remove is None:
-            magnitude = np.abs(f_shift)
-            mean_mag = np.mean(magnitude)
-            mask = magnitude < (mean_mag + threshold * np.max(magnitude))
-        else:
-            # Création du masque pour les fréquences spécifiées
-            h, w = image.shape
-            center_x, center_y = w // 2, h // 2
-            y, x = np.ogrid[:h, :w]
-            mask = np.ones((h, w), dtype=bool)
-            
-            for freq in frequencies_to_remove:
-                # Suppression des fréquences spécifiées
-                dist = np.sqrt((x - center_x)**2 + (y - center_y)**2)
-                freq_mask = np.abs(dist - freq) < 2
-                mask = mask & ~freq_mask
-        
-        # Application du masque
-        f_shift_filtered = f_shift * mask
-        
-        # Transformée inverse
-        f_ishift = np.fft.ifftshift(f_shift_filtered)
-        img_filtered = np.real(ifft2(f_ishift))
-        
-        return img_filtered
+        """
+        Fonction auxiliaire pour la suppression du bruit périodique.
+        Les canaux d'une image couleur sont transformés ensemble par self.fft.
+        """
+        def periodic_mask(spectrum, plan):
+            # Si pas de fréquences spécifiées, détection automatique (par canal)
+            if frequencies_to_remove is None:
+                magnitude = np.abs(spectrum)
+                mean_mag = plan.full_mean(magnitude)[..., None, None]
+                max_mag = magnitude.max(axis=(-2, -1), keepdims=True)
+                return magnitude < (mean_mag + threshold * max_mag)
+            # Masque des fréquences spécifiées, mis en cache par forme d'image
+            return plan.ring_mask(frequencies_to_remove)
+        
+        # Pas d'agrandissement : il déplacerait les anneaux et modifierait le spectre sur lequel
+        # le seuil automatique est calculé (tailles de capteur peu favorables, ex. 2822 lignes)
+        return self.fft.filter(image, periodic_mask, pad=False)
     
     # ===========================================
     # COMBINAISON D'IMAGES
     # ===========================================
     
-    def combine_images_median(self, images_list):
+    def combine_images_median(self, images_list, memory_budget=None, processes=None):
         """
         Combinaison d'images par médiane (supprime les rayons cosmiques)
         
         Args:
-            images_list: Liste d'images numpy array
+            images_list: Liste d'images numpy array, de memmaps ou de chemins (.fit/.fits/.npy)
+            memory_budget: Mémoire de travail maximale en octets (défaut : celle de l'instance)
+            processes: Nombre de processus traitant les bandes (défaut : celui de l'instance)
         """
-        return np.median(np.stack(images_list, axis=0), axis=0)
+        return self._combine_by_bands('median', images_list, None, None, memory_budget, processes)
     
-    def combine_images_mean(self, images_list, weights=None):
+    def combine_images_mean(self, images_list, weights=None, memory_budget=None, processes=None):
         """
         Combinaison d'images par moyenne pondérée
         
         Args:
-            images_list: Liste d'images numpy array
+            images_list: Liste d'images numpy array, de memmaps ou de chemins (.fit/.fits/.npy)
             weights: Poids pour chaque image (optionnel)
+            memory_budget: Mémoire de travail maximale en octets (défaut : celle de l'instance)
+            processes: Nombre de processus traitant les bandes (défaut : celui de l'instance)
         """
-        if weights is None:
-            return np.mean(np.stack(images_list, axis=0), axis=0)
-        else:
-            weights = np.array(weights)
-            weighted_sum = np.sum([w * img for w, img in zip(weights, images_list)], axis=0)
-            return weighted_sum / np.sum(weights)
+        return self._combine_by_bands('mean', images_list, weights, None, memory_budget, processes)
     
-    def combine_images_sigma_clip(self, images_list, sigma=2.0):
+    def combine_images_sigma_clip(self, images_list, sigma=2.0, memory_budget=None, processes=None):
         """
         Combinaison avec rejet sigma (supprime les outliers)
         
         Args:
-            images_list: Liste d'images numpy array
+            images_list: Liste d'images numpy array, de memmaps ou de chemins (.fit/.fits/.npy)
             sigma: Seuil de rejet en écarts-types
+            memory_budget: Mémoire de travail maximale en octets (défaut : celle de l'instance)
+            processes: Nombre de processus traitant les bandes (défaut : celui de l'instance)
         """
-        stack = np.stack(images_list, axis=0)
-        mean = np.mean(stack, axis=0)
-        std = np.std(stack, axis=0)
-        
-        # Masque pour les pixels à conserver
-        mask = np.abs(stack - mean) <= sigma * std
+        return self._combine_by_bands('sigma_clip', images_list, None, sigma, memory_budget, processes)
+    
+    def _combine_by_bands(self, method, images_list, weights, sigma, memory_budget, processes):
+        """
+        Combine les images par bandes de lignes : seule la bande courante de
+        chaque image est en mémoire, la hauteur des bandes est choisie pour tenir
+        dans memory_budget. Chaque pixel ne dépend que de sa propre pile, le
+        résultat est donc identique à celui de la pile complète.
         
-        # Moyenne des pixels non rejetés
-        masked_stack = np.where(mask, stack, np.nan)
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore", category=RuntimeWarning)
-            result = np.nanmean(masked_stack, axis=0)
+        Returns:
+            np.ndarray combiné, de la forme des images d'entrée
+        """
+        if len(images_list) == 0:
+            raise ValueError("Aucune image à combiner")
+        memory_budget = memory_budget or self.combine_memory_budget
+        processes = max(1, processes or self.combine_processes)
         
-        return result
+        sources = [_CombineSource(image) for image in images_list]
+        try:
+            shape = sources[0].shape
+            for source in sources[1:]:
+                if source.shape != shape:
+                    raise ValueError(f"Dimensions incompatibles : {source.shape} au lieu de {shape}")
+            if weights is not None:
+                weights = np.array(weights)
+                if len(weights) != len(sources):
+                    raise ValueError(f"{len(weights)} poids pour {len(sources)} images")
+            
+            # Pile de la bande + copies de travail, en float64 dans le pire des cas
+            row_bytes = len(sources) * int(np.prod(shape[1:], dtype=np.int64)) * 8 * COMBINE_WORK_COPIES[method]
+            band_rows = int(min(shape[0], max(1, memory_budget // processes // max(row_bytes, 1))))
+            bands = [(start, min(start + band_rows, shape[0])) for start in range(0, shape[0], band_rows)]
+            
+            result = None
+            def store(start, stop, band):
+                nonlocal result
+                if result is None:
+                    result = np.empty(shape, dtype=band.dtype)
+                result[start:stop] = band
+            
+            if processes == 1 or len(bands) == 1:
+                for start, stop in bands:
+                    store(start, stop, _combine_band(method, sources, start, stop, weights, sigma))
+            else:
+                with ProcessPoolExecutor(max_workers=processes) as executor:
+                    # Les fichiers sont rouverts par les processus, seules les bandes des tableaux en mémoire sont envoyées.
+                    # Au plus `processes` bandes en vol : une bande n'est découpée qu'au moment de sa soumission
+                    pending = iter(bands)
+                    futures = {}
+                    def submit_next():
+                        band = next(pending, None)
+                        if band is not None:
+                            start, stop = band
+                            band_sources = [source.for_band(start, stop) for source in sources]
+                            futures[executor.submit(_combine_band, method, band_sources, start, stop, weights, sigma)] = band
+                    for _ in range(processes):
+                        submit_next()
+                    while futures:
+                        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            store(*futures.pop(future), future.result())
+                            submit_next()
+            return result
+        finally:
+            for source in sources:
+                source.close()
     
     # ===========================================
     # utils
@@ -899,41 +1343,114 @@ class AstroFilters:
         else:
             return image * mask
     
-    def get_image_statistics(self, image):
+    def get_image_statistics(self, image, stats: ImageStats = None):
         """
         Calcul des statistiques d'une image
         
         Args:
             image: Image numpy array
+            stats: ImageStats de l'image, réutilisées si fournies
         """
-        stats = {
-            'mean': np.mean(image),
-            'std': np.std(image),
-            'min': np.min(image),
-            'max': np.max(image),
-            'median': np.median(image),
-            'percentile_1': np.percentile(image, 1),
-            'percentile_99': np.percentile(image, 99)
+        stats = stats or ImageStats(image)
+        return {
+            'mean': stats.mean,
+            'std': stats.std,
+            'min': stats.min,
+            'max': stats.max,
+            'median': stats.median,
+            'percentile_1': stats.percentile(1),
+            'percentile_99': stats.percentile(99)
         }
-        return stats
 
     
         
+    # ===========================================
+    # Histogram based percentiles
+    # ===========================================
+    def channel_histogram(self, channel):
+        """Histogramme d'un canal en une seule passe (voir imagestats.channel_histogram)"""
+        return channel_histogram(channel)
+
+    def histogram_percentiles(self, histogram, percents):
+        """Percentiles tirés d'un histogramme (voir imagestats.histogram_percentiles)"""
+        return histogram_percentiles(histogram, percents)
+
+    def percentiles(self, data, percents):
+        """Percentiles d'un canal calculés en une seule passe d'histogramme"""
+        return self.histogram_percentiles(self.channel_histogram(data), percents)
+
+    def stretch_to_uint8(self, image, strength: float, black_point: float, stats: ImageStats = None):
+        """
+        Version fusionnée de auto_stretch(algo=0) + replace_lowest_percent_by_zero + conversion
+        min/max en uint8, utilisée pour les aperçus.
+        Chaque canal n'est parcouru qu'une fois pour son histogramme, dont sont tirés tous les seuils ;
+        les entiers passent ensuite par une table de correspondance, les flottants par une seule expression.
+
+        Args:
+            image: Image 2D ou (H, W, C), de n'importe quel dtype (pas besoin de normaliser)
+            strength: Pourcentage écrêté de chaque côté de l'histogramme
+            black_point: Pourcentage des valeurs les plus basses (après étirement) mises à 0
+            stats: ImageStats de l'image, dont les histogrammes sont réutilisés si fournies
+
+        Returns:
+            Image uint8 de même forme
+        """
+        channels = [image] if image.ndim == 2 else [image[:, :, c] for c in range(image.shape[2])]
+
+        plans = []
+        for channel_stats in (stats or ImageStats(image)).channels:
+            histogram = channel_stats.histogram
+            hist, offset, width, exact = histogram
+            low, high, black = self.histogram_percentiles(histogram, (strength, 100 - strength, black_point))
+            scale = 1.0 / (high - low) if high > low else 0.0
+
+            def stretch(values, low=low, scale=scale):
+                return np.clip((values - low) * scale, 0, 1)
+
+            black = float(stretch(black))
+            used = np.flatnonzero(hist)
+            extremes = stretch(offset + used[[0, -1]] * width)
+            if not exact:
+                extremes = stretch(np.array([offset, offset + len(hist) * width]))
+            extremes[extremes < black] = 0
+            plans.append((histogram, stretch, black, extremes))
+
+        out_min = min(plan[3][0] for plan in plans)
+        out_max = max(plan[3][1] for plan in plans)
+        out_scale = 255.0 / (out_max - out_min) if out_max > out_min else 0.0
+
+        result = np.empty(image.shape, dtype=np.uint8)
+        outputs = [result] if image.ndim == 2 else [result[:, :, c] for c in range(image.shape[2])]
+        for channel, output, ((hist, offset, width, exact), stretch, black, _) in zip(channels, outputs, plans):
+            if exact:
+                lut = stretch(offset + np.arange(len(hist), dtype=np.float64))
+                lut[lut < black] = 0
+                lut = ((lut - out_min) * out_scale).astype(np.uint8)
+                index = channel if offset == 0 else (channel - int(offset)).astype(np.intp)
+                np.take(lut, index, out=output)
+            else:
+                values = stretch(channel.astype(np.float32, copy=False))
+                values[values < black] = 0
+                values -= out_min
+                values *= out_scale
+                output[...] = values
+        return result
+
+        
     # ===========================================
     # Automatic histogram stretch
     # ===========================================
-    def auto_stretch(self, image , strength : float, shadow_clip : int = -2, algo: int =0):
+    def auto_stretch(self, image , strength : float, shadow_clip : int = -2, algo: int =0, stats: ImageStats = None):
         #n=1
         if (algo==0): # algo stretch with clipping (strength 0:1, default = 0.1)
             # Best for stars imaging
             if (len(image.shape)>2 and image.shape[2]>1):
+                stats = stats or ImageStats(image)
                 for i in range(0,image.data.shape[2]):
-                    min_val = np.percentile(image[:,:,i], strength)
-                    max_val = np.percentile(image[:,:,i], 100 - strength)
+                    min_val, max_val = stats.channel(i).percentiles((strength, 100 - strength))
                     image[:,:,i] = np.clip((image[:,:,i] - min_val) * (1.0 / (max_val - min_val)), 0, 1)
             else:
-                    min_val = np.percentile(image, strength)
-                    max_val = np.percentile(image, 100 - strength)
+                    min_val, max_val = (stats or ImageStats(image)).percentiles((strength, 100 - strength))
                     image = np.clip((image - min_val) * (1.0 / (max_val - min_val)), 0, 1)
         elif (algo==1):
             # strength float : 0-1
@@ -941,11 +1458,8 @@ class AstroFilters:
             #image = np.interp(image,
             #                            (image.min(), image.max()),
             #                            (0, 1))
-            if len(image.shape)>2 and image.shape[2]>1:
-                for channel in range(3):
-                    image[:,:,channel] = Stretch(target_bkg=strength).stretch(image[:,:,channel])
-                else:
-                    image = Stretch(target_bkg=strength).stretch(image)
+            # Tous les canaux sont étirés en un seul appel (statistiques par canal)
+            image = Stretch(target_bkg=strength, shadows_clip=shadow_clip).stretch(image)
 
         elif (algo==2):
             # stddev method
@@ -969,38 +1483,31 @@ class AstroFilters:
     # ===========================================
     # Automatic black clipping
     # ===========================================
-    def replace_lowest_percent_by_zero(self, image_data, percent_or_thresholds):
+    def replace_lowest_percent_by_zero(self, image_data, percent_or_thresholds, stats: ImageStats = None):
         """
         Remplace les `percent`% des valeurs les plus basses de `array` par 0.
         
         Args:
             array (np.ndarray): tableau d'entrée
             percent (float): pourcentage entre 0 et 100
+            stats (ImageStats): statistiques de l'image, réutilisées si fournies
 
         Returns:
             np.ndarray: tableau avec les plus basses valeurs remplacées par 0
         """
         if len(image_data.shape) == 3:  # Image RGB
             result = image_data.copy()
+            stats = stats or ImageStats(image_data)
             
-            if isinstance(percent_or_thresholds, (list, tuple)):
-                # Seuils spécifiques par canal
-                for channel in range(image_data.shape[2]):
+            for channel in range(image_data.shape[2]):
+                if isinstance(percent_or_thresholds, (list, tuple)):
+                    # Seuils spécifiques par canal
                     threshold = percent_or_thresholds[channel]
-                    result[:, :, channel] = np.where(
-                        image_data[:, :, channel] < threshold, 
-                        0, 
-                        image_data[:, :, channel]
-                    )
-            else:
-                # Pourcentage uniforme sur tous les canaux
-                for channel in range(image_data.shape[2]):
-                    threshold = np.percentile(image_data[:, :, channel], percent_or_thresholds)
-                    result[:, :, channel] = np.where(
-                        image_data[:, :, channel] < threshold, 
-                        0, 
-                        image_data[:, :, channel]
-                    )
+                else:
+                    # Pourcentage uniforme sur tous les canaux
+                    threshold = stats.channel(channel).percentile(percent_or_thresholds)
+                plane = result[:, :, channel]
+                plane[plane < threshold] = 0
             
             return result
             
@@ -1008,56 +1515,45 @@ class AstroFilters:
             if isinstance(percent_or_thresholds, (list, tuple)):
                 threshold = percent_or_thresholds[0]  # Prend le premier seuil
             else:
-                threshold = np.percentile(image_data, percent_or_thresholds)
+                threshold = (stats or ImageStats(image_data)).percentile(percent_or_thresholds)
             
-            return np.where(image_data < threshold, 0, image_data)
+            result = image_data.copy()
+            result[result < threshold] = 0
+            return result
 
 
 
-    def find_noise_level(self, image_data):
+    def find_noise_level(self, image_data, stats: ImageStats = None):
         """Trouve automatiquement le niveau de bruit de l'image"""
         # Utilise la médiane des déviations absolues (MAD) pour estimer le bruit
-        median = np.median(image_data)
-        mad = np.median(np.abs(image_data - median))
-        noise_level = 1.4826 * mad  # Facteur de conversion pour distribution normale
-        return noise_level
+        return (stats or ImageStats(image_data)).noise
 
-    def adaptive_clipping_threshold(self, image_data, sigma_factor=3):
+    def adaptive_clipping_threshold(self, image_data, sigma_factor=3, stats: ImageStats = None):
         """Calcule un seuil de clipping adaptatif basé sur le bruit"""
-        noise_level = self.find_noise_level(image_data)
+        noise_level = self.find_noise_level(image_data, stats)
         # Clipping à n-sigma au-dessus du niveau de bruit
         threshold = noise_level * sigma_factor
         return threshold
     
-    def sky_background_analysis(self, image_data, sample_size=1000):
+    def sky_background_analysis(self, image_data, sample_size=1000, stats: ImageStats = None):
         """Analyse le fond de ciel pour déterminer le niveau de clipping"""
-        # Échantillonne des zones "vides" de l'image (coins par exemple)
-        h, w  = image_data.shape
-        corners = [
-            image_data[:h//10, :w//10],  # coin haut-gauche
-            image_data[:h//10, -w//10:], # coin haut-droit
-            image_data[-h//10:, :w//10], # coin bas-gauche
-            image_data[-h//10:, -w//10:] # coin bas-droit
-        ]
-        
-        sky_samples = np.concatenate([corner.flatten() for corner in corners])
-        
-        # Statistiques du fond de ciel
-        sky_mean = np.mean(sky_samples)
-        sky_std = np.std(sky_samples)
+        # Échantillonne des zones "vides" de l'image (les coins)
+        stats = stats or ImageStats(image_data)
         
         # Le seuil de clipping = moyenne + n * écart-type
-        clipping_threshold = sky_mean + 2 * sky_std
+        clipping_threshold = stats.corner_mean + 2 * stats.corner_std
         return clipping_threshold
 
 
     def gaussian(self, x, amp, mu, sigma):
         return amp * np.exp(-(x - mu)**2 / (2 * sigma**2))
 
-    def find_noise_peak(self, image_data, bins=1000):
+    def find_noise_peak(self, image_data, bins=1000, stats: ImageStats = None):
         """Trouve le pic de bruit en ajustant une gaussienne sur l'histogramme"""
-        hist, bin_edges = np.histogram(image_data.flatten(), bins=bins)
-        bin_centers = (bin_edges[:-1] + bin_edges[1:]) / 2
+        stats = stats or ImageStats(image_data)
+        compact = stats.compact_histogram(bins)
+        hist = np.asarray(compact["counts"])
+        bin_centers = compact["min"] + (np.arange(len(hist)) + 0.5) * (compact["max"] - compact["min"]) / len(hist)
         
         # Trouve le pic principal (supposé être le bruit)
         peak_idx = np.argmax(hist)
@@ -1074,9 +1570,9 @@ class AstroFilters:
             y_data = hist[start_idx:end_idx]
             
             # Estimation initiale des paramètres
-            initial_guess = [np.max(y_data), peak_value, np.std(image_data)]
+            initial_guess = [np.max(y_data), peak_value, stats.std]
             
-            popt, _ = curve_fit(gaussian, x_data, y_data, p0=initial_guess)
+            popt, _ = curve_fit(self.gaussian, x_data, y_data, p0=initial_guess)
             
             # Le seuil = moyenne + n * sigma de la gaussienne ajustée
             clipping_threshold = popt[1] + 3 * abs(popt[2])
@@ -1084,39 +1580,20 @@ class AstroFilters:
             
         except:
             # Fallback sur une méthode plus simple
-            return np.percentile(image_data, 99.5)
+            return stats.percentile(99.5)
         
-    def sky_background_analysis_rgb(self, image_data, sample_size=1000):
+    def sky_background_analysis_rgb(self, image_data, sample_size=1000, stats: ImageStats = None):
         """Analyse le fond de ciel pour une image RGB"""
+        stats = stats or ImageStats(image_data)
         if len(image_data.shape) == 3:  # Image RGB
-            h, w, c = image_data.shape
-            
-            # Échantillonne les coins pour chaque canal
-            corners_per_channel = []
-            for channel in range(c):
-                corners = [
-                    image_data[:h//10, :w//10, channel],  # coin haut-gauche
-                    image_data[:h//10, -w//10:, channel], # coin haut-droit
-                    image_data[-h//10:, :w//10, channel], # coin bas-gauche
-                    image_data[-h//10:, -w//10:, channel] # coin bas-droit
-                ]
-                corners_per_channel.append(np.concatenate([corner.flatten() for corner in corners]))
-            
-            # Calcule le seuil pour chaque canal
-            thresholds = []
-            for channel_samples in corners_per_channel:
-                sky_mean = np.mean(channel_samples)
-                sky_std = np.std(channel_samples)
-                threshold = sky_mean + 2 * sky_std
-                thresholds.append(threshold)
-            
-            return thresholds  # Retourne une liste de seuils [R, G, B]
+            # Seuil de chaque canal à partir de ses coins
+            return [channel.corner_mean + 2 * channel.corner_std for channel in stats.channels]  # [R, G, B]
         
         else:  # Image en niveaux de gris
-            return self.sky_background_analysis(image_data, sample_size)
+            return self.sky_background_analysis(image_data, sample_size, stats)
         
 
-    def adaptive_clipping(self,image_data, method='auto', per_channel=True):
+    def adaptive_clipping(self,image_data, method='auto', per_channel=True, stats: ImageStats = None):
         """
         Détermine automatiquement le niveau de clipping pour images RGB
         
@@ -1124,29 +1601,30 @@ class AstroFilters:
             image_data: données de l'image (H,W) ou (H,W,C)
             method: méthode d'analyse
             per_channel: si True, analyse chaque canal séparément
+            stats: ImageStats de l'image, réutilisées si fournies
         """
+        stats = stats or ImageStats(image_data)
         
         if len(image_data.shape) == 2:  # Image monochrome
-            return self.adaptive_clipping_mono(image_data, method)
+            return self.adaptive_clipping_mono(image_data, method, stats)
         
         # Image RGB
         if per_channel:
             # Analyse chaque canal séparément
             if method == 'sky_background':
-                thresholds = self.sky_background_analysis_rgb(image_data)
+                thresholds = self.sky_background_analysis_rgb(image_data, stats=stats)
                 percents = []
                 for channel in range(image_data.shape[2]):
-                    channel_data = image_data[:, :, channel]
-                    percent_to_clip = np.sum(channel_data < thresholds[channel]) / channel_data.size * 100
+                    percent_to_clip = stats.channel(channel).fraction_below(thresholds[channel]) * 100
                     percents.append(min(95, max(50, percent_to_clip)))
                 return percents
             
             elif method == 'noise_analysis':
                 percents = []
                 for channel in range(image_data.shape[2]):
-                    channel_data = image_data[:, :, channel]
-                    threshold = self.adaptive_clipping_threshold(channel_data)
-                    percent_to_clip = np.sum(channel_data < threshold) / channel_data.size * 100
+                    channel_stats = stats.channel(channel)
+                    threshold = self.adaptive_clipping_threshold(image_data[:, :, channel], stats=channel_stats)
+                    percent_to_clip = channel_stats.fraction_below(threshold) * 100
                     percents.append(min(95, max(50, percent_to_clip)))
                 return percents
             
@@ -1154,21 +1632,19 @@ class AstroFilters:
                 # Combine plusieurs méthodes pour chaque canal
                 all_percents = []
                 for channel in range(image_data.shape[2]):
-                    channel_data = image_data[:, :, channel]
+                    channel_stats = stats.channel(channel)
                     
                     channel_thresholds = []
                     try:
-                        thresh = self.adaptive_clipping_threshold(channel_data)
-                        channel_thresholds.append(np.sum(channel_data < thresh) / channel_data.size * 100)
+                        thresh = self.adaptive_clipping_threshold(image_data[:, :, channel], stats=channel_stats)
+                        channel_thresholds.append(channel_stats.fraction_below(thresh) * 100)
                     except:
                         pass
                     
                     try:
                         # Pour le sky background sur un canal
-                        sky_mean = np.mean(channel_data)
-                        sky_std = np.std(channel_data)
-                        thresh = sky_mean + 2 * sky_std
-                        channel_thresholds.append(np.sum(channel_data < thresh) / channel_data.size * 100)
+                        thresh = channel_stats.mean + 2 * channel_stats.std
+                        channel_thresholds.append(channel_stats.fraction_below(thresh) * 100)
                     except:
                         pass
                     
@@ -1192,46 +1668,48 @@ class AstroFilters:
                 mean_channel = np.mean(image_data, axis=2)
                 return self.adaptive_clipping(mean_channel, method)
             
-    def adaptive_clipping_mono(self, image_data, method='auto'):
+    def adaptive_clipping_mono(self, image_data, method='auto', stats: ImageStats = None):
         """
         Détermine automatiquement le niveau de clipping optimal
         
         Args:
             image_data: données de l'image
             method: 'noise_analysis', 'sky_background', 'gaussian_fit', ou 'auto'
+            stats: ImageStats de l'image, réutilisées si fournies
         """
+        stats = stats or ImageStats(image_data)
         
         if method == 'noise_analysis':
-            threshold = self.adaptive_clipping_threshold(image_data)
-            percent_to_clip = np.sum(image_data < threshold) / image_data.size * 100
+            threshold = self.adaptive_clipping_threshold(image_data, stats=stats)
+            percent_to_clip = stats.fraction_below(threshold) * 100
             
         elif method == 'sky_background':
-            threshold = self.sky_background_analysis(image_data)
-            percent_to_clip = np.sum(image_data < threshold) / image_data.size * 100
+            threshold = self.sky_background_analysis(image_data, stats=stats)
+            percent_to_clip = stats.fraction_below(threshold) * 100
             
         elif method == 'gaussian_fit':
-            threshold = self.find_noise_peak(image_data)
-            percent_to_clip = np.sum(image_data < threshold) / image_data.size * 100
+            threshold = self.find_noise_peak(image_data, stats=stats)
+            percent_to_clip = stats.fraction_below(threshold) * 100
             
         elif method == 'auto':
             # Combine plusieurs méthodes et prend la médiane
             thresholds = []
             try:
-                thresholds.append(self.adaptive_clipping_threshold(image_data))
+                thresholds.append(self.adaptive_clipping_threshold(image_data, stats=stats))
             except:
                 pass
             try:
-                thresholds.append(self.sky_background_analysis(image_data))
+                thresholds.append(self.sky_background_analysis(image_data, stats=stats))
             except:
                 pass
             try:
-                thresholds.append(self.find_noise_peak(image_data))
+                thresholds.append(self.find_noise_peak(image_data, stats=stats))
             except:
                 pass
                 
             if thresholds:
                 threshold = np.median(thresholds)
-                percent_to_clip = np.sum(image_data < threshold) / image_data.size * 100
+                percent_to_clip = stats.fraction_below(threshold) * 100
             else:
                 # Fallback sur percentile
                 percent_to_clip = 85
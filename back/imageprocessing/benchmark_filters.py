@@ -0,0 +1,64 @@
+"""
+Benchmark des filtres lourds d'AstroFilters : image entière sur un thread
+contre exécution par tuiles dans un pool de threads.
+
+Usage (depuis back/) :
+    python -m imageprocessing.benchmark_filters [--size 3000x4000] [--color] [--tile 1024] [--workers 0]
+"""
+import argparse
+from time import perf_counter
+import numpy as np
+from imageprocessing.astrofilters import AstroFilters
+
+
+FILTERS = {
+    "denoise_nlm": {},
+    "denoise_bilateral": {"sigma_spatial": 5},
+    "wavelet_sharpen": {},
+    "wavelet_denoise": {},
+    "remove_gradient_median": {"kernel_size": 31},
+}
+
+
+def synthetic_frame(height: int, width: int, color: bool, seed: int = 0) -> np.ndarray:
+    """Fond avec gradient, étoiles gaussiennes et bruit, dans [0, 1]"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    image = 0.1 + 0.05 * x / width + 0.03 * y / height
+    for cy, cx, amp in zip(rng.uniform(0, height, 300), rng.uniform(0, width, 300), rng.uniform(0.2, 0.8, 300)):
+        y0, y1, x0, x1 = int(max(cy - 8, 0)), int(min(cy + 9, height)), int(max(cx - 8, 0)), int(min(cx + 9, width))
+        image[y0:y1, x0:x1] += amp * np.exp(-((y[y0:y1, x0:x1] - cy) ** 2 + (x[y0:y1, x0:x1] - cx) ** 2) / 4.5)
+    if color:
+        image = np.stack([image * factor for factor in (1.0, 0.9, 0.8)], axis=-1)
+    image = image + rng.normal(0, 0.02, image.shape).astype(np.float32)
+    return np.clip(image, 0, 1).astype(np.float32)
+
+
+def benchmark(image: np.ndarray, tile: int, workers: int, names=None):
+    reference = AstroFilters(tile_size=0, workers=1)
+    tiled = AstroFilters(tile_size=tile, workers=workers)
+    print(f"Image {image.shape} {image.dtype}, tuiles {tile}px, {tiled.workers} threads")
+    print(f"{'filtre':<25}{'entière (s)':>12}{'tuiles (s)':>12}{'gain':>8}{'écart max':>12}")
+    for name in names or FILTERS:
+        params = FILTERS[name]
+        start = perf_counter()
+        expected = getattr(reference, name)(image, **params)
+        single = perf_counter() - start
+        start = perf_counter()
+        result = getattr(tiled, name)(image, **params)
+        multi = perf_counter() - start
+        error = float(np.max(np.abs(np.asarray(expected, dtype=np.float32) - np.asarray(result, dtype=np.float32))))
+        print(f"{name:<25}{single:>12.2f}{multi:>12.2f}{single / multi:>7.1f}x{error:>12.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="3000x4000", help="HAUTEURxLARGEUR")
+    parser.add_argument("--color", action="store_true", help="Image couleur (H, W, 3)")
+    parser.add_argument("--tile", type=int, default=1024)
+    parser.add_argument("--workers", type=int, default=0, help="0 = nombre de cœurs")
+    parser.add_argument("--filters", nargs="*", choices=list(FILTERS), help="Filtres à mesurer (tous par défaut)")
+    args = parser.parse_args()
+
+    height, width = (int(value) for value in args.size.lower().split("x"))
+    benchmark(synthetic_frame(height, width, args.color), args.tile, args.workers, args.filters)
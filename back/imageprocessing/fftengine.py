@@ -0,0 +1,168 @@
+from functools import cached_property, lru_cache
+from typing import Callable, Sequence, Tuple
+import numpy as np
+from scipy import fft as sp_fft
+
+
+class FFTPlan:
+    """
+    Géométrie d'une transformée réelle 2D pour une forme d'image donnée.
+
+    Si `pad` est vrai, les tailles sont agrandies à des longueurs rapides
+    pour la FFT (next_fast_len). Les grilles de fréquences et les masques
+    sont calculés une seule fois et réutilisés par toutes les images de
+    même forme.
+
+    Les fréquences sont exprimées en cycles par image d'origine (et non par
+    image agrandie), comme les indices du spectre centré (fftshift) d'une
+    fft2 sur l'image non agrandie : la fréquence nulle est au centre et
+    chaque pas vaut 1.
+    """
+
+    # Nombre maximal de masques gardés par plan
+    MAX_MASKS = 16
+
+    def __init__(self, shape: Tuple[int, int], pad: bool = True):
+        self.shape = tuple(shape)
+        self.pad = pad
+        if pad:
+            self.padded_shape = tuple(sp_fft.next_fast_len(int(n), real=True) for n in self.shape)
+        else:
+            self.padded_shape = self.shape
+        self.spectrum_shape = (self.padded_shape[0], self.padded_shape[1] // 2 + 1)
+        self._masks = {}
+
+    @cached_property
+    def fy(self) -> np.ndarray:
+        """Fréquences verticales, colonne (H', 1)"""
+        return (sp_fft.fftfreq(self.padded_shape[0]) * self.shape[0]).astype(np.float32)[:, None]
+
+    @cached_property
+    def fx(self) -> np.ndarray:
+        """Fréquences horizontales de la demi-grille rfft, ligne (1, W'//2+1)"""
+        return (sp_fft.rfftfreq(self.padded_shape[1]) * self.shape[1]).astype(np.float32)[None, :]
+
+    @cached_property
+    def radius(self) -> np.ndarray:
+        """Distance de chaque coefficient à la fréquence nulle"""
+        return np.sqrt(self.fy ** 2 + self.fx ** 2)
+
+    @cached_property
+    def column_weights(self) -> np.ndarray:
+        """
+        Nombre de coefficients du spectre complet représentés par chaque colonne
+        de la demi-grille : 2, sauf la colonne nulle et celle de Nyquist.
+        """
+        weights = np.full(self.spectrum_shape[1], 2.0, dtype=np.float32)
+        weights[0] = 1.0
+        if self.padded_shape[1] % 2 == 0:
+            weights[-1] = 1.0
+        return weights
+
+    def full_mean(self, values: np.ndarray) -> np.ndarray:
+        """
+        Moyenne sur le spectre complet d'une grandeur symétrique (amplitude...)
+        connue sur la demi-grille. Les deux derniers axes sont ceux du spectre.
+        """
+        total = np.tensordot(values.sum(axis=-2, dtype=np.float64), self.column_weights, axes=([-1], [0]))
+        return total / (self.padded_shape[0] * self.padded_shape[1])
+
+    def mask(self, key, builder: Callable[["FFTPlan"], np.ndarray]) -> np.ndarray:
+        """
+        Masque (demi-grille) mis en cache sous `key`, calculé par builder(plan) la première fois.
+        Le masque renvoyé est partagé et en lecture seule.
+        """
+        mask = self._masks.get(key)
+        if mask is None:
+            if len(self._masks) >= self.MAX_MASKS:
+                self._masks.pop(next(iter(self._masks)))
+            mask = builder(self)
+            mask.flags.writeable = False
+            self._masks[key] = mask
+        return mask
+
+    def ring_mask(self, frequencies: Sequence[float], width: float = 2.0) -> np.ndarray:
+        """Masque booléen supprimant les anneaux |rayon - f| < width pour chaque fréquence f"""
+        frequencies = tuple(float(f) for f in frequencies)
+
+        def build(plan):
+            keep = np.ones(plan.spectrum_shape, dtype=bool)
+            for frequency in frequencies:
+                keep &= np.abs(plan.radius - frequency) >= width
+            return keep
+
+        return self.mask(("ring", frequencies, width), build)
+
+
+@lru_cache(maxsize=8)
+def fft_plan(shape: Tuple[int, int], pad: bool = True) -> FFTPlan:
+    """Plan partagé pour une forme (H, W)"""
+    return FFTPlan(shape, pad)
+
+
+class FFTEngine:
+    """
+    Transformées de Fourier réelles 2D pour les filtres fréquentiels.
+
+    Les images sont converties en float32, agrandies par réflexion à une
+    taille rapide puis transformées avec rfft2 sur plusieurs threads.
+    Les images couleur (H, W, C) sont transformées en un seul appel, canal
+    par canal : les spectres ont alors la forme (C, H', W'//2+1).
+
+    L'agrandissement accélère nettement les tailles de capteur peu
+    favorables (facteurs premiers élevés) mais déplace légèrement les
+    fréquences du spectre : les filtres qui visent des fréquences exactes
+    (anneaux, pics) doivent utiliser pad=False.
+    """
+
+    def __init__(self, workers: int = 0, pad_mode: str = 'reflect'):
+        """
+        Args:
+            workers: Nombre de threads scipy.fft (0 = nombre de cœurs)
+            pad_mode: Mode np.pad utilisé pour agrandir l'image
+        """
+        self.workers = workers or -1
+        self.pad_mode = pad_mode
+
+    def plan(self, shape: Tuple[int, ...], pad: bool = True) -> FFTPlan:
+        return fft_plan(tuple(int(n) for n in shape[:2]), pad)
+
+    def forward(self, image: np.ndarray, pad: bool = True) -> Tuple[np.ndarray, FFTPlan]:
+        """
+        Args:
+            image: Image 2D ou (H, W, C)
+            pad: Agrandit l'image à une taille rapide pour la FFT
+
+        Returns:
+            (spectre complex64, plan)
+        """
+        plan = self.plan(image.shape, pad)
+        data = np.asarray(image, dtype=np.float32)
+        if data.ndim == 3:
+            data = np.moveaxis(data, -1, 0)
+        pad_h = plan.padded_shape[0] - plan.shape[0]
+        pad_w = plan.padded_shape[1] - plan.shape[1]
+        if pad_h or pad_w:
+            data = np.pad(data, [(0, 0)] * (data.ndim - 2) + [(0, pad_h), (0, pad_w)], mode=self.pad_mode)
+        return sp_fft.rfft2(data, workers=self.workers), plan
+
+    def inverse(self, spectrum: np.ndarray, plan: FFTPlan) -> np.ndarray:
+        """
+        Transformée inverse d'un spectre renvoyé par forward(), recadrée à la forme d'origine.
+
+        Returns:
+            Image float32 2D ou (H, W, C)
+        """
+        data = sp_fft.irfft2(spectrum, s=plan.padded_shape, workers=self.workers, overwrite_x=True)
+        data = data[..., :plan.shape[0], :plan.shape[1]]
+        if data.ndim == 3:
+            data = np.moveaxis(data, 0, -1)
+        return np.ascontiguousarray(data, dtype=np.float32)
+
+    def filter(self, image: np.ndarray, mask_function: Callable[[np.ndarray, FFTPlan], np.ndarray], pad: bool = True) -> np.ndarray:
+        """
+        Multiplie le spectre de l'image par mask_function(spectre, plan) puis revient dans l'espace image.
+        """
+        spectrum, plan = self.forward(image, pad)
+        spectrum *= mask_function(spectrum, plan)
+        return self.inverse(spectrum, plan)
@@ -0,0 +1,255 @@
+from functools import cached_property
+from typing import Any, Dict, List, Tuple
+import numpy as np
+
+
+# Nombre de cases utilisées pour les histogrammes des images flottantes
+HISTOGRAM_FLOAT_BINS = 65536
+
+# Conversion MAD -> écart-type pour une distribution normale
+MAD_TO_SIGMA = 1.4826
+
+Histogram = Tuple[np.ndarray, float, float, bool]
+
+
+def channel_histogram(channel: np.ndarray) -> Histogram:
+    """
+    Calcule l'histogramme d'un canal en une seule passe.
+    Les entiers (plage <= 65536 valeurs) sont comptés exactement avec np.bincount,
+    une case par valeur ; les flottants sont répartis sur HISTOGRAM_FLOAT_BINS cases entre min et max.
+
+    Args:
+        channel: Canal 2D (ou tableau quelconque)
+
+    Returns:
+        (hist, offset, width, exact) : la case i contient les valeurs [offset + i*width, offset + (i+1)*width[
+    """
+    data = channel.ravel()
+    if data.dtype in (np.uint8, np.uint16):
+        return np.bincount(data, minlength=np.iinfo(data.dtype).max + 1), 0.0, 1.0, True
+
+    low, high = data.min(), data.max()
+    if np.issubdtype(data.dtype, np.integer) and int(high) - int(low) < 65536:
+        return np.bincount((data - low).astype(np.intp)), float(low), 1.0, True
+
+    low, high = float(low), float(high)
+    if high <= low:
+        return np.array([data.size]), low, 0.0, False
+    width = (high - low) / HISTOGRAM_FLOAT_BINS
+    index = ((data - low) * (1.0 / width)).astype(np.int32)
+    np.minimum(index, HISTOGRAM_FLOAT_BINS - 1, out=index)
+    return np.bincount(index, minlength=HISTOGRAM_FLOAT_BINS), low, width, False
+
+
+def histogram_percentiles(histogram: Histogram, percents) -> np.ndarray:
+    """
+    Calcule des percentiles à partir d'un histogramme renvoyé par channel_histogram().
+    Le résultat est identique à np.percentile pour les histogrammes exacts (entiers),
+    interpolé linéairement dans la case pour les flottants.
+
+    Args:
+        histogram: (hist, offset, width, exact)
+        percents: Percentiles entre 0 et 100
+
+    Returns:
+        np.ndarray des valeurs correspondantes
+    """
+    hist, offset, width, exact = histogram
+    cdf = np.cumsum(hist)
+    total = cdf[-1]
+    ranks = np.asarray(percents, dtype=np.float64) / 100.0 * (total - 1)
+    last = len(hist) - 1
+
+    if exact:
+        # Interpolation entre les deux statistiques d'ordre encadrantes, comme np.percentile
+        below = np.floor(ranks)
+        value_low = np.minimum(np.searchsorted(cdf, below, side='right'), last)
+        value_high = np.minimum(np.searchsorted(cdf, below + 1, side='right'), last)
+        return offset + (value_low + (ranks - below) * (value_high - value_low)) * width
+
+    index = np.minimum(np.searchsorted(cdf, ranks, side='right'), last)
+    before = np.where(index > 0, cdf[index - 1], 0)
+    fraction = (ranks - before + 0.5) / np.maximum(hist[index], 1)
+    return offset + (index + np.clip(fraction, 0, 1)) * width
+
+
+class ImageStats:
+    """
+    Statistiques d'une image calculées à la demande et mises en cache.
+
+    Tout est tiré d'un seul histogramme (exact pour les entiers 8/16 bits) :
+    médiane, MAD, percentiles, fraction de pixels sous un seuil... Les
+    statistiques d'une image couleur portent sur toutes les valeurs,
+    channel(i) donne celles d'un canal. Un même objet peut être passé à
+    toutes les méthodes d'AstroFilters qui acceptent `stats`, à condition
+    qu'il décrive bien l'image qu'elles reçoivent.
+
+    L'image n'est pas copiée : elle ne doit pas être modifiée tant que
+    l'objet est utilisé (c'est le cas des frames du FrameStore).
+    """
+
+    # Fraction de la hauteur/largeur prise dans chaque coin pour l'échantillon de fond de ciel
+    CORNER_FRACTION = 10
+
+    def __init__(self, image: np.ndarray):
+        self.image = image
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.image.shape
+
+    @property
+    def size(self) -> int:
+        return self.image.size
+
+    @property
+    def channel_count(self) -> int:
+        return 1 if self.image.ndim == 2 else self.image.shape[2]
+
+    @cached_property
+    def channels(self) -> List["ImageStats"]:
+        if self.image.ndim == 2:
+            return [self]
+        return [ImageStats(self.image[:, :, c]) for c in range(self.image.shape[2])]
+
+    def channel(self, index: int) -> "ImageStats":
+        return self.channels[index]
+
+    # ===========================================
+    # Histogramme et valeurs dérivées
+    # ===========================================
+    @cached_property
+    def histogram(self) -> Histogram:
+        return channel_histogram(self.image)
+
+    @cached_property
+    def _cdf(self) -> np.ndarray:
+        return np.cumsum(self.histogram[0])
+
+    @cached_property
+    def _bin_values(self) -> np.ndarray:
+        hist, offset, width, exact = self.histogram
+        return offset + (np.arange(len(hist)) + (0.0 if exact else 0.5)) * width
+
+    def percentiles(self, percents) -> np.ndarray:
+        return histogram_percentiles(self.histogram, percents)
+
+    def percentile(self, percent: float) -> float:
+        return float(self.percentiles(percent))
+
+    def fraction_below(self, threshold: float) -> float:
+        """Fraction (0-1) des pixels strictement inférieurs à threshold"""
+        hist, offset, width, exact = self.histogram
+        if width == 0:
+            return 1.0 if offset < threshold else 0.0
+        position = (threshold - offset) / width
+        index = int(np.ceil(position)) if exact else int(np.floor(position))
+        if index < 0:
+            return 0.0
+        if index >= len(hist):
+            return 1.0
+        below = self._cdf[index - 1] if index > 0 else 0
+        if not exact:
+            # Part de la case contenant le seuil, supposée uniforme
+            below += hist[index] * (position - index)
+        return float(below) / self.size
+
+    @cached_property
+    def min(self) -> float:
+        hist, offset, width, exact = self.histogram
+        return float(offset + np.flatnonzero(hist)[0] * width) if exact else float(offset)
+
+    @cached_property
+    def max(self) -> float:
+        hist, offset, width, exact = self.histogram
+        return float(offset + np.flatnonzero(hist)[-1] * width) if exact else float(offset + len(hist) * width)
+
+    @cached_property
+    def median(self) -> float:
+        return self.percentile(50)
+
+    @cached_property
+    def mad(self) -> float:
+        """Médiane des écarts absolus à la médiane"""
+        hist = self.histogram[0]
+        deviations = np.abs(self._bin_values - self.median)
+        order = np.argsort(deviations, kind='stable')
+        deviations = deviations[order]
+        cdf = np.cumsum(hist[order])
+        # Comme np.median : moyenne des deux valeurs centrales pour un nombre pair de pixels
+        low = np.searchsorted(cdf, (cdf[-1] - 1) // 2, side='right')
+        high = np.searchsorted(cdf, cdf[-1] // 2, side='right')
+        return float((deviations[low] + deviations[high]) / 2)
+
+    @cached_property
+    def noise(self) -> float:
+        """Niveau de bruit estimé par la MAD"""
+        return MAD_TO_SIGMA * self.mad
+
+    @cached_property
+    def mean(self) -> float:
+        if self.histogram[3]:
+            return float(np.dot(self.histogram[0], self._bin_values) / self.size)
+        return float(np.mean(self.image, dtype=np.float64))
+
+    @cached_property
+    def std(self) -> float:
+        if self.histogram[3]:
+            return float(np.sqrt(np.dot(self.histogram[0], (self._bin_values - self.mean) ** 2) / self.size))
+        return float(np.std(self.image, dtype=np.float64))
+
+    # ===========================================
+    # Échantillon de fond de ciel (coins)
+    # ===========================================
+    @cached_property
+    def corners(self) -> np.ndarray:
+        """Pixels des quatre coins (1/CORNER_FRACTION de la hauteur et de la largeur)"""
+        h, w = self.image.shape[:2]
+        ch, cw = max(1, h // self.CORNER_FRACTION), max(1, w // self.CORNER_FRACTION)
+        return np.concatenate([
+            corner.ravel() for corner in (
+                self.image[:ch, :cw], self.image[:ch, -cw:],
+                self.image[-ch:, :cw], self.image[-ch:, -cw:]
+            )
+        ])
+
+    @cached_property
+    def corner_mean(self) -> float:
+        return float(np.mean(self.corners, dtype=np.float64))
+
+    @cached_property
+    def corner_std(self) -> float:
+        return float(np.std(self.corners, dtype=np.float64))
+
+    # ===========================================
+    # Export
+    # ===========================================
+    def compact_histogram(self, bins: int = 256) -> Dict[str, Any]:
+        """Histogramme regroupé en `bins` cases entre min et max, pour l'affichage"""
+        hist, offset, width, exact = self.histogram
+        low, high = self.min, self.max
+        if high <= low:
+            return {"min": low, "max": high, "counts": [int(hist.sum())]}
+        used = np.flatnonzero(hist)
+        index = np.clip(((self._bin_values[used] - low) / (high - low) * bins).astype(np.int64), 0, bins - 1)
+        counts = np.bincount(index, weights=hist[used], minlength=bins)
+        return {"min": low, "max": high, "counts": counts.astype(np.int64).tolist()}
+
+    def to_dict(self, bins: int = 256) -> Dict[str, Any]:
+        """Statistiques par canal sérialisables en JSON"""
+        result = []
+        for channel in self.channels:
+            p1, p99 = channel.percentiles((1, 99))
+            result.append({
+                "min": channel.min,
+                "max": channel.max,
+                "mean": channel.mean,
+                "std": channel.std,
+                "median": channel.median,
+                "mad": channel.mad,
+                "noise": channel.noise,
+                "percentile_1": float(p1),
+                "percentile_99": float(p99),
+                "histogram": channel.compact_histogram(bins),
+            })
+        return {"shape": list(self.shape), "dtype": str(self.image.dtype), "channels": result}
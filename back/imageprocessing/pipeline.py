@@ -0,0 +1,491 @@
+import inspect
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import cv2
+import numpy as np
+from imageprocessing.astrofilters import AstroFilters, Stretch
+
+
+"""
+Exécution déclarative d'une chaîne de filtres, par exemple :
+
+    FilterPipeline.from_spec([
+        {"name": "stretch", "params": {"strength": 0.2}},
+        {"name": "black_point", "params": {"percent": 80}},
+        {"name": "denoise_gaussian", "params": {"sigma": 1.0}},
+        {"name": "unsharp_masking", "params": {"radius": 2.0, "amount": 0.5}},
+    ]).run(image, to_uint8=True)
+
+Les étapes ponctuelles (stretch, mtf, black_point...) ne dépendent que de la
+valeur du pixel et de statistiques globales : leurs statistiques sont tirées de
+l'histogramme du canal et les étapes consécutives sont fusionnées, en une table
+de correspondance pour les entrées entières 8/16 bits, en opérations en place
+sur un seul tampon float32 sinon. Les étapes spatiales travaillent en ping-pong
+entre deux tampons d'un pool réutilisé d'un appel à l'autre.
+"""
+
+
+class BufferPool:
+    """
+    Petit pool de tampons de travail, indexés par (shape, dtype).
+    Un tampon obtenu par get() appartient à l'appelant jusqu'à son release().
+    """
+
+    def __init__(self, max_per_key: int = 2):
+        self.max_per_key = max_per_key
+        self._lock = threading.Lock()
+        self._free: Dict[Tuple[Tuple[int, ...], str], List[np.ndarray]] = {}
+
+    def get(self, shape: Tuple[int, ...], dtype=np.float32) -> np.ndarray:
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self._lock:
+            free = self._free.get(key)
+            if free:
+                return free.pop()
+        return np.empty(shape, dtype=dtype)
+
+    def release(self, *buffers: np.ndarray) -> None:
+        with self._lock:
+            for buffer in buffers:
+                free = self._free.setdefault((buffer.shape, buffer.dtype.str), [])
+                if len(free) < self.max_per_key:
+                    free.append(buffer)
+
+
+# ===========================================
+# Statistiques pondérées (valeurs de l'histogramme, effectifs)
+# ===========================================
+def _weighted_percentiles(values: np.ndarray, counts: np.ndarray, percents) -> np.ndarray:
+    """Percentiles de la distribution (values, counts), avec l'interpolation linéaire de np.percentile."""
+    if len(values) > 1 and np.any(np.diff(values) < 0):
+        order = np.argsort(values, kind='stable')
+        values, counts = values[order], counts[order]
+    cdf = np.cumsum(counts)
+    ranks = np.asarray(percents, dtype=np.float64) / 100.0 * (cdf[-1] - 1)
+    below = np.floor(ranks)
+    last = len(values) - 1
+    value_low = values[np.minimum(np.searchsorted(cdf, below, side='right'), last)]
+    value_high = values[np.minimum(np.searchsorted(cdf, below + 1, side='right'), last)]
+    return value_low + (ranks - below) * (value_high - value_low)
+
+
+class _ChannelDistribution:
+    """Distribution d'un canal : valeurs des cases de l'histogramme et effectifs."""
+
+    def __init__(self, values: np.ndarray, counts: np.ndarray):
+        used = counts > 0
+        self.values = values[used].astype(np.float64)
+        self.counts = counts[used]
+
+    @classmethod
+    def from_channel(cls, channel: np.ndarray, filters: AstroFilters) -> "_ChannelDistribution":
+        hist, offset, width, exact = filters.channel_histogram(channel)
+        centers = offset + (np.arange(len(hist)) + (0.0 if exact else 0.5)) * width
+        return cls(centers, hist)
+
+    def percentiles(self, percents) -> np.ndarray:
+        return _weighted_percentiles(self.values, self.counts, percents)
+
+    def minimum(self) -> float:
+        return float(self.values.min())
+
+    def maximum(self) -> float:
+        return float(self.values.max())
+
+
+# ===========================================
+# Étapes ponctuelles
+# ===========================================
+class PointStep:
+    """
+    Étape ne dépendant que de la valeur du pixel.
+    fit() calcule les paramètres d'un canal à partir de sa distribution,
+    apply() les applique en place à un tableau (paramètres diffusables sur les canaux).
+    allowed_params liste les paramètres acceptés par from_spec().
+    """
+    name = ""
+    allowed_params: frozenset = frozenset()
+
+    def __init__(self, **params):
+        self.params = params
+
+    def fit(self, distribution: _ChannelDistribution) -> Tuple[float, ...]:
+        return ()
+
+    def apply(self, x: np.ndarray, *params) -> np.ndarray:
+        raise NotImplementedError
+
+
+class NormalizeStep(PointStep):
+    """Ramène [min, max] à [0, 1]"""
+    name = "normalize"
+    allowed_params = frozenset()
+
+    def fit(self, distribution):
+        low, high = distribution.minimum(), distribution.maximum()
+        return low, (1.0 / (high - low) if high > low else 0.0)
+
+    def apply(self, x, low, scale):
+        x -= low
+        x *= scale
+        return x
+
+
+class LinearStretchStep(PointStep):
+    """Équivalent de AstroFilters.auto_stretch(algo=0)"""
+    name = "stretch"
+    allowed_params = frozenset({"strength"})
+
+    def fit(self, distribution):
+        strength = self.params.get("strength", 0.15)
+        low, high = distribution.percentiles((strength, 100 - strength))
+        return low, (1.0 / (high - low) if high > low else 0.0)
+
+    def apply(self, x, low, scale):
+        x -= low
+        x *= scale
+        np.clip(x, 0, 1, out=x)
+        return x
+
+
+class MtfStretchStep(PointStep):
+    """Équivalent de AstroFilters.auto_stretch(algo=1) (STF PixInsight)"""
+    name = "mtf"
+    allowed_params = frozenset({"target_bkg", "shadows_clip"})
+
+    def fit(self, distribution):
+        stretch = Stretch(target_bkg=self.params.get("target_bkg", 0.25), shadows_clip=self.params.get("shadows_clip", -2))
+        maximum = distribution.maximum()
+        if maximum <= 0:
+            maximum = 1.0
+        normalized = distribution.values / maximum
+        median = float(_weighted_percentiles(normalized, distribution.counts, 50))
+        avg_dev = float(np.dot(distribution.counts, np.abs(normalized - median)) / distribution.counts.sum())
+        stretch_params = stretch._parameters_from_stats(median, avg_dev)
+        c0 = min(stretch_params["c0"], 1 - 1e-6)
+        return maximum, c0, stretch_params["m"]
+
+    def apply(self, x, maximum, c0, m):
+        x *= 1 / (maximum * (1 - c0))
+        x -= c0 / (1 - c0)
+        np.maximum(x, 0, out=x)
+        return Stretch._mtf(m, x, out=x)
+
+
+class BlackPointStep(PointStep):
+    """Équivalent de AstroFilters.replace_lowest_percent_by_zero"""
+    name = "black_point"
+    allowed_params = frozenset({"percent"})
+
+    def fit(self, distribution):
+        return (float(distribution.percentiles(self.params.get("percent", 80))),)
+
+    def apply(self, x, threshold):
+        np.multiply(x, x >= threshold, out=x)
+        return x
+
+
+class GammaStep(PointStep):
+    """Loi de puissance sur une image déjà dans [0, 1]"""
+    name = "gamma"
+    allowed_params = frozenset({"gamma"})
+
+    def apply(self, x):
+        np.maximum(x, 0, out=x)
+        np.power(x, self.params.get("gamma", 0.5), out=x)
+        return x
+
+
+class AsinhStep(PointStep):
+    """Étirement asinh normalisé : asinh(x / beta) / asinh(1 / beta)"""
+    name = "asinh"
+    allowed_params = frozenset({"beta"})
+
+    def apply(self, x):
+        beta = self.params.get("beta", 0.1)
+        x *= 1.0 / beta
+        np.arcsinh(x, out=x)
+        x *= 1.0 / np.arcsinh(1.0 / beta)
+        return x
+
+
+# ===========================================
+# Étapes spatiales
+# ===========================================
+class SpatialStep:
+    """
+    Étape dépendant du voisinage du pixel, écrite dans le tampon `out` (même forme, float32).
+    Renvoie le tableau résultat, qui peut être `out` ou un nouveau tableau.
+    allowed_params liste les paramètres acceptés par from_spec().
+    """
+    name = ""
+    allowed_params: frozenset = frozenset()
+
+    def __init__(self, **params):
+        self.params = params
+
+    def run(self, image: np.ndarray, out: np.ndarray, filters: AstroFilters) -> np.ndarray:
+        raise NotImplementedError
+
+
+class GaussianStep(SpatialStep):
+    name = "denoise_gaussian"
+    allowed_params = frozenset({"sigma"})
+
+    def run(self, image, out, filters):
+        sigma = self.params.get("sigma", 1.0)
+        # BORDER_REPLICATE correspond au mode 'nearest' de skimage.filters.gaussian
+        return cv2.GaussianBlur(image, (0, 0), sigma, dst=out, borderType=cv2.BORDER_REPLICATE)
+
+
+class MedianStep(SpatialStep):
+    name = "denoise_median"
+    allowed_params = frozenset({"size"})
+
+    def run(self, image, out, filters):
+        size = self.params.get("size", 3)
+        if size in (3, 5) and (image.ndim == 2 or image.shape[2] in (1, 3, 4)):
+            return cv2.medianBlur(image, size, dst=out)
+        return filters.denoise_median(image, size=size)
+
+
+class UnsharpStep(SpatialStep):
+    name = "unsharp_masking"
+    allowed_params = frozenset({"radius", "amount"})
+
+    def run(self, image, out, filters):
+        radius = self.params.get("radius", 2.0)
+        amount = self.params.get("amount", 1.0)
+        cv2.GaussianBlur(image, (0, 0), radius, dst=out, borderType=cv2.BORDER_REFLECT)
+        # image + amount * (image - flou)
+        cv2.addWeighted(image, 1 + amount, out, -amount, 0, dst=out)
+        return np.clip(out, 0, 1, out=out)
+
+
+class HighPassStep(SpatialStep):
+    name = "high_pass_sharpen"
+    allowed_params = frozenset({"sigma", "alpha"})
+
+    def run(self, image, out, filters):
+        sigma = self.params.get("sigma", 2.0)
+        alpha = self.params.get("alpha", 0.5)
+        cv2.GaussianBlur(image, (0, 0), sigma, dst=out, borderType=cv2.BORDER_REPLICATE)
+        cv2.addWeighted(image, 1 + alpha, out, -alpha, 0, dst=out)
+        return np.clip(out, 0, 1, out=out)
+
+
+class LaplacianStep(SpatialStep):
+    name = "laplacian_sharpen"
+    allowed_params = frozenset({"alpha"})
+
+    def run(self, image, out, filters):
+        alpha = self.params.get("alpha", 0.2)
+        cv2.Laplacian(image, cv2.CV_32F, dst=out, ksize=1, borderType=cv2.BORDER_REFLECT)
+        cv2.addWeighted(image, 1, out, -alpha, 0, dst=out)
+        return np.clip(out, 0, 1, out=out)
+
+
+class FilterMethodStep(SpatialStep):
+    """Délègue à une méthode d'AstroFilters (qui alloue son propre résultat)"""
+
+    def __init__(self, name: str, **params):
+        super().__init__(**params)
+        self.name = name
+
+    def run(self, image, out, filters):
+        return np.asarray(getattr(filters, self.name)(image, **self.params), dtype=np.float32)
+
+
+POINT_STEPS = {step.name: step for step in (NormalizeStep, LinearStretchStep, MtfStretchStep, BlackPointStep, GammaStep, AsinhStep)}
+SPATIAL_STEPS = {step.name: step for step in (GaussianStep, MedianStep, UnsharpStep, HighPassStep, LaplacianStep)}
+FILTER_METHOD_STEPS = ("denoise_bilateral", "denoise_nlm", "wavelet_sharpen", "wavelet_denoise", "remove_gradient_median", "remove_gradient_samples")
+
+STEP_NAMES = tuple(POINT_STEPS) + tuple(SPATIAL_STEPS) + FILTER_METHOD_STEPS
+
+
+class FilterPipeline:
+    """
+    Chaîne de filtres déclarative.
+    Le dtype et la forme de l'image sont validés une seule fois, les étapes
+    ponctuelles consécutives sont fusionnées et la durée de chaque étape est
+    transmise au SectionTimer passé à run(). Une chaîne ne garde aucun état
+    d'exécution : plusieurs run() peuvent s'exécuter en parallèle.
+    """
+
+    def __init__(self, steps: Sequence[Any], pool: Optional[BufferPool] = None, filters: Optional[AstroFilters] = None):
+        self.steps = list(steps)
+        self.pool = pool or BufferPool()
+        self.filters = filters or AstroFilters()
+
+    @classmethod
+    def from_spec(cls, spec: Sequence[Any], filters: Optional[AstroFilters] = None) -> "FilterPipeline":
+        """
+        Construit une chaîne depuis une liste d'étapes {"name": ..., "params": {...}}
+        (dictionnaires ou objets avec les attributs name et params).
+        `filters` porte les réglages d'exécution par tuiles des étapes déléguées à AstroFilters.
+
+        Raises:
+            ValueError: étape inconnue ou paramètres invalides
+        """
+        steps = []
+        for item in spec:
+            name = item["name"] if isinstance(item, dict) else item.name
+            params = (item.get("params") if isinstance(item, dict) else item.params) or {}
+            if name in POINT_STEPS or name in SPATIAL_STEPS:
+                step_class = POINT_STEPS.get(name) or SPATIAL_STEPS[name]
+                unknown = set(params) - step_class.allowed_params
+                if unknown:
+                    expected = ', '.join(sorted(step_class.allowed_params)) or 'none'
+                    raise ValueError(f"Invalid parameters for step '{name}': unexpected {', '.join(sorted(unknown))} (expected {expected})")
+                steps.append(step_class(**params))
+            elif name in FILTER_METHOD_STEPS:
+                try:
+                    inspect.signature(getattr(AstroFilters, name)).bind(None, None, **params)
+                except TypeError as e:
+                    raise ValueError(f"Invalid parameters for step '{name}': {e}")
+                steps.append(FilterMethodStep(name, **params))
+            else:
+                raise ValueError(f"Unknown pipeline step '{name}', expected one of {', '.join(STEP_NAMES)}")
+            for key, value in params.items():
+                if not isinstance(value, (int, float, str, bool)) and value is not None:
+                    raise ValueError(f"Invalid parameter {key}={value!r} for step '{name}'")
+        return cls(steps, filters=filters)
+
+    def _groups(self) -> List[List[Any]]:
+        """Regroupe les étapes ponctuelles consécutives"""
+        groups: List[List[Any]] = []
+        for step in self.steps:
+            if isinstance(step, PointStep) and groups and isinstance(groups[-1][0], PointStep):
+                groups[-1].append(step)
+            else:
+                groups.append([step])
+        return groups
+
+    @staticmethod
+    def _mark(name: str, timer) -> None:
+        if timer is not None:
+            timer.mark(f"pipeline {name}")
+
+    @staticmethod
+    def _channels(image: np.ndarray) -> List[np.ndarray]:
+        return [image] if image.ndim == 2 else [image[:, :, c] for c in range(image.shape[2])]
+
+    def _fit(self, steps: List[PointStep], distributions: List[_ChannelDistribution], ndim: int) -> List[Tuple[PointStep, Tuple]]:
+        """
+        Calcule les paramètres de chaque étape canal par canal, en propageant les
+        valeurs de l'histogramme à travers les étapes précédentes.
+        """
+        fitted = []
+        for step in steps:
+            per_channel = [step.fit(distribution) for distribution in distributions]
+            for distribution, params in zip(distributions, per_channel):
+                distribution.values = step.apply(distribution.values, *params)
+            if ndim == 2:
+                params = per_channel[0]
+            else:
+                params = tuple(np.array(values, dtype=np.float32) for values in zip(*per_channel))
+            fitted.append((step, params))
+        return fitted
+
+    def run(self, image: np.ndarray, to_uint8: bool = False, timer=None) -> np.ndarray:
+        """
+        Exécute la chaîne.
+
+        Args:
+            image: Image 2D ou (H, W, C), entière ou flottante (non modifiée)
+            to_uint8: si True, le résultat est ramené de [min, max] à un uint8 pour l'affichage
+            timer: SectionTimer optionnel recevant une marque par étape
+
+        Returns:
+            Image float32 (ou uint8) de même forme
+        """
+        if image.ndim not in (2, 3):
+            raise ValueError(f"Unsupported image shape {image.shape}")
+        if not (np.issubdtype(image.dtype, np.integer) or np.issubdtype(image.dtype, np.floating)):
+            raise ValueError(f"Unsupported image dtype {image.dtype}")
+
+        groups = self._groups()
+        work: Optional[np.ndarray] = None
+        scratch: Optional[np.ndarray] = None
+
+        try:
+            for index, group in enumerate(groups):
+                if isinstance(group[0], PointStep):
+                    source = image if work is None else work
+                    distributions = [_ChannelDistribution.from_channel(channel, self.filters) for channel in self._channels(source)]
+                    fitted = self._fit(group, distributions, image.ndim)
+                    name = "+".join(step.name for step in group)
+
+                    if work is None and image.dtype in (np.uint8, np.uint16):
+                        # Toute la série d'étapes devient une table de correspondance par canal
+                        last = index == len(groups) - 1
+                        levels = np.arange(np.iinfo(image.dtype).max + 1, dtype=np.float32)
+                        luts = []
+                        for channel in range(1 if image.ndim == 2 else image.shape[2]):
+                            lut = levels.copy()
+                            for step, params in fitted:
+                                lut = step.apply(lut, *(p if np.ndim(p) == 0 else p[channel] for p in params))
+                            luts.append(lut)
+                        if last and to_uint8:
+                            result = self._apply_luts_uint8(image, luts, distributions)
+                            self._mark(f"{name} (lut)", timer)
+                            return result
+                        work = self.pool.get(image.shape, np.float32)
+                        for channel, output, lut in zip(self._channels(image), self._channels(work), luts):
+                            np.take(lut, channel, out=output)
+                        self._mark(f"{name} (lut)", timer)
+                        continue
+
+                    if work is None:
+                        work = self.pool.get(image.shape, np.float32)
+                        np.copyto(work, image, casting='unsafe')
+                    for step, params in fitted:
+                        step.apply(work, *params)
+                    self._mark(name, timer)
+                    continue
+
+                step = group[0]
+                if work is None:
+                    work = self.pool.get(image.shape, np.float32)
+                    np.copyto(work, image, casting='unsafe')
+                if scratch is None:
+                    scratch = self.pool.get(image.shape, np.float32)
+                result = step.run(work, scratch, self.filters)
+                if result is scratch:
+                    work, scratch = scratch, work
+                else:
+                    np.copyto(work, result.reshape(work.shape), casting='unsafe')
+                self._mark(step.name, timer)
+
+            if work is None:
+                work = self.pool.get(image.shape, np.float32)
+                np.copyto(work, image, casting='unsafe')
+
+            if to_uint8:
+                result = self._to_uint8(work)
+                self._mark("to_uint8", timer)
+                return result
+            # Le tampon résultat est rendu à l'appelant et quitte le pool
+            result, work = work, None
+            return result
+        finally:
+            self.pool.release(*[buffer for buffer in (work, scratch) if buffer is not None])
+
+    @staticmethod
+    def _apply_luts_uint8(image: np.ndarray, luts: List[np.ndarray], distributions: List[_ChannelDistribution]) -> np.ndarray:
+        # Mise à l'échelle [min, max] -> [0, 255] repliée dans les tables, min et max connus par les histogrammes
+        low = min(float(distribution.values.min()) for distribution in distributions)
+        high = max(float(distribution.values.max()) for distribution in distributions)
+        scale = 255.0 / (high - low) if high > low else 0.0
+        result = np.empty(image.shape, dtype=np.uint8)
+        for channel, output, lut in zip(FilterPipeline._channels(image), FilterPipeline._channels(result), luts):
+            np.take(((lut - low) * scale).astype(np.uint8), channel, out=output)
+        return result
+
+    @staticmethod
+    def _to_uint8(image: np.ndarray) -> np.ndarray:
+        low, high = float(image.min()), float(image.max())
+        scale = 255.0 / (high - low) if high > low else 0.0
+        image -= low
+        image *= scale
+        return image.astype(np.uint8)
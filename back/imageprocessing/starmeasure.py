@@ -0,0 +1,232 @@
+from typing import NamedTuple, Optional, Tuple
+import numpy as np
+from scipy import ndimage
+
+
+# FWHM d'une gaussienne en fonction de son écart-type
+SIGMA_TO_FWHM = 2.0 * np.sqrt(2.0 * np.log(2.0))
+
+
+class StarMeasurements(NamedTuple):
+    """Mesures des étoiles d'une image, un élément par étoile (tableaux de même longueur)"""
+    x: np.ndarray
+    y: np.ndarray
+    flux: np.ndarray
+    peak: np.ndarray
+    hfr: np.ndarray
+    fwhm: np.ndarray
+    background: float
+    noise: float
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+
+class StarMeasure:
+    """
+    Mesure rapide des étoiles pour la mise au point.
+
+    - fond de ciel et bruit par sigma-clipping sur un sous-échantillon ;
+    - détection des maxima locaux sur une image binnée (moins de pixels,
+      bruit réduit) ;
+    - extraction de vignettes de taille fixe pour toutes les étoiles dans un
+      seul tableau (N, S, S) ;
+    - HFR (rayon contenant la moitié du flux) et FWHM par moments d'ordre 2
+      calculés pour toutes les étoiles en une passe vectorisée.
+
+    La taille des vignettes s'adapte aux étoiles : une première passe avec
+    un petit rayon estime le HFR médian, la seconde utilise un rayon de
+    HFR_RADIUS fois ce HFR (étoiles défocalisées en début de courbe en V).
+    """
+
+    # Nombre maximal de pixels utilisés pour estimer le fond de ciel
+    BACKGROUND_SAMPLES = 65536
+    # Rayon des vignettes en multiples du HFR médian, bornes en pixels
+    HFR_RADIUS = 4.0
+    MIN_RADIUS = 4
+    MAX_RADIUS = 32
+    # Rapport signal/bruit minimal d'une étoile (flux total de la vignette)
+    MIN_SNR = 5.0
+
+    def __init__(self, threshold: float = 3.0, max_stars: int = 50, detection_bin: int = 2, saturation: Optional[float] = None):
+        """
+        Args:
+            threshold: Seuil de détection en nombre d'écarts-types du fond (image binnée)
+            max_stars: Nombre maximal d'étoiles mesurées (les plus brillantes)
+            detection_bin: Facteur de binning de l'image de détection
+            saturation: Niveau au-delà duquel une étoile est ignorée (None = pas de filtre)
+        """
+        self.threshold = threshold
+        self.max_stars = max_stars
+        self.detection_bin = max(1, detection_bin)
+        self.saturation = saturation
+
+    # ===========================================
+    # Fond de ciel
+    # ===========================================
+    def background(self, image: np.ndarray, sigma: float = 3.0, iterations: int = 5) -> Tuple[float, float]:
+        """
+        Médiane et écart-type (MAD) du fond, étoiles exclues par sigma-clipping
+
+        Returns:
+            (fond, bruit)
+        """
+        step = max(1, int(np.sqrt(image.size / self.BACKGROUND_SAMPLES)))
+        sample = image[::step, ::step].astype(np.float32).ravel()
+        for _ in range(iterations):
+            median = np.median(sample)
+            noise = 1.4826 * np.median(np.abs(sample - median))
+            if noise <= 0:
+                break
+            kept = sample[np.abs(sample - median) < sigma * noise]
+            if len(kept) == len(sample) or len(kept) == 0:
+                break
+            sample = kept
+        median = float(np.median(sample))
+        noise = float(1.4826 * np.median(np.abs(sample - median)))
+        if noise <= 0:
+            noise = float(np.std(sample)) or 1.0
+        return median, noise
+
+    # ===========================================
+    # Détection
+    # ===========================================
+    def _binned(self, image: np.ndarray) -> np.ndarray:
+        b = self.detection_bin
+        h, w = image.shape[0] // b * b, image.shape[1] // b * b
+        data = image[:h, :w].astype(np.float32)
+        if b == 1:
+            return data
+        return data.reshape(h // b, b, w // b, b).mean(axis=(1, 3))
+
+    def detect(self, image: np.ndarray, border: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Positions (pixels de l'image d'origine) des maxima locaux au-dessus du seuil,
+        triées par intensité décroissante, une seule détection par étoile
+
+        Args:
+            image: Image 2D
+            border: Marge exclue sur les bords (pixels de l'image d'origine)
+
+        Returns:
+            (y, x) entiers
+        """
+        b = self.detection_bin
+        binned = self._binned(image)
+        background, noise = self.background(binned)
+        data = binned - background
+        peaks = (data == ndimage.maximum_filter(data, size=3)) & (data > self.threshold * noise)
+        ys, xs = np.nonzero(peaks)
+        if len(ys) == 0:
+            return ys, xs
+        order = np.argsort(data[ys, xs])[::-1]
+        ys, xs = ys[order], xs[order]
+
+        # Retour aux coordonnées d'origine, au pixel le plus brillant du bloc
+        if b > 1:
+            blocks = image[:binned.shape[0] * b, :binned.shape[1] * b].reshape(binned.shape[0], b, binned.shape[1], b)
+            offsets = blocks[ys, :, xs, :].reshape(len(ys), -1).argmax(axis=1)
+            ys, xs = ys * b + offsets // b, xs * b + offsets % b
+
+        h, w = image.shape
+        inside = (ys >= border) & (ys < h - border) & (xs >= border) & (xs < w - border)
+        ys, xs = ys[inside], xs[inside]
+
+        # Plusieurs maxima d'une même étoile (plateau, étoile défocalisée) : on garde le plus brillant
+        keep = np.ones(len(ys), dtype=bool)
+        separation = 2 * b + 1
+        for i in range(len(ys)):
+            if keep[i]:
+                close = (np.abs(ys[i + 1:] - ys[i]) < separation) & (np.abs(xs[i + 1:] - xs[i]) < separation)
+                keep[i + 1:] &= ~close
+        return ys[keep], xs[keep]
+
+    # ===========================================
+    # Mesure
+    # ===========================================
+    @staticmethod
+    def cutouts(image: np.ndarray, ys: np.ndarray, xs: np.ndarray, radius: int) -> np.ndarray:
+        """Vignettes (N, 2r+1, 2r+1) float32 centrées sur chaque position (bords complétés par réflexion)"""
+        padded = np.pad(image, radius, mode='reflect') if radius else image
+        offsets = np.arange(-radius, radius + 1)
+        rows = (ys + radius)[:, None, None] + offsets[None, :, None]
+        cols = (xs + radius)[:, None, None] + offsets[None, None, :]
+        return padded[rows, cols].astype(np.float32)
+
+    @staticmethod
+    def _moments(stamps: np.ndarray, radius: int, floor: float) -> Tuple[np.ndarray, ...]:
+        """
+        Flux, centroïde, HFR et FWHM (moments d'ordre 2) de vignettes dont le fond a été retiré.
+        Seuls les pixels du disque de rayon `radius` dépassant `floor` sont pris en compte :
+        le bruit positif du fond gonflerait les moments d'ordre 2.
+
+        Returns:
+            (flux, snr, dy, dx, hfr, fwhm) : flux au-dessus de floor, rapport signal/bruit
+            du flux total du disque (bruit par pixel = floor), dy/dx relatifs au centre des vignettes
+        """
+        offsets = np.arange(-radius, radius + 1, dtype=np.float32)
+        oy, ox = offsets[:, None], offsets[None, :]
+        disk = (oy ** 2 + ox ** 2) <= radius ** 2
+        above = disk & (stamps > floor)
+        weights = np.where(above, stamps, 0)
+
+        flux = weights.sum(axis=(1, 2))
+        safe = np.where(flux > 0, flux, 1)
+        dy = (weights * oy).sum(axis=(1, 2)) / safe
+        dx = (weights * ox).sum(axis=(1, 2)) / safe
+        ry = oy - dy[:, None, None]
+        rx = ox - dx[:, None, None]
+        r2 = ry ** 2 + rx ** 2
+        hfr = (weights * np.sqrt(r2)).sum(axis=(1, 2)) / safe
+        sigma2 = (weights * r2).sum(axis=(1, 2)) / safe / 2
+        fwhm = SIGMA_TO_FWHM * np.sqrt(sigma2)
+        # Flux total sans seuil : nul en moyenne sur un pic de bruit
+        snr = (stamps * disk).sum(axis=(1, 2)) / (floor * np.sqrt(disk.sum()))
+        return flux, snr, dy, dx, hfr, fwhm
+
+    def measure(self, image: np.ndarray, radius: Optional[int] = None) -> StarMeasurements:
+        """
+        Détecte et mesure les étoiles d'une image
+
+        Args:
+            image: Image 2D (les images couleur doivent être converties avant)
+            radius: Rayon des vignettes, estimé à partir des étoiles si None
+
+        Returns:
+            StarMeasurements des max_stars étoiles les plus brillantes
+        """
+        ys, xs = self.detect(image)
+        background, noise = self.background(image)
+        if self.saturation is not None and len(ys):
+            unsaturated = image[ys, xs] < self.saturation
+            ys, xs = ys[unsaturated], xs[unsaturated]
+        ys, xs = ys[:self.max_stars], xs[:self.max_stars]
+        if len(ys) == 0:
+            empty = np.array([], dtype=np.float32)
+            return StarMeasurements(empty, empty, empty, empty, empty, empty, background, noise)
+
+        # Sur des entiers à fond presque constant (8 bits), un pixel à +1 est du bruit de quantification
+        floor = max(noise, 1.0) if np.issubdtype(image.dtype, np.integer) else noise
+        if radius is None:
+            stamps = self.cutouts(image, ys, xs, self.MIN_RADIUS * 2) - background
+            hfr = self._moments(stamps, self.MIN_RADIUS * 2, floor)[4]
+            radius = int(np.clip(np.ceil(self.HFR_RADIUS * np.median(hfr)), self.MIN_RADIUS, self.MAX_RADIUS))
+
+        stamps = self.cutouts(image, ys, xs, radius)
+        # Fond local : moyenne du contour de chaque vignette (la médiane est trop grossière sur des entiers 8 bits)
+        edge = np.concatenate([stamps[:, 0, :], stamps[:, -1, :], stamps[:, 1:-1, 0], stamps[:, 1:-1, -1]], axis=1)
+        stamps -= edge.mean(axis=1)[:, None, None]
+        flux, snr, dy, dx, hfr, fwhm = self._moments(stamps, radius, floor)
+
+        # Les pics de bruit franchissent le seuil de détection mais ne forment pas une étoile
+        valid = (flux > 0) & (snr >= self.MIN_SNR)
+        return StarMeasurements(
+            x=(xs + dx)[valid],
+            y=(ys + dy)[valid],
+            flux=flux[valid],
+            peak=stamps[:, radius, radius][valid],
+            hfr=hfr[valid],
+            fwhm=fwhm[valid],
+            background=background,
+            noise=noise,
+        )
@@ -7,6 +7,8 @@ from fastapi.responses import FileResponse
 from contextlib import asynccontextmanager
 from pathlib import Path
 from ws.websocket_manager import ws_manager
+from services.frame_index import frame_index
+from services.drivers.alpaca_client_async import close_clients
 import asyncio
 import sys
 import io
@@ -21,9 +23,12 @@ async def lifespan(app: FastAPI):
     # Startup code
     # Initialize WebSocket manager with the current event loop
     ws_manager.set_loop(asyncio.get_running_loop())
+    # Index the frames captured since the last run, without delaying the startup
+    asyncio.get_running_loop().run_in_executor(None, frame_index.backfill, Path(config.CONFIG['global'].get("fits_storage_dir")).resolve())
     yield
     # clean up code
     ws_manager.close_all_connections()
+    await close_clients()
     pass
 
 app = FastAPI(
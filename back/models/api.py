@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Union, Dict
+from typing import List, Union, Dict, Optional
 from pathlib import Path
 
 class PlanType(BaseModel):
@@ -44,6 +44,12 @@ class DarkLibraryItem(BaseModel):
     filename:str
 
 
+class PipelineStep(BaseModel):
+    name: str
+    params: Dict[str, Union[int, float, str, bool]] = {}
+
 class ImageSettings(BaseModel):
     stretch: float
-    black_point: int
\ No newline at end of file
+    black_point: int
+    # Chaîne de filtres de l'aperçu (voir imageprocessing/pipeline.py), None = stretch + black_point
+    pipeline: Optional[List[PipelineStep]] = None
\ No newline at end of file
@@ -1,5 +1,6 @@
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from utils.logger import logger
 from services.configurator import CONFIG
@@ -11,8 +12,11 @@ from models.state import telescope_state
 
 from abc import ABC, abstractmethod
 from numpy import uint8
-from services.focuser import AutoFocusLib
+from services.focuser import AutoFocusLib, FocusSearch
+from services.focus_model import focus_model
+from services.star_fields import star_fields
 from models.constants import AUTOMATE_STEP
+from services.frame_index import frame_index
 
 class BasicAutomate(threading.Thread, ABC):
     def __init__(self, telescope_interface, name: str):
@@ -25,9 +29,11 @@ class BasicAutomate(threading.Thread, ABC):
         self.has_fw = self.telescope_interface.filter_wheel_connect() if len(CONFIG['filterwheel'].get("filters", []))>1 else False
         self.status = "not_started"
         self.is_running = False
-        self.autofocus = AutoFocusLib()
+        self.autofocus = AutoFocusLib(mode=CONFIG['global'].get('focuser_measure', 'fast'))
         self.plan = None
         self.automate_step = AUTOMATE_STEP["IDLE"]
+        # Binning des mesures du dernier balayage de mise au point (FWHM en pixels binnés)
+        self.focus_binning = 1
         if telescope_state.bin_x!=1:
             telescope_interface.set_bin_x(1)
 
@@ -83,6 +89,7 @@ class BasicAutomate(threading.Thread, ABC):
                             wcs.unlink()
                     if image.exists():
                         image.unlink()
+                    frame_index.remove(image)
             except:
                 pass
         self.telescope_interface.telescope_set_tracking(0)
@@ -129,26 +136,254 @@ class BasicAutomate(threading.Thread, ABC):
         self.set_status("stopped")
 
 
+    def get_focus_roi(self, image=None):
+        """
+        Chooses once the star-rich sub frame read at every focuser position
+
+        Args:
+            image: Full frame already captured (see focus_detection_data), a new one is taken if None
+
+        Returns:
+            (x, y, width, height) in sensor pixels, None to focus on full frames
+        """
+        roi_size = CONFIG['global'].get('focuser_roi_size', 512)
+        if not roi_size:
+            return None
+        if image is None:
+            image = self.telescope_interface.camera_capture(CONFIG['global'].get("focuser_exposition", 4))
+            if image is None:
+                logger.error("[Focuser] - Error capturing image for the focus region")
+                return None
+            image.data = self.focus_detection_data(image.data)
+        # Le binning réduit la région : on la garde multiple de 2*bin pour conserver la phase Bayer
+        binning = CONFIG['global'].get('focuser_roi_bin', 1)
+        return self.autofocus.select_roi(image.data, roi_size, align=2 * binning)
+
+    def capture_focus_roi(self, roi):
+        """Captures the focus region in memory, without writing a FITS file"""
+        image = self.telescope_interface.camera_capture_roi(
+            CONFIG['global'].get('focuser_exposition', 4),
+            roi,
+            binning=CONFIG['global'].get('focuser_roi_bin', 1),
+            fast_readout=CONFIG['global'].get('focuser_fast_readout', False),
+        )
+        if image is None:
+            raise RuntimeError("Sub frame capture failed")
+        return image.data
+
+    def capture_focus_frame(self):
+        """Captures a full frame in memory, without writing a FITS file"""
+        image = self.telescope_interface.camera_capture(CONFIG['global'].get('focuser_exposition', 4))
+        if image is None:
+            raise RuntimeError("Capture failed")
+        return image.data
+
+    def focus_detection_data(self, data):
+        """
+        Prepares a frame for the autofocus star detection, so that choosing the
+        field, the region and measuring the FWHM all see the same data: native
+        dtype for the fast measure (StarMeasure), 8 bits for DAOStarFinder
+
+        Args:
+            data: Raw camera data
+
+        Returns:
+            The data to give to the AutoFocusLib
+        """
+        if self.autofocus.mode == "accurate":
+            return (data / 255).astype(uint8)
+        return data
+
+    def analyze_focus_frame(self, data, position: int, bayer: str = None):
+        """
+        Measures a raw focus frame, runs in the autofocus worker while the focuser
+        moves to the next position. The fast measure (StarMeasure) works on the
+        native dtype, only the accurate mode (DAOStarFinder) gets an 8 bits frame
+
+        Args:
+            data: Raw camera data (full frame or region)
+            position: Focuser position of the frame
+            bayer: Bayer pattern of the sensor, the frame is debayered when set (unbinned frames only)
+        """
+        if bayer and data.ndim == 2:
+            data = FitsImageManager().debayer(data, bayer)
+        data = self.focus_detection_data(data)
+        result = self.autofocus.analyze_image(data, position)
+        self.set_status(f"Focusing at {position}, FWHM : [{result['fwhm']}]", "FOCUSER", "STATUS")
+        ws_manager.broadcast_sync(ws_manager.format_message("FOCUSER","NEWIMAGE"))
+
+        if not result['valid']:
+            logger.error("[Focuser] - Invalid capture for autofocus")
+        return result
+
+    def move_focuser_from(self, current: int, position: int, overshoot: int = 0):
+        """
+        Moves the focuser, downward moves go past the target by `overshoot` steps
+        so that every position is reached upward (backlash compensation)
+        """
+        if overshoot and position < current:
+            self.telescope_interface.move_focuser(max(0, position - overshoot))
+        self.telescope_interface.move_focuser(position)
+
+    def filter_offsets(self) -> dict:
+        """
+        Focus offsets by filter: learned from the autofocus history, otherwise
+        from the configuration, otherwise from the filter wheel
+        """
+        filters = CONFIG['filterwheel'].get("filters", [])
+        configured = {}
+        try:
+            configured = {name: int(value) for name, value in zip(filters, CONFIG['filterwheel'].get("focus_offsets", [])) if str(value).strip()}
+        except ValueError:
+            logger.error("[FILTERWHEEL] - Invalid focus offsets in the configuration")
+        if not configured:
+            configured = self.telescope_interface.get_filter_focus_offsets()
+        return focus_model.filter_offsets(focus_model.optical_train(), configured)
+
+    def change_filter(self, previous: str, filter_name: str):
+        """
+        Changes the filter and moves the focuser by the focus offset between the two filters
+        """
+        self.telescope_interface.change_filter(filter_name)
+        if not previous or previous == filter_name or not CONFIG["telescope"].get("has_focuser", False):
+            return
+        offsets = self.filter_offsets()
+        if previous not in offsets or filter_name not in offsets:
+            return
+        delta = int(round(offsets[filter_name] - offsets[previous]))
+        if delta:
+            current = self.telescope_interface.focuser_get_current_position()
+            logger.info(f"[FOCUSER] - Focus offset {previous} -> {filter_name}: {delta} steps")
+            self.move_focuser_from(current, current + delta, CONFIG['global'].get('focuser_backlash', 0))
+
+    def focus(self, ra: float, dec: float, filter_name: str = None):
+        """
+        Focuses for an observation: the position predicted by the focus model is
+        checked with a single frame, a full autofocus run is done only if the
+        check fails (or without prediction). Full runs feed the model.
+
+        Args:
+            ra, dec: Target of the observation, used for the check frame
+            filter_name: Filter in use
+        """
+        train = focus_model.optical_train()
+        temperature = self.telescope_interface.focuser_get_temperature()
+        prediction = focus_model.predict(train, filter_name, temperature, self.filter_offsets()) if CONFIG['global'].get('focuser_use_model', True) else None
+
+        if prediction is not None:
+            position, expected_fwhm = prediction
+            self.automate_step = AUTOMATE_STEP["FOCUSING"]
+            self.set_status(f"Checking predicted focus {position}", "FOCUSER", "STATUS")
+            logger.info(f"[Focuser] - Model position {position} for {filter_name} at {temperature}°C, expected FWHM {expected_fwhm}")
+            self.move_focuser_from(self.telescope_interface.focuser_get_current_position(), position,
+                                   CONFIG['global'].get('focuser_backlash', 0) or CONFIG['camera'].get('focuser_step', 50))
+            if ra is not None:
+                self.telescope_interface.slew_to_target(ra, dec)
+            fwhm = None
+            try:
+                self.autofocus.clear_measurements()
+                result, binning = self.capture_focus_check(position)
+                if result['valid']:
+                    fwhm = result['fwhm'] * binning
+            except Exception as e:
+                logger.error(f"[FOCUS] - Error checking predicted focus {e}")
+            tolerance = CONFIG['global'].get('focuser_model_tolerance', 1.2)
+            if fwhm is not None and (not expected_fwhm or fwhm <= expected_fwhm * tolerance):
+                logger.info(f"[Focuser] - Predicted focus accepted, FWHM {fwhm}")
+                return position
+            logger.info(f"[Focuser] - Predicted focus rejected, FWHM {fwhm}, running a full autofocus")
+
+        best_position = self.get_focus(ra, dec)
+        if best_position is not None:
+            # FWHM de la courbe à la position retenue, ramenée en pixels non binnés
+            fwhm = self.autofocus.fwhm_at(best_position)
+            focus_model.add(train, filter_name, temperature, best_position, fwhm * self.focus_binning if fwhm else None)
+        return best_position
+
+    def capture_focus_check(self, position: int):
+        """
+        Measures a single frame at `position` the way get_focus measures its sweep:
+        same gain, focus region, binning and debayering
+
+        Returns:
+            (analysis result, binning of the measured frame)
+        """
+        self.telescope_interface.set_gain(100)
+        roi = self.get_focus_roi()
+        binning = CONFIG['global'].get('focuser_roi_bin', 1) if roi else 1
+        data = self.capture_focus_roi(roi) if roi else self.capture_focus_frame()
+        bayer = self.telescope_interface.get_bayer_pattern()[1] if binning == 1 else None
+        return self.analyze_focus_frame(data, position, bayer), binning
+
+    def find_star_field(self, ra: float, dec: float):
+        """
+        Densest star field near the target, from the catalog star density index
+
+        Args:
+            ra: Target right ascension (hours)
+            dec: Target declination (degrees)
+
+        Returns:
+            StarField, None if the index is disabled or unavailable
+        """
+        if not CONFIG['global'].get('focuser_star_field_index', True):
+            return None
+        try:
+            return star_fields.best_field(
+                CONFIG['observatory'].get("latitude", 50),
+                CONFIG['observatory'].get("longitude", 0),
+                min_altitude=CONFIG['global'].get('focuser_star_field_min_altitude', 40),
+                near=(ra, dec),
+                max_distance=CONFIG['global'].get('focuser_star_field_max_distance', 30),
+            )
+        except Exception as e:
+            logger.error(f"[FOCUS] - Star density index unavailable {e}")
+            return None
+
     def get_focus(self, ra: float, dec: float):
         self.set_status(f"Finding good stars area for focusing", "FOCUSER", "STATUS")
         self.automate_step = AUTOMATE_STEP["FOCUSING"]
 
+        image = None
         if (ra!=None):
-            dec = 70 + CONFIG['observatory'].get("latitude", 50) + dec - 90
-
             self.telescope_interface.telescope_set_tracking(0)
             stars=0
-            while stars < 10:
+            field = self.find_star_field(ra, dec)
+            if field is not None:
+                # Un seul pointage : le champ le plus dense est connu à l'avance
+                logger.info(f"[Focuser] - Slewing to star field RA: {field.ra}, DEC: {field.dec} ({field.density:.0f} stars/deg², altitude {field.altitude:.0f}°)")
+                self.telescope_interface.slew_to_target(field.ra, field.dec)
+                image = self.telescope_interface.camera_capture(CONFIG['global'].get("focuser_exposition", 4))
+                if image is None:
+                    logger.error("[Focuser] - Error capturing image")
+                else:
+                    image.data = self.focus_detection_data(image.data)
+                    stars = self.autofocus.count_stars(image.data)
+                    logger.info(f"[Focuser] - Found {stars} stars in the image")
+                ra, dec = (field.ra + 2) % 24, field.dec
+            else:
+                dec = 70 + CONFIG['observatory'].get("latitude", 50) + dec - 90
+
+            # Sans index (ou champ décevant) : recherche par essais successifs,
+            # au plus un tour complet en ascension droite (caméra en panne, ciel couvert)
+            attempts = 0
+            while stars < 10 and attempts < 12:
+                attempts += 1
                 logger.info(f"[Focuser] - Slewing to RA: {ra}, DEC: {dec}")
 
                 self.telescope_interface.slew_to_target(ra, dec)
                 image = self.telescope_interface.camera_capture(CONFIG['global'].get("focuser_exposition", 4))
                 if image is None:
                     logger.error("[Focuser] - Error capturing image")
-                image.data = (image.data / 255).astype(uint8)
+                    ra = (ra + 2) % 24
+                    continue
+                image.data = self.focus_detection_data(image.data)
                 stars = self.autofocus.count_stars(image.data)
                 logger.info(f"[Focuser] - Found {stars} stars in the image")
                 ra = (ra+2) % 24
+            if stars < 10:
+                logger.error("[Focuser] - No star field found for focusing")
+                return None
 
 
         self.set_status(f"Focusing", "FOCUSER", "STATUS")
@@ -157,25 +392,70 @@ class BasicAutomate(threading.Thread, ABC):
         focuser_range = CONFIG['camera'].get('focuser_range', 250)
         focuser_step = CONFIG['camera'].get('focuser_step', 50)
         positions = list(range(current_position-focuser_range, current_position+focuser_range, focuser_step))
-
-        for position in positions:
-            logger.info(f"[Focuser] - Moving to position {position}")
-
-            self.telescope_interface.move_focuser(position)
-            for i in range(CONFIG['global'].get('focuser_image_by_position',1)):
-                logger.info(f"[Focuser] - MTaking picture {i}")
-                try:
-                    #image = (self.camera_capture(CONFIG['global'].get('focuser_exposition',4)).data/255).astype(np.uint8)
-                    image=(FitsImageManager.quick_process(self.telescope_interface.capture_to_fit(CONFIG['global'].get('focuser_exposition',4),0,0,f"{position}","",Path(CONFIG['global'].get("fits_storage_dir")).resolve(),100)).data/255).astype(uint8)
-                except Exception as e:
-                    logger.error(f"[FOCUS] - Error capturing image {e}")
-                result = self.autofocus.analyze_image(image,position)
-                self.set_status(f"Focusing at {position}, FWHM : [{result['fwhm']}]", "FOCUSER", "STATUS")
-                ws_manager.broadcast_sync(ws_manager.format_message("FOCUSER","NEWIMAGE"))
-
-                if not result['valid']:
-                    logger.error("[Focuser] - Invalid capture for autofocus")
-        best_position, best_method, details = self.autofocus.calculate_best_focus()
-        logger.info(f"[Focuser] - Results {best_position}, method={best_method}")
-
-        self.telescope_interface.move_focuser(best_position)
+        roi = self.get_focus_roi(image)
+        self.telescope_interface.set_gain(100)
+
+        adaptive = CONFIG['global'].get('focuser_adaptive', True)
+        overshoot = CONFIG['global'].get('focuser_backlash', 0)
+        search = FocusSearch(
+            self.autofocus, current_position, focuser_range,
+            min_step=CONFIG['global'].get('focuser_min_step', max(1, focuser_step // 4)),
+            max_position=self.telescope_interface.get_max_focuser_step(),
+        )
+        self.autofocus.clear_measurements()
+        bayer = self.telescope_interface.get_bayer_pattern()[1]
+
+        # La région est configurée une seule fois pour tout le balayage, la géométrie du capteur est rétablie à la fin
+        if roi and not self.telescope_interface.camera_begin_roi(
+                roi, CONFIG['global'].get('focuser_roi_bin', 1), CONFIG['global'].get('focuser_fast_readout', False)):
+            logger.error("[Focuser] - Unable to read a sub frame, focusing on full frames")
+            roi = None
+        binning = CONFIG['global'].get('focuser_roi_bin', 1) if roi else 1
+        bayer = bayer if binning == 1 else None
+        self.focus_binning = binning
+
+        # L'analyse de la position N tourne pendant le déplacement et la pose de la position N+1
+        analysis = ThreadPoolExecutor(max_workers=1, thread_name_prefix="autofocus")
+        focuser_position = current_position
+        try:
+            # Les positions d'un lot sont capturées à la suite, le lot suivant dépend de leurs mesures
+            batch = search.next_positions() if adaptive else positions
+            while batch:
+                pending = []
+                for position in batch:
+                    logger.info(f"[Focuser] - Moving to position {position}")
+
+                    self.move_focuser_from(focuser_position, position, overshoot)
+                    search.record(position, 1 if overshoot or position >= focuser_position else -1)
+                    focuser_position = position
+                    for i in range(CONFIG['global'].get('focuser_image_by_position',1)):
+                        logger.info(f"[Focuser] - MTaking picture {i}")
+                        try:
+                            data = self.capture_focus_roi(roi) if roi else self.capture_focus_frame()
+                        except Exception as e:
+                            logger.error(f"[FOCUS] - Error capturing image {e}")
+                            continue
+                        pending.append(analysis.submit(self.analyze_focus_frame, data, position, bayer))
+                for future in pending:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        logger.error(f"[FOCUS] - Error analyzing image {e}")
+                batch = search.next_positions() if adaptive else []
+        finally:
+            analysis.shutdown(wait=True)
+            if roi:
+                self.telescope_interface.camera_end_roi()
+
+        if not overshoot:
+            # Approche finale par le haut, comme la plupart des mesures du balayage
+            overshoot = int(abs(search.backlash)) + search.min_step if search.detect_backlash() else search.coarse_step
+        best_position = search.best_position()
+        logger.info(f"[Focuser] - Results {best_position} after {len(search.directions)} positions")
+        if best_position is None:
+            logger.error("[Focuser] - No focus found, going back to the initial position")
+            self.move_focuser_from(focuser_position, current_position, overshoot)
+            return None
+
+        self.move_focuser_from(focuser_position, best_position, overshoot)
+        return best_position
@@ -4,6 +4,7 @@ import numpy as np
 from services.configurator import CONFIG
 from models.api import ImageSettings
 from typing import List, Dict, Any
+from services.frame_store import FrameStore
 
 @dataclass
 class TelescopeState:
@@ -17,13 +18,30 @@ class TelescopeState:
     is_focuser_connected: bool = False
     plan_active : bool = False
     scheduler = None
-    last_picture: np.ndarray = None
-    last_stacked_picture : np.ndarray = None
+    last_frame = FrameStore()
+    last_stacked_frame = FrameStore()
     dark_processor = None
     image_settings = ImageSettings(stretch=CONFIG['global'].get('initial_stretch',0.15), black_point=CONFIG['global'].get('initial_black_point',80))
     last_focus = [None,None]
     last_analyzed_image = None
     bin_x : int = 1
     bin_y : int = 1
+
+    @property
+    def last_picture(self) -> np.ndarray:
+        return self.last_frame.data
+
+    @last_picture.setter
+    def last_picture(self, data: np.ndarray):
+        self.last_frame.publish(data)
+
+    @property
+    def last_stacked_picture(self) -> np.ndarray:
+        return self.last_stacked_frame.data
+
+    @last_stacked_picture.setter
+    def last_stacked_picture(self, data: np.ndarray):
+        self.last_stacked_frame.publish(data)
+
 telescope_state = TelescopeState()
 
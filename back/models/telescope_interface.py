@@ -4,6 +4,8 @@ from imageprocessing.fitsprocessor import FitsImageManager
 from utils.logger import logger
 from services.configurator import CONFIG
 from pathlib import Path
+from services.frame_index import frame_index
+from services.tile_pyramid import tile_pyramid
 
 
 class TelescopeInterface(ABC):
@@ -12,6 +14,7 @@ class TelescopeInterface(ABC):
         self.fw_name : str = "Not connected"
         self.focuser_name : str = "Not connected"
         self.camera_name : str = "Not connected"
+        self._pending_exposure = None
 
 
     @abstractmethod
@@ -126,6 +129,85 @@ class TelescopeInterface(ABC):
 
     
 
+    def get_filter_focus_offsets(self) -> dict:
+        """
+        Focus offsets stored in the filter wheel, by filter name (empty if unknown)
+        """
+        return {}
+
+    def focuser_get_temperature(self):
+        """
+        Temperature reported by the focuser (°C), None if it has no sensor
+        """
+        return None
+
+    def camera_start_exposure(self, expo: float, light: bool = True):
+        """
+        Starts an exposure and returns without waiting for it
+
+        Drivers able to expose in the background override this method and
+        camera_read_image, the default implementation takes the whole
+        exposure in camera_read_image.
+        """
+        self._pending_exposure = (expo, light)
+
+    def camera_read_image(self):
+        """
+        Waits for the exposure started by camera_start_exposure and downloads it
+
+        Returns:
+            Image, None on capture error
+        """
+        expo, light = self._pending_exposure
+        self._pending_exposure = None
+        return self.camera_capture(expo, light)
+
+    def camera_begin_roi(self, roi: tuple, binning: int = 1, fast_readout: bool = False) -> bool:
+        """
+        Prepares the camera for a series of camera_capture_roi calls on the same region
+
+        Drivers able to read only a region of the sensor configure it once here
+        and restore the previous binning and geometry in camera_end_roi. The
+        default implementation has nothing to prepare.
+
+        Returns:
+            False if the camera could not be configured
+        """
+        return True
+
+    def camera_end_roi(self):
+        """
+        Restores the sensor settings saved by camera_begin_roi
+        """
+        pass
+
+    def camera_capture_roi(self, expo: float, roi: tuple, binning: int = 1, fast_readout: bool = False):
+        """
+        Captures a sub frame of the sensor, in memory
+
+        Drivers able to read only a region of the sensor override this method,
+        the default implementation crops (and bins) a full frame.
+        Between camera_begin_roi and camera_end_roi, captures of the prepared
+        region send no setup request to the camera.
+
+        Args:
+            expo: Exposure time in seconds
+            roi: (x, y, width, height) in unbinned sensor pixels
+            binning: Binning factor applied to the region
+            fast_readout: Use the fast readout mode of the camera if available
+
+        Returns:
+            Image whose data is the (binned) region, None on capture error
+        """
+        image = self.camera_capture(expo)
+        if image is None:
+            return None
+        x, y, width, height = roi
+        image.data = image.data[y:y + height, x:x + width]
+        if binning > 1:
+            image.data = FitsImageManager.bin_image(image.data, binning)
+        return image
+
     def get_fit_header(self, exposure: int, gain:int):
         sensor, bayer, color_type = self.get_bayer_pattern()
         header={}
@@ -137,29 +219,49 @@ class TelescopeInterface(ABC):
         header["EXPTIME"] = exposure
         header["GAIN"] = gain
         header['DATE-OBS'] = time.strftime('%Y-%m-%dT%H.%M.%S')
+        if CONFIG['camera'].get("is_cooled", False):
+            try:
+                header['CCD-TEMP'] = self.get_ccd_temperature()
+            except Exception as e:
+                logger.warning(f"[CAPTURE] - Unable to read CCD temperature: {e}")
         return header
 
-    def capture_to_fit(self, exposure : int, ra : float, dec : float, filter_name : str, target_name, path: Path, gain : int) :
-        self.set_gain(gain)
-        image = self.camera_capture(exposure)
+    def capture_header(self, exposure: int, ra: float, dec: float, filter_name: str, target_name, gain: int) -> dict:
+        """FITS header of a light frame, to be built when its exposure starts (DATE-OBS)"""
         header = self.get_fit_header(exposure, gain)
         header['RA'] = ra
         header['DEC'] = dec
-        #header['NAXIS'] = image.data.ndim
-        #header['NAXIS1'] = image.data.shape[1]  # largeur
-        #header['NAXIS2'] = image.data.shape[0]  # hauteur
+        header['OBJECT'] = target_name
+        header['FILTER'] = filter_name
+        return header
 
-        #if (image.data.ndim==3):
-        #    header['NAXIS3'] = image.data.shape[2]
-        #header['CTYPE1'] = 'PIXELS'
-        #header['CTYPE2'] = 'PIXELS'
+    def save_capture(self, image, header: dict, path: Path):
+        """
+        Writes a captured frame as FITS, then indexes it and registers its tiles
 
-        file_name = path / f"capture-{target_name.replace(' ', '_')}-{filter_name.replace(' ', '_')}-{header['DATE-OBS']}.fits"
+        Returns:
+            Path of the FITS file, None without image
+        """
+        file_name = path / f"capture-{header['OBJECT'].replace(' ', '_')}-{header['FILTER'].replace(' ', '_')}-{header['DATE-OBS']}.fits"
         if image is None:
             logger.error("[CAPTURE] - Error capturing image")
             return None
         FitsImageManager.save_fits_from_array(image.data, file_name, header)
+        try:
+            frame_index.add_frame(file_name, header, image.data.shape)
+        except Exception as e:
+            logger.error(f"[CAPTURE] - Error indexing {file_name}: {e}")
+        try:
+            tile_pyramid.register(file_name, image.data.shape, kind="frame")
+        except Exception as e:
+            logger.error(f"[CAPTURE] - Error registering tiles of {file_name}: {e}")
         return file_name
+
+    def capture_to_fit(self, exposure : int, ra : float, dec : float, filter_name : str, target_name, path: Path, gain : int) :
+        self.set_gain(gain)
+        header = self.capture_header(exposure, ra, dec, filter_name, target_name, gain)
+        image = self.camera_capture(exposure)
+        return self.save_capture(image, header, path)
     
     @abstractmethod
     def connect(self):
@@ -1,46 +1,56 @@
 from fastapi import APIRouter, Query, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from models.state import telescope_state
 from typing import List,  Dict, Any
 
-from services.telescope_interface import telescope_interface
+from services.telescope_interface import telescope_interface, async_telescope_interface
 from services.focuser_automate import FocuserAutomate
 
 router = APIRouter(prefix="/focuser", tags=["focuser"])
 lock_focuser = False
 
 
+async def focuser_call(name: str, *args):
+    """Calls the focuser through the asyncio interface, or the synchronous one in a worker thread"""
+    if async_telescope_interface is not None:
+        return await getattr(async_telescope_interface, name)(*args)
+    return await run_in_threadpool(getattr(telescope_interface, name), *args)
+
+
 @router.get('/')
-def get_focuser_position():
+async def get_focuser_position():
     if telescope_state.is_focuser_connected:
-        return telescope_interface.focuser_get_current_position()
+        return await focuser_call("focuser_get_current_position")
     raise HTTPException(status_code=503, detail="No Focuser")
 
 
 @router.post('/stop')
-def get_focuser_position():
+async def get_focuser_position():
     if telescope_state.is_focuser_connected:
-        telescope_interface.focuser_halt()
+        await focuser_call("focuser_halt")
         return True
     raise HTTPException(status_code=503, detail="No Focuser")
 
 
 @router.get('/max')
-def get_focuser_position():
+async def get_focuser_position():
     if telescope_state.is_focuser_connected:
-        return telescope_interface.get_max_focuser_step()
+        return await focuser_call("get_max_focuser_step")
     raise HTTPException(status_code=503, detail="No Focuser")
 
 
 @router.post('/{position}')
-def move_focuser(position: int) -> int:
+async def move_focuser(position: int) -> int:
     global lock_focuser
     if lock_focuser:
         raise HTTPException(status_code=503, detail="Focuser Busy")
     if telescope_state.is_focuser_connected:
         lock_focuser=True
-        telescope_interface.move_focuser(position)
-        lock_focuser=False
-        return telescope_interface.focuser_get_current_position()
+        try:
+            await focuser_call("move_focuser", position)
+        finally:
+            lock_focuser=False
+        return await focuser_call("focuser_get_current_position")
     raise HTTPException(status_code=503, detail="No Focuser")
 
 @router.get('/lastfocus')
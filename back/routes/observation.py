@@ -1,16 +1,16 @@
-from fastapi import APIRouter, Query, HTTPException, Body
+from fastapi import APIRouter, Query, HTTPException, Body, Request, Response, Depends
 from fastapi.responses import StreamingResponse, FileResponse
-from typing import List
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Literal, Optional
 from models.api import PlanType, ImageSettings
+from imageprocessing.pipeline import FilterPipeline
+from imageprocessing.imagestats import ImageStats
 from services.skymap import generate_dso_image, generate_map
 from models.state import telescope_state
 from services.scheduler import Scheduler
-from services.telescope_interface import telescope_interface
+from services.telescope_interface import telescope_interface, async_telescope_interface
 from models.observation import Observation,PlansExecutionType
-from imageprocessing.astrofilters import AstroFilters
 import numpy as np
-import io
-from PIL import Image
 from services.configurator import CURRENT_DIR
 from pathlib import Path
 from services.history_manager import HistoryManager
@@ -18,12 +18,19 @@ from imageprocessing.fitsprocessor import FitsImageManager
 from services.configurator import CONFIG
 from services.focuser import AutoFocusLib
 from utils.section_timer import SectionTimer
-from time import sleep
+from services.frame_index import frame_index
+from services.frame_store import FrameStore
+from services.tile_pyramid import tile_pyramid
+from services.preview_encoding import PreviewEncoding, PREVIEW_FORMATS, encode_preview
+from services.thumbnail_cache import thumbnail_cache
+from services.preview_render import astro_filters, settings_key, get_preview_pipeline, render_uint8
+import asyncio
+from uuid import uuid4
+import hashlib
 
 router = APIRouter(prefix="/observation", tags=["observation"])
-astro_filters = AstroFilters()
 fits_manager = FitsImageManager()
-autofocus = AutoFocusLib( )
+autofocus = AutoFocusLib(mode=CONFIG['global'].get('focuser_measure', 'fast'))
 
 @router.get("/plot")
 def get_dso_image(object: str = Query(..., description="Nom ou identifiant de l'objet (ex: M31, NGC 7000)")):
@@ -52,64 +59,91 @@ async def return_image(image_path: Path):
         filename=image_path.name
     )
 
-def transform_to_jpg(image):
-    try:
+def waiting_image():
+    return FileResponse(
+        path=(CURRENT_DIR.parent / Path("assets") /  Path("image_waiting.png")).resolve(),
+        media_type="image/png",  # Adapter selon le type d'image
+        filename="image_waiting.png"
+    )
 
-        if image is None:
-            return FileResponse(
-                path=(CURRENT_DIR.parent / Path("assets") /  Path("image_waiting.png")).resolve(),
-                media_type="image/png",  # Adapter selon le type d'image
-                filename="image_waiting.png"
-            )
+def preview_encoding(
+    width: Optional[int] = Query(None, ge=16, le=16384, description="Largeur maximale de l'aperçu en pixels (taille d'origine par défaut)"),
+    quality: int = Query(95, ge=1, le=100, description="Qualité de compression"),
+    format: Literal["jpeg", "webp"] = Query("jpeg", description="Format de l'aperçu"),
+) -> PreviewEncoding:
+    """Query parameters shared by the preview endpoints"""
+    return PreviewEncoding(width, quality, format)
 
+def encode_jpg(image: np.ndarray, settings: ImageSettings, timer: SectionTimer = None, stats: ImageStats = None, encoding: PreviewEncoding = PreviewEncoding()) -> bytes:
+    """
+    Stretch an image with the given settings and encode it (JPEG q95 full size by default)
+    """
+    return encode_preview(render_uint8(image, settings, timer, stats), encoding)
+
+def preview_response(data: bytes, encoding: PreviewEncoding = PreviewEncoding(), headers: dict = None):
+    extension, _, media_type = PREVIEW_FORMATS[encoding.format]
+    return Response(
+        content=data,
+        media_type=media_type,
+        headers={"Content-Disposition": f"inline; filename=last_image{extension}", **(headers or {})}
+    )
 
-        
-        image = fits_manager.normalize(image)
-        processed_image =  astro_filters.replace_lowest_percent_by_zero(astro_filters.auto_stretch(image, telescope_state.image_settings.stretch, algo=0, shadow_clip=-2),telescope_state.image_settings.black_point)
-        #processed_image = astro_filters.asinh_stretch_color(image, 0.2)
-
-        #astro_filters.denoise_gaussian()
-        #astro_filters.replace_lowest_percent_by_zero(
-        #, 
-        #        80
-        #    )
-        # Convertir en format PIL Image
-        # Supposons que processed_image est un array numpy
-        if isinstance(processed_image, np.ndarray):
-            # Normaliser les valeurs entre 0 et 255 si nécessaire
-            if processed_image.dtype != np.uint8:
-                # Normaliser entre 0 et 1 puis convertir en uint8
-                processed_image = ((processed_image - processed_image.min()) / 
-                                (processed_image.max() - processed_image.min()) * 255).astype(np.uint8)
-            
-            # Créer une image PIL
-            if len(processed_image.shape) == 3:  # Image couleur
-                pil_image = Image.fromarray(processed_image, mode='RGB')
-            else:  # Image en niveaux de gris
-                pil_image = Image.fromarray(processed_image, mode='L')
-        else:
-            # Si l'image est déjà au format PIL
-            pil_image = processed_image
-        
-        # Convertir en JPG et sauvegarder dans un buffer
-        img_buffer = io.BytesIO()
-        pil_image.save(img_buffer, format='JPEG', quality=95)
-        img_buffer.seek(0)
-        
+# Les versions des frames repartent de 1 à chaque démarrage, l'epoch évite de valider un ancien cache navigateur
+ETAG_EPOCH = uuid4().hex[:8]
 
-        # Retourner la réponse streaming
-        return StreamingResponse(
-            io.BytesIO(img_buffer.read()),
-            media_type="image/jpeg",
-            headers={"Content-Disposition": "inline; filename=last_image.jpg"}
-        )
+def cached_jpg_response(request: Request, store: FrameStore, name: str, timer: SectionTimer = None, preview_builder = None, encoding: PreviewEncoding = PreviewEncoding()):
+    """
+    Return the encoded preview of the current frame of a store with a strong ETag
+    The stretched image is computed once per (frame version, image settings) and
+    encoded once per size/quality/format, a 304 Not Modified is returned when the
+    client already has it
+
+    Args:
+        request: Incoming request, for the If-None-Match header
+        store: Frame store holding the image
+        name: Name used in the ETag
+        timer: Optional SectionTimer
+        preview_builder: Optional function building the image to encode from the raw frame
+        encoding: Size, quality and format of the preview
+
+    Returns:
+        Response with the image, a 304 or the waiting image
+    """
+    version, raw = store.snapshot()
+    if raw is None:
+        if timer: timer.mark("no_image")
+        return waiting_image()
+
+    settings = telescope_state.image_settings
+    key = settings_key(settings)
+    etag = f'"{name}-{ETAG_EPOCH}-{version}-{hashlib.sha1(repr((key, encoding)).encode()).hexdigest()[:12]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        if timer: timer.mark("not_modified")
+        return Response(status_code=304, headers=headers)
+
+    try:
+        image, stats_name = raw, "stats"
+        if preview_builder is not None:
+            image, stats_name = store.get_product(version, "preview", lambda: preview_builder(raw)), "preview_stats"
+            if timer: timer.mark(f"preview v{version}")
+        # Les statistiques sont gardées par version : changer les réglages ne refait pas les histogrammes
+        stats = store.get_product(version, stats_name, lambda: ImageStats(image))
+        rendered = store.get_product(version, ("uint8", key), lambda: render_uint8(image, settings, timer, stats))
+        if timer: timer.mark("render_uint8")
+        data = store.get_product(version, ("encoded", key, encoding), lambda: encode_preview(rendered, encoding))
+        if timer: timer.mark(f"encode_{encoding.format}")
     except Exception as e:
-        
-        return FileResponse(
-            path=(CURRENT_DIR.parent / Path("assets") /  Path("image_waiting.png")).resolve(),
-            media_type="image/png",  # Adapter selon le type d'image
-            filename="image_waiting.png"
-        )
+        return waiting_image()
+    return preview_response(data, encoding, headers)
+
+def transform_to_jpg(image, encoding: PreviewEncoding = PreviewEncoding()):
+    try:
+        if image is None:
+            return waiting_image()
+        return preview_response(encode_jpg(image, telescope_state.image_settings, encoding=encoding), encoding)
+    except Exception as e:
+        return waiting_image()
 
 
 @router.get('/image_settings')
@@ -118,63 +152,101 @@ def get_image_settings() -> ImageSettings:
 
 @router.put('/image_settings')
 def set_image_settings(settings: ImageSettings) -> ImageSettings:
+    # Le frontend n'envoie que stretch et black_point : on conserve alors la chaîne de filtres en place
+    if "pipeline" not in settings.model_fields_set:
+        settings.pipeline = telescope_state.image_settings.pipeline
+    if settings.pipeline is not None:
+        try:
+            FilterPipeline.from_spec(settings.pipeline)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     telescope_state.image_settings = settings
     return get_image_settings()
 
 
 
+def frame_stats(store: FrameStore, bins: int):
+    """
+    Statistics of the current frame of a store, computed once per frame version
+    """
+    version, raw = store.snapshot()
+    if raw is None:
+        raise HTTPException(status_code=404, detail="No image available")
+    stats = store.get_product(version, "stats", lambda: ImageStats(raw))
+    return {"version": version, **stats.to_dict(bins)}
+
+@router.get("/last_image/stats")
+def get_last_image_stats(bins: int = Query(256, ge=2, le=4096)):
+    """
+    Per channel statistics and histogram of the last image taken by the telescope
+    """
+    return frame_stats(telescope_state.last_frame, bins)
+
+@router.get("/last_stacked_image/stats")
+def get_last_stacked_image_stats(bins: int = Query(256, ge=2, le=4096)):
+    """
+    Per channel statistics and histogram of the last stacked image
+    """
+    return frame_stats(telescope_state.last_stacked_frame, bins)
+
 @router.get("/last_stacked_image")
-def get_last_stacked_image():
+def get_last_stacked_image(request: Request, encoding: PreviewEncoding = Depends(preview_encoding)):
+    """
+    Retourne la dernière image empilée
+    """
+    return cached_jpg_response(request, telescope_state.last_stacked_frame, "stacked", encoding=encoding)
+
+
+def build_preview(image: np.ndarray, timer: SectionTimer) -> np.ndarray:
     """
-    Retourne une image depuis le dossier images/
+    Debayer and bin a raw frame to the live stacking image size
+    The binning is done here instead just after the image is taken for performance reasons
     """
-    # Définir le chemin du dossier d'images
-    image = telescope_state.last_stacked_picture
-    return transform_to_jpg(image)
+    bin_factor = 1
+    target_width = CONFIG['global'].get("live_stacking_image_size", 800)
+    if target_width > 0:
+        h, w = image.shape[:2]
+        if w > target_width:
+            bin_factor = max(1, w // target_width)
+    timer.mark("compute_bin_factor")
+
+    if len(image.shape) < 3:
+        sensor, bayer, color_type = telescope_interface.get_bayer_pattern()
+        timer.mark("get_bayer_pattern")
+
+        if bayer:
+            if bin_factor >= 2:
+                # Bin the raw mosaic (CFA preserving) so that debayering runs on the small frame
+                image = FitsImageManager.bin_image(image, bin_factor, bayer=True)
+                timer.mark(f"bin_image bayer x{bin_factor}")
+                bin_factor = 1
+            image = fits_manager.debayer(image, bayer)
+            timer.mark("debayer")
+
+    if bin_factor >= 2:
+        image = FitsImageManager.bin_image(image, bin_factor)
+        timer.mark(f"bin_image x{bin_factor}")
+    return image
 
 
 @router.get("/last_image")
-def get_last_image():
+def get_last_image(request: Request, encoding: PreviewEncoding = Depends(preview_encoding)):
     """
     Return the last image taken by the telescope
     If the image is not set, return a waiting image
-    The binning is done here instead just after the image is taken for performance reasons
+    The preview and its JPEG are computed once per frame version and cached in the frame store,
+    a 304 is returned when the client already has the current version
     """
     timer = SectionTimer("get_last_image")
     try:
-        if telescope_state.last_picture is not None:
-            image = telescope_state.last_picture.copy()
-            timer.mark("copy last_picture")
-
-            if len(image.shape) < 3:
-                sensor, bayer, color_type = telescope_interface.get_bayer_pattern()
-                timer.mark("get_bayer_pattern")
-
-                if bayer:
-                    image = fits_manager.debayer(image, bayer)
-                    timer.mark("debayer")
-                    telescope_state.last_picture = image.copy()
-                    timer.mark("cache_debayered_copy")
-
-            target_width = CONFIG['global'].get("live_stacking_image_size", 800)
-            if target_width > 0:
-                h, w = image.shape[:2]
-                if w > target_width:
-                    bin_factor = max(1, w // target_width)
-                    timer.mark("compute_bin_factor")
-                    if bin_factor >= 2:
-                        image = FitsImageManager.bin_image(image, bin_factor)
-                        timer.mark(f"bin_image x{bin_factor}")
-                        telescope_state.last_picture = image.copy()
-                        timer.mark("cache_binned_copy")
-        else:
-            image = None
-            timer.mark("no_last_picture")
-
-        jpg = transform_to_jpg(image)
-        timer.mark("transform_to_jpg")
-        return jpg
-
+        return cached_jpg_response(
+            request,
+            telescope_state.last_frame,
+            "last",
+            timer,
+            lambda raw: build_preview(raw, timer),
+            encoding
+        )
     finally:
         timer.end()
 
@@ -189,18 +261,98 @@ def get_history() -> PlansExecutionType:
         return history.history
         
 @router.get("/history/{index}")
-def get_history_image(index: int):
+def get_history_image(request: Request, index: int, encoding: PreviewEncoding = Depends(preview_encoding)):
+    """
+    Return a preview of the stacked image of an observation of the history
+    Previews are generated once per FITS content, size and stretch settings,
+    stored next to the FITS and then served from disk
+    """
     history = get_history()
-    if index<len(history):
-        image = history[index].jpg
+    if index<len(history) and history[index].jpg:
+        settings = telescope_state.image_settings
         try:
-            image = fits_manager.open_fits(image)
-        except:
+            etag = thumbnail_cache.etag(history[index].jpg, encoding, settings)
+            headers = {"ETag": etag, "Cache-Control": "no-cache"}
+            if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+                return Response(status_code=304, headers=headers)
+            path = thumbnail_cache.get(history[index].jpg, encoding, settings)
+        except Exception as e:
             raise HTTPException(status_code=404, detail="Chemin invalide")
-        if image!=None:
-            return transform_to_jpg(image.data)
+        return FileResponse(path, media_type=PREVIEW_FORMATS[encoding.format][2], headers=headers)
+    raise HTTPException(status_code=404, detail="Chemin invalide")
+
+@router.get("/history/{index}/frames")
+def get_history_frames(index: int):
+    """
+    Return the indexed frames captured for an observation of the history
+    """
+    history = get_history()
+    if index<len(history) and history[index].jpg:
+        # Stacked images are stored in <observation directory>/stacked/
+        return frame_index.find_frames(directory=Path(history[index].jpg).parent.parent)
     raise HTTPException(status_code=404, detail="Chemin invalide")
 
+@router.get("/frames")
+def get_frames(target: str = None, filter: str = None, exposure: float = None, gain: int = None, temperature: float = None,
+               exposure_tolerance: float = 1e-3, temperature_tolerance: float = 1.0):
+    """
+    Return the indexed frames matching the given acquisition parameters
+    """
+    return frame_index.find_frames(target=target, filter_name=filter, exposure=exposure, gain=gain, temperature=temperature,
+                                   exposure_tolerance=exposure_tolerance, temperature_tolerance=temperature_tolerance)
+
+@router.get("/history/{index}/tiles")
+def get_history_tiles(index: int):
+    """
+    Return the deep-zoom pyramid of the stacked image of an observation of the history
+    """
+    history = get_history()
+    if index<len(history) and history[index].jpg:
+        try:
+            return tile_pyramid.describe(tile_pyramid.register(Path(history[index].jpg), kind=None))
+        except (OSError, KeyError):
+            pass
+    raise HTTPException(status_code=404, detail="Chemin invalide")
+
+@router.get("/tiles/last/{kind}")
+def get_last_tiles(kind: Literal["frame", "stacked"]):
+    """
+    Return the deep-zoom pyramid of the last saved frame or stacked image
+    """
+    try:
+        return tile_pyramid.describe(tile_pyramid.latest[kind])
+    except KeyError:
+        raise HTTPException(status_code=404, detail="No image available")
+
+@router.get("/tiles/{pyramid_id}")
+def get_tiles(pyramid_id: str):
+    """
+    Return the size, tile size and zoom levels of a deep-zoom pyramid
+    """
+    try:
+        return tile_pyramid.describe(pyramid_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown pyramid")
+
+@router.get("/tiles/{pyramid_id}/{z}/{x}/{y}.jpg")
+def get_tile(request: Request, pyramid_id: str, z: int, x: int, y: int):
+    """
+    Return a JPEG tile of a deep-zoom pyramid, stretched with the current image settings
+    Level max_zoom is the full resolution image, level 0 holds the whole image in one tile
+    Tiles are rendered on the first request and then served from the disk cache
+    """
+    settings = telescope_state.image_settings
+    try:
+        path = tile_pyramid.tile(pyramid_id, z, x, y, settings.stretch, settings.black_point)
+    except (KeyError, IndexError):
+        raise HTTPException(status_code=404, detail="Unknown tile")
+    # Tuile mise en cache par réglages : le navigateur revalide avec l'ETag du fichier
+    stat = path.stat()
+    headers = {"ETag": f'"{path.parent.parent.name}-{stat.st_mtime_ns:x}-{stat.st_size:x}"', "Cache-Control": "no-cache"}
+    if headers["ETag"] in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
+
 @router.post("/start")
 def receive_plans(plans: List[PlanType]):
     """
@@ -261,36 +413,50 @@ def stop_observation():
     return {"status": "stopped", "message": "Observation stopped"}
 
 
+def set_focuser_binning():
+    telescope_state.bin_x = CONFIG['camera'].get("binx_focuser",1)
+    telescope_state.bin_y=CONFIG['camera'].get("biny_focuser",1)
+    telescope_interface.set_bin_x(CONFIG['camera'].get("binx_focuser",1))
+    telescope_interface.set_bin_y(CONFIG['camera'].get("biny_focuser",1))
+
+
+def captured_image(request: Request, timer: SectionTimer):
+    #telescope_state.last_analyzed_image=autofocus.analyze_image(telescope_state.last_picture,None)
+    autofocus.set_buffer_image(telescope_state.last_picture)
+    timer.mark("fhwm")
+    timer.end()
+    return get_last_image(request, PreviewEncoding())
+
+
 @router.post('/capture')
-def get_capture(exposition: int = Body(..., embed=True)):
+async def get_capture(request: Request, exposition: int = Body(..., embed=True)):
+    """
+    Takes a frame and returns its preview
+    The exposure is awaited on the asyncio Alpaca interface, no worker thread is held during the capture
+    """
     global autofocus
     if (telescope_state.bin_x!=CONFIG['camera'].get("binx_focuser",1)):
-        telescope_state.bin_x = CONFIG['camera'].get("binx_focuser",1)
-        telescope_state.bin_y=CONFIG['camera'].get("biny_focuser",1)
-        telescope_interface.set_bin_x(CONFIG['camera'].get("binx_focuser",1))
-        telescope_interface.set_bin_y(CONFIG['camera'].get("biny_focuser",1))
+        await run_in_threadpool(set_focuser_binning)
 
-        sleep(0.5)
+        await asyncio.sleep(0.5)
 
     timer = SectionTimer("get_capture")
 
     if telescope_state.scheduler and telescope_state.scheduler.is_alive():
-        return get_last_image()
+        return await run_in_threadpool(get_last_image, request, PreviewEncoding())
     if telescope_state.dark_processor and telescope_state.dark_processor.is_running:
-        return get_last_image()
+        return await run_in_threadpool(get_last_image, request, PreviewEncoding())
     timer.mark("check")
 
     if CONFIG['global'].get('debug', False):
-        telescope_interface.capture_to_fit(exposition, 0, 0, "", "", Path(CONFIG['global'].get("fits_storage_dir")),100)
+        await run_in_threadpool(telescope_interface.capture_to_fit, exposition, 0, 0, "", "", Path(CONFIG['global'].get("fits_storage_dir")),100)
+    elif async_telescope_interface is not None:
+        await async_telescope_interface.camera_capture(exposition,True)
     else:
-        telescope_interface.camera_capture(exposition,True)
+        await run_in_threadpool(telescope_interface.camera_capture, exposition,True)
     timer.mark("capture")
 
-    #telescope_state.last_analyzed_image=autofocus.analyze_image(telescope_state.last_picture,None)
-    autofocus.set_buffer_image(telescope_state.last_picture)
-    timer.mark("fhwm")
-    timer.end()
-    return get_last_image()
+    return await run_in_threadpool(captured_image, request, timer)
 
 @router.get('/last_analyzed')
 def get_last_fhwm():
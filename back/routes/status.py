@@ -3,6 +3,7 @@ from typing import Dict
 from models.state import telescope_state
 from services.telescope_interface import telescope_interface
 from services.configurator import CONFIG
+from services.capture_stats import capture_stats
 
 
 router = APIRouter(prefix="/status", tags=["status"])
@@ -71,4 +72,12 @@ def get_operation_status():
     if telescope_state.scheduler:
         return telescope_state.scheduler.automate_step
     else:
-        return -1
\ No newline at end of file
+        return -1
+
+
+@router.get("/capture_stats")
+def get_capture_stats():
+    """
+    Inter-frame dead time of the last captures (seconds) and sky time efficiency.
+    """
+    return capture_stats.summary()
@@ -0,0 +1,65 @@
+import threading
+from collections import deque
+from time import perf_counter
+from typing import Any, Dict, Optional
+from utils.logger import logger
+
+
+class CaptureStats:
+    """
+    Inter-frame dead time of the capture sequences.
+
+    The dead time of a frame is the time between the end of the previous
+    exposure (start + duration) and its own start: readout, download and
+    whatever the loop does before starting the next exposure. A sequence
+    (new_sequence) is a run of frames taken back to back on a target, the
+    first frame of a sequence has no dead time.
+    """
+
+    def __init__(self, window: int = 100):
+        self._lock = threading.Lock()
+        self._frames = deque(maxlen=window)
+        self._previous_end: Optional[float] = None
+        self.total_frames = 0
+
+    def new_sequence(self) -> None:
+        """Slew, focus or filter change: the next frame is not back to back"""
+        with self._lock:
+            self._previous_end = None
+
+    def exposure_started(self, duration: float) -> Optional[float]:
+        """
+        Records the start of an exposure
+
+        Returns:
+            Dead time since the end of the previous exposure (s), None for the first frame of a sequence
+        """
+        now = perf_counter()
+        with self._lock:
+            dead_time = None if self._previous_end is None else max(0.0, now - self._previous_end)
+            self._previous_end = now + duration
+            self._frames.append((duration, dead_time))
+            self.total_frames += 1
+        if dead_time is not None:
+            logger.info(f"[CAPTURE] - Dead time {dead_time * 1000:.0f} ms before a {duration:.1f} s exposure")
+        return dead_time
+
+    def summary(self) -> Dict[str, Any]:
+        """Dead time of the last frames, efficiency = exposure / (exposure + dead time)"""
+        with self._lock:
+            chained = [(duration, dead) for duration, dead in self._frames if dead is not None]
+            total_frames = self.total_frames
+        if not chained:
+            return {"frames": total_frames, "last_dead_time": None, "mean_dead_time": None, "max_dead_time": None, "efficiency": None}
+        exposure = sum(duration for duration, _ in chained)
+        dead = [dead for _, dead in chained]
+        return {
+            "frames": total_frames,
+            "last_dead_time": dead[-1],
+            "mean_dead_time": sum(dead) / len(dead),
+            "max_dead_time": max(dead),
+            "efficiency": exposure / (exposure + sum(dead)) if exposure + sum(dead) > 0 else None,
+        }
+
+
+capture_stats = CaptureStats()
@@ -1,5 +1,5 @@
 import httpx
-from typing import Optional, Dict, Any, List, Union
+from typing import Optional, Dict, Any, List, Union, Tuple
 from pydantic import BaseModel,ConfigDict
 from enum import Enum
 import threading
@@ -460,6 +460,49 @@ class ExposureSettings(BaseModel):
     num_y: Optional[int] = None
     light: bool = True  # True pour image, False pour dark
 
+class ImageBufferPool:
+    """
+    Reusable receive buffers for the images
+
+    A buffer is reused once no array (np.frombuffer, memoryview) refers to
+    it anymore, otherwise a new one is allocated and pooled while the pool is
+    not full. Images can thus be kept by their consumers as long as needed.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._buffers: List[bytearray] = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def in_use(buffer: bytearray) -> bool:
+        """True while an array (or memoryview) still refers to the buffer"""
+        try:
+            # Un bytearray exporté (np.frombuffer, memoryview) ne peut pas changer de taille
+            buffer.append(0)
+            buffer.pop()
+            return False
+        except BufferError:
+            return True
+
+    def acquire(self, n: int) -> memoryview:
+        """Receive buffer of n bytes"""
+        with self._lock:
+            free = [i for i, buffer in enumerate(self._buffers) if not self.in_use(buffer)]
+            for i in free:
+                if len(self._buffers[i]) >= n:
+                    return memoryview(self._buffers[i])[:n]
+            buffer = bytearray(n)
+            if free:
+                # Tampon libre mais trop petit (sous-image puis image complète) : remplacé
+                self._buffers[free[0]] = buffer
+            elif len(self._buffers) < self.size:
+                self._buffers.append(buffer)
+            return memoryview(buffer)
+
+    def __len__(self) -> int:
+        return len(self._buffers)
+
 class ImageData(BaseModel):
     width: int
     height: int
@@ -480,14 +523,15 @@ class ASCOMAlpacaCameraClient(ASCOMAlpacaBaseClient):
 
     HEADER_SIZE = 44  # bytes
     HEADER_FMT = "<iiIIiiiiiii" 
+    # Tampons de réception réutilisés : image affichée, image en cours d'écriture, image reçue
+    IMAGE_BUFFER_POOL = 3
 
     def __init__(self, host="localhost", port=11111, device_number=0):
         super().__init__(ASCOMDeviceType.CAMERA, host, port, device_number)
         self.last_exposure=0
         self.last_time=None
         self._cached_dimensions = None
-        self._image_buffer = None
-        self._buffer_shape = None
+        self._image_buffer = ImageBufferPool(self.IMAGE_BUFFER_POOL)
         self._binning = [1,1]
 
     def set_camera_gain(self, gain: int)-> None :
@@ -604,11 +648,12 @@ class ASCOMAlpacaCameraClient(ASCOMAlpacaBaseClient):
         result = self._make_request("GET", "imageready")
         return result.get("Value", False)
     
-    def _read_exact_from_iter(self, iterator, n: int, *, discard: bool = False, _stash: dict = None) -> memoryview:
+    def _read_exact_from_iter(self, iterator, n: int, *, discard: bool = False, _stash: dict = None, out: memoryview = None) -> memoryview:
         """
         Read n bytes from iterator, managing stash.
         If discard=True, trash the read bytes without returning them (usefull to skip padding)
         Return a memoryview on the buffer if discard=False, else a empty mv
+        If out is given (n bytes), the bytes are written into it instead of a new buffer
         """
         if _stash is None:
             _stash = {"leftover": b""}
@@ -632,8 +677,7 @@ class ASCOMAlpacaCameraClient(ASCOMAlpacaBaseClient):
             return memoryview(b"")
 
         # lecture “utile”
-        buf = bytearray(n)
-        mv  = memoryview(buf)
+        mv  = out if out is not None else memoryview(bytearray(n))
         i   = 0
 
         # consommer d'abord le leftover
@@ -661,6 +705,14 @@ class ASCOMAlpacaCameraClient(ASCOMAlpacaBaseClient):
         return mv
 
     def get_image_array(self) -> ImageData:
+        """
+        Downloads the last image (imagebytes) into a pooled receive buffer
+
+        Ownership: the returned data is a read-only numpy view on the receive
+        buffer, no copy is made. Consumers may keep it as long as they need
+        (the buffer is reused only once no array refers to it anymore) but
+        must copy it before modifying it.
+        """
         url = f"{self.base_url}/imagearray"
         params = {
             "ClientID": self.client_id,
@@ -710,12 +762,13 @@ class ASCOMAlpacaCameraClient(ASCOMAlpacaBaseClient):
             n_bytes  = n_elems * itemsize
 
             # 4) Lire le payload image exactement n_bytes
-            payload_mv = self._read_exact_from_iter(it, n_bytes, _stash=stash)
+            payload_mv = self._read_exact_from_iter(it, n_bytes, _stash=stash, out=self._image_buffer.acquire(n_bytes))
 
         t1 = time.perf_counter()
 
         # 5) numpy zero copy + reshape
         arr = np.frombuffer(payload_mv, dtype=dtype, count=n_elems).reshape(shape)
+        arr.flags.writeable = False
 
         logger.info(
             f"[CAMERA] - imagebytes streamed in {(t1 - t0)*1000:.1f} ms | "
@@ -774,6 +827,37 @@ class ASCOMAlpacaCameraClient(ASCOMAlpacaBaseClient):
         """Définit le binning"""
         self._make_request("PUT", "numy", {"NumY": numy})
 
+    def get_subframe(self) -> Tuple[int, int, int, int, int, int]:
+        """Zone lue par le capteur : (start_x, start_y, num_x, num_y, bin_x, bin_y)"""
+        return tuple(int(self._make_request("GET", name).get("Value", 0))
+                     for name in ("startx", "starty", "numx", "numy", "binx", "biny"))
+
+    def set_subframe(self, start_x: int, start_y: int, num_x: int, num_y: int, binning: int = 1) -> None:
+        """Définit la zone lue par le capteur, coordonnées en pixels binnés"""
+        self._make_request("PUT", "binx", {"BinX": binning})
+        self._make_request("PUT", "biny", {"BinY": binning})
+        self._binning = [binning, binning]
+        # Taille d'abord : StartX + NumX doit rester dans le capteur à chaque étape
+        self._make_request("PUT", "numx", {"NumX": num_x})
+        self._make_request("PUT", "numy", {"NumY": num_y})
+        self._make_request("PUT", "startx", {"StartX": start_x})
+        self._make_request("PUT", "starty", {"StartY": start_y})
+
+    def restore_subframe(self, subframe: Tuple[int, int, int, int, int, int]) -> None:
+        """Rétablit une zone lue par get_subframe (binning compris)"""
+        start_x, start_y, num_x, num_y, bin_x, bin_y = subframe
+        # Origine d'abord : on revient en général d'une petite région décalée vers une zone plus grande
+        self._make_request("PUT", "startx", {"StartX": 0})
+        self._make_request("PUT", "starty", {"StartY": 0})
+        self._make_request("PUT", "binx", {"BinX": bin_x})
+        self._make_request("PUT", "biny", {"BinY": bin_y})
+        self._binning = [bin_x, bin_y]
+        self._make_request("PUT", "numx", {"NumX": num_x})
+        self._make_request("PUT", "numy", {"NumY": num_y})
+        if start_x or start_y:
+            self._make_request("PUT", "startx", {"StartX": start_x})
+            self._make_request("PUT", "starty", {"StartY": start_y})
+
 class FocuserInfo(BaseDeviceInfo):
     """Informations spécifiques au focuser"""
     absolute: bool
@@ -899,6 +983,11 @@ class ASCOMAlpacaFilterWheelClient(ASCOMAlpacaBaseClient):
         result = self._make_request("GET", "names")
         return result.get("Value", [])
 
+    def get_focus_offsets(self) -> List[int]:
+        """Décalages de mise au point de chaque filtre, en pas de focuser"""
+        result = self._make_request("GET", "focusoffsets")
+        return result.get("Value", [])
+
     def get_filterwheel_info(self) -> FilterWheelInfo:
         base_info = self.get_device_info()
 
@@ -1,13 +1,17 @@
 import asyncio
 import httpx
 from typing import Optional, Dict, Any, List, Union
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from enum import Enum
 import threading
+import time
+import struct
+from datetime import datetime
 import numpy as np
 from PIL import Image
 import io
 from utils.logger import logger
+from services.drivers.alpaca_client import ImageBufferPool
 
 # Générateur thread-safe pour les IDs de transaction
 class TransactionIDGenerator:
@@ -25,6 +29,28 @@ class TransactionIDGenerator:
 # Instance globale du générateur
 _transaction_id_generator = TransactionIDGenerator()
 
+# Un pool de connexions keep-alive par appareil, partagé par tous les clients de cet appareil :
+# un téléchargement d'image n'occupe pas les connexions du focuser ou de la monture
+_HTTP_LIMITS = httpx.Limits(max_connections=4, max_keepalive_connections=4, keepalive_expiry=120.0)
+_http_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def _shared_client(base_url: str) -> httpx.AsyncClient:
+    """Client HTTP (pool de connexions) d'un appareil, recréé s'il a été fermé"""
+    client = _http_clients.get(base_url)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(timeout=30.0, limits=_HTTP_LIMITS)
+        _http_clients[base_url] = client
+    return client
+
+
+async def close_clients() -> None:
+    """Ferme les pools de connexions de tous les appareils (arrêt de l'application)"""
+    clients = list(_http_clients.values())
+    _http_clients.clear()
+    await asyncio.gather(*(client.aclose() for client in clients), return_exceptions=True)
+
+
 class ASCOMDeviceType(str, Enum):
     """Types de dispositifs ASCOM supportés"""
     TELESCOPE = "telescope"
@@ -55,7 +81,10 @@ class ASCOMAlpacaBaseClient:
         self.device_number = device_number
         self.client_id = client_id
         self.base_url = f"http://{host}:{port}/api/v1/{device_type.value}/{device_number}"
-        self.client = httpx.AsyncClient(timeout=30.0)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return _shared_client(self.base_url)
         
     async def __aenter__(self):
         return self
@@ -441,15 +470,31 @@ class ExposureSettings(BaseModel):
 class ImageData(BaseModel):
     width: int
     height: int
-    data: List[List[int]]  # Données d'image 2D
+    data: np.ndarray  # Données d'image 2D
     exposure_duration: float
     timestamp: str
 
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
 class ASCOMAlpacaCameraClient(ASCOMAlpacaBaseClient):
     """Client ASCOM Alpaca pour caméra"""
+    DTYPE_MAP = {
+        1: np.int16, 2: np.int32, 3: np.float64, 4: np.float32,
+        5: np.uint64, 6: np.uint8, 7: np.int64, 8: np.uint16, 9: np.uint32,
+    }
+
+    HEADER_SIZE = 44  # bytes
+    HEADER_FMT = "<iiIIiiiiiii"
+    IMAGE_BUFFER_POOL = 3
     
     def __init__(self, host: str = "localhost", port: int = 11111, device_number: int = 0):
         super().__init__(ASCOMDeviceType.CAMERA, host, port, device_number)
+        self.last_exposure = 0
+        self.last_time = ""
+        self._image_buffer = ImageBufferPool(self.IMAGE_BUFFER_POOL)
+
+    async def set_camera_gain(self, gain: int) -> None:
+        await self._make_request("PUT", "gain", {"Gain": gain})
     
     async def get_camera_info(self) -> CameraInfo:
         """Récupère les informations complètes de la caméra"""
@@ -497,22 +542,9 @@ class ASCOMAlpacaCameraClient(ASCOMAlpacaBaseClient):
         )
     
     async def start_exposure(self, settings: ExposureSettings) -> None:
-        """Démarre une exposition"""
-        # Définir les paramètres de binning et de région
-        if settings.num_x is None or settings.num_y is None:
-            info = await self.get_camera_info()
-            settings.num_x = settings.num_x or info.camera_x_size
-            settings.num_y = settings.num_y or info.camera_y_size
-        
-        # Configurer la caméra
-        await self._make_request("PUT", "binx", {"BinX": settings.bin_x})
-        await self._make_request("PUT", "biny", {"BinY": settings.bin_y})
-        await self._make_request("PUT", "startx", {"StartX": settings.start_x})
-        await self._make_request("PUT", "starty", {"StartY": settings.start_y})
-        await self._make_request("PUT", "numx", {"NumX": settings.num_x})
-        await self._make_request("PUT", "numy", {"NumY": settings.num_y})
-        
-        # Démarrer l'exposition
+        """Démarre une exposition (binning et sous-image restent ceux réglés sur la caméra)"""
+        self.last_exposure = settings.duration
+        self.last_time = datetime.now().strftime("%m/%d/%Y, %H:%M:%S")
         await self._make_request("PUT", "startexposure", {
             "Duration": settings.duration,
             "Light": settings.light
@@ -536,21 +568,90 @@ class ASCOMAlpacaCameraClient(ASCOMAlpacaBaseClient):
         result = await self._make_request("GET", "imageready")
         return result.get("Value", False)
     
+    @staticmethod
+    async def _read_exact(chunks, n: int, stash: dict, out: memoryview = None) -> memoryview:
+        """
+        Lit exactement n octets du flux, le reste du dernier morceau est gardé dans stash.
+        Les octets sont écrits dans out s'il est fourni, sinon dans un nouveau tampon.
+        """
+        mv = out if out is not None else memoryview(bytearray(n))
+        i = 0
+        leftover = stash["leftover"]
+        while i < n:
+            if not leftover:
+                try:
+                    leftover = await chunks.__anext__()
+                except StopAsyncIteration:
+                    raise RuntimeError(f"Unexpected EOF: wanted {n} bytes, got {i}")
+                continue
+            take = min(len(leftover), n - i)
+            mv[i:i + take] = leftover[:take]
+            leftover = leftover[take:]
+            i += take
+        stash["leftover"] = leftover
+        return mv
+
     async def get_image_array(self) -> ImageData:
-        """Récupère les données d'image sous forme de tableau"""
-        result = await self._make_request("GET", "imagearray")
-        image_data = result.get("Value", [])
-        
-        # Récupérer les métadonnées
-        last_exposure_duration = await self._make_request("GET", "lastexposureduration")
-        last_exposure_start = await self._make_request("GET", "lastexposurestarttime")
-        
+        """
+        Télécharge la dernière image (imagebytes) dans un tampon de réception réutilisé
+
+        Même format et mêmes règles de propriété que le client synchrone : les
+        données sont une vue numpy en lecture seule sur le tampon, sans copie.
+        """
+        url = f"{self.base_url}/imagearray"
+        params = {
+            "ClientID": self.client_id,
+            "ClientTransactionID": _transaction_id_generator.get_next_id(),
+        }
+        headers = {
+            "Accept": "application/imagebytes",
+            "Accept-Encoding": "identity",
+        }
+
+        t0 = time.perf_counter()
+        async with self.client.stream("GET", url, params=params, headers=headers) as r:
+            r.raise_for_status()
+            chunks = r.aiter_raw(chunk_size=131072)
+            stash = {"leftover": b""}
+
+            header = await self._read_exact(chunks, self.HEADER_SIZE, stash)
+            (meta_ver, err_num, ctid, stid, data_start,
+            img_elem_type, tx_elem_type, rank, dim1, dim2, dim3) = struct.unpack(self.HEADER_FMT, header)
+            if err_num != 0:
+                raise RuntimeError(f"Alpaca camera error {err_num}")
+            if data_start > self.HEADER_SIZE:
+                await self._read_exact(chunks, data_start - self.HEADER_SIZE, stash)
+
+            dtype = self.DTYPE_MAP.get(tx_elem_type)
+            if dtype is None:
+                raise ValueError(f"Unsupported TransmissionElementType {tx_elem_type}")
+            if rank == 2:
+                shape = (dim2, dim1)
+            elif rank == 3:
+                shape = (dim3, dim2, dim1)
+            else:
+                raise ValueError(f"Unsupported rank {rank}")
+
+            n_elems = int(np.prod(shape))
+            n_bytes = n_elems * np.dtype(dtype).itemsize
+            payload = await self._read_exact(chunks, n_bytes, stash, out=self._image_buffer.acquire(n_bytes))
+        t1 = time.perf_counter()
+
+        arr = np.frombuffer(payload, dtype=dtype, count=n_elems).reshape(shape)
+        arr.flags.writeable = False
+        logger.info(
+            f"[CAMERA] - imagebytes streamed in {(t1 - t0)*1000:.1f} ms | "
+            f"shape={shape} dtype={arr.dtype} size={n_bytes/1e6:.2f} MB | "
+            f"throughput={n_bytes/max(t1 - t0, 1e-9)/1e6:.1f} MB/s"
+        )
+
+        h, w = arr.shape[:2]
         return ImageData(
-            width=len(image_data[0]) if image_data else 0,
-            height=len(image_data) if image_data else 0,
-            data=image_data,
-            exposure_duration=last_exposure_duration.get("Value", 0.0),
-            timestamp=last_exposure_start.get("Value", "")
+            width=w,
+            height=h,
+            data=arr,
+            exposure_duration=self.last_exposure,
+            timestamp=self.last_time
         )
     
     async def set_ccd_temperature(self, temperature: float) -> None:
@@ -571,6 +672,10 @@ class ASCOMAlpacaCameraClient(ASCOMAlpacaBaseClient):
         result = await self._make_request("GET", "cooleron")
         return result.get("Value", False)
 
+    async def set_fast_read_out(self, fast_read_out: bool) -> None:
+        """Active/désactive la lecture rapide"""
+        await self._make_request("PUT", "fastreadout", {"FastReadout": fast_read_out})
+
 
 # ===== CLIENT FOCUSER =====
 
@@ -623,6 +728,11 @@ class ASCOMAlpacaFocuserClient(ASCOMAlpacaBaseClient):
             temperature=results[8].get("Value", 0.0) if not isinstance(results[8], Exception) else 0.0,
         )
     
+    async def get_max_step(self) -> int:
+        """Position maximale du focuser"""
+        result = await self._make_request("GET", "maxstep")
+        return result.get("Value", 0)
+
     async def move_absolute(self, position: int) -> None:
         """Déplace le focuser à une position absolue"""
         await self._make_request("PUT", "move", {"Position": position})
@@ -722,6 +832,8 @@ class ASCOMAlpacaFilterWheelClient(ASCOMAlpacaBaseClient):
 
 alpaca_telescope_client = ASCOMAlpacaTelescopeClient("localhost", 11111, 0)
 alpaca_camera_client = ASCOMAlpacaCameraClient("localhost", 11111, 0)
+alpaca_focuser_client = ASCOMAlpacaFocuserClient("localhost", 11111)
+alpaca_fw_client = ASCOMAlpacaFilterWheelClient("localhost", 11111)
 
 
 async def main():
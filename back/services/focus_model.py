@@ -0,0 +1,180 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+import numpy as np
+from services.configurator import CONFIG, CURRENT_DIR
+from utils.json_load import load_array_form_json, save_json
+from utils.logger import logger
+
+
+class FocusFit(NamedTuple):
+    """Linear focus model of an optical train: position = intercepts[filter] + slope * temperature"""
+    slope: float
+    intercepts: Dict[str, float]
+    fwhm: Dict[str, float]
+    temperatures: Dict[str, float]
+    count: int
+
+
+class FocusModel:
+    """
+    Best focus positions found by the autofocus, kept between sessions.
+
+    Every successful autofocus run is recorded with its optical train
+    (telescope and camera ids), filter and focuser temperature. The model of
+    a train is a line shared by all its filters: one intercept per filter,
+    taken from its most recent run, and a common temperature slope (steps
+    per °C). The slope is fitted on all the records when they span at least
+    MIN_TEMPERATURE_SPREAD °C, otherwise the configured
+    focuser_temperature_coefficient is used.
+    """
+
+    MAX_RECORDS = 200
+    MAX_AGE_DAYS = 90
+    MIN_TEMPERATURE_SPREAD = 1.0
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records: Optional[List[Dict[str, Any]]] = None
+
+    @staticmethod
+    def optical_train() -> str:
+        """Key of the current telescope + camera combination"""
+        return f"{CONFIG['telescope'].get('id', '')}/{CONFIG['camera'].get('id', '')}"
+
+    @property
+    def records(self) -> List[Dict[str, Any]]:
+        if self._records is None:
+            self._records = load_array_form_json(self.path)
+        return self._records
+
+    def add(self, train: str, filter_name: Optional[str], temperature: Optional[float], position: int, fwhm: Optional[float]) -> None:
+        """
+        Records the result of an autofocus run
+
+        Args:
+            fwhm: FWHM at the best position, in unbinned pixels
+        """
+        with self._lock:
+            self.records.append({
+                "train": train,
+                "filter": filter_name or "",
+                "temperature": temperature,
+                "position": int(position),
+                "fwhm": fwhm,
+                "date": time.strftime('%Y-%m-%dT%H.%M.%S'),
+            })
+            del self.records[:-self.MAX_RECORDS]
+            if not save_json(self.records, self.path):
+                logger.error(f"[FOCUSMODEL] - Unable to save {self.path}")
+
+    def _recent(self, train: str) -> List[Dict[str, Any]]:
+        limit = (datetime.now() - timedelta(days=self.MAX_AGE_DAYS)).strftime('%Y-%m-%dT%H.%M.%S')
+        return [r for r in self.records if r["train"] == train and r["date"] >= limit]
+
+    def fit(self, train: str) -> Optional[FocusFit]:
+        """
+        Fits the model of an optical train
+
+        Returns:
+            FocusFit, None without records
+        """
+        records = self._recent(train)
+        if not records:
+            return None
+        filters = sorted({r["filter"] for r in records})
+        column = {name: i for i, name in enumerate(filters)}
+        positions = np.array([r["position"] for r in records], dtype=float)
+        with_temperature = [r for r in records if r["temperature"] is not None]
+        temperatures = np.array([r["temperature"] for r in with_temperature], dtype=float)
+
+        slope = float(CONFIG['global'].get('focuser_temperature_coefficient', 0))
+        if len(temperatures) and np.ptp(temperatures) >= self.MIN_TEMPERATURE_SPREAD:
+            # Moindres carrés : une colonne par filtre + la température
+            design = np.zeros((len(with_temperature), len(filters) + 1))
+            for i, r in enumerate(with_temperature):
+                design[i, column[r["filter"]]] = 1
+            design[:, -1] = temperatures
+            target = np.array([r["position"] for r in with_temperature], dtype=float)
+            solution, *_ = np.linalg.lstsq(design, target, rcond=None)
+            slope = float(solution[-1])
+
+        mean_temperature = float(np.mean(temperatures)) if len(temperatures) else 0.0
+        shifted = positions - slope * np.array([mean_temperature if r["temperature"] is None else r["temperature"] for r in records])
+        intercepts, fwhm, filter_temperatures = {}, {}, {}
+        for name in filters:
+            selected = [i for i, r in enumerate(records) if r["filter"] == name]
+            # Le dernier passage fait foi (l'optique a pu être démontée), la pente vient de tout l'historique
+            intercepts[name] = float(shifted[selected[-1]])
+            values = [records[i]["fwhm"] for i in selected if records[i]["fwhm"]]
+            if values:
+                fwhm[name] = float(np.median(values))
+            known = [records[i]["temperature"] for i in selected if records[i]["temperature"] is not None]
+            filter_temperatures[name] = float(known[-1]) if known else mean_temperature
+        return FocusFit(slope, intercepts, fwhm, filter_temperatures, len(records))
+
+    def filter_offsets(self, train: str, configured: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+        """
+        Focus offset of each filter, relative to an arbitrary zero
+
+        Offsets learned from the autofocus history (difference of the model
+        intercepts) win over the configured ones (config or filter wheel),
+        which are shifted to agree with the learned values on the filters
+        known by both.
+
+        Args:
+            configured: Offsets from the configuration or the filter wheel
+
+        Returns:
+            {filter: offset}
+        """
+        model = self.fit(train)
+        learned = dict(model.intercepts) if model else {}
+        offsets = {name: float(value) for name, value in (configured or {}).items()}
+        common = [name for name in learned if name in offsets]
+        if learned and offsets and not common:
+            # Aucun filtre commun : les deux jeux ne peuvent pas être recalés
+            return learned
+        if common:
+            shift = float(np.mean([learned[name] - offsets[name] for name in common]))
+            offsets = {name: value + shift for name, value in offsets.items()}
+        offsets.update(learned)
+        return offsets
+
+    def predict(self, train: str, filter_name: Optional[str], temperature: Optional[float], offsets: Optional[Dict[str, float]] = None):
+        """
+        Predicted best position for a filter at a temperature
+
+        A filter never focused on this train is predicted from the filter
+        focused most recently and the focus offsets.
+
+        Args:
+            temperature: Focuser temperature, None if unknown (temperature of the last run of the filter)
+            offsets: Filter focus offsets (see filter_offsets)
+
+        Returns:
+            (position, expected FWHM or None), None if the filter cannot be predicted
+        """
+        model = self.fit(train)
+        name = filter_name or ""
+        if model is None:
+            return None
+        reference = name
+        if name not in model.intercepts:
+            offsets = offsets or {}
+            focused = [r["filter"] for r in self._recent(train) if r["filter"] in offsets]
+            if name not in offsets or not focused:
+                return None
+            reference = focused[-1]
+        if temperature is None:
+            temperature = model.temperatures[reference]
+        position = model.intercepts[reference] + model.slope * temperature
+        if reference != name:
+            position += offsets[name] - offsets[reference]
+        return int(round(position)), model.fwhm.get(reference)
+
+
+focus_model = FocusModel(CURRENT_DIR.parent / "config" / "focus_model.json")
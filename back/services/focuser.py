@@ -1,5 +1,6 @@
 import numpy as np
 import cv2
+import warnings
 from utils.logger import logger
 from typing import List, Tuple, Optional, Dict, Any
 from scipy.optimize import curve_fit
@@ -9,14 +10,18 @@ from photutils.psf import fit_fwhm
 from models.state import telescope_state
 from utils.logger import logger
 from models.constants import AUTOMATE_STEP
+from imageprocessing.starmeasure import StarMeasure
 class AutoFocusLib:
     """
     Library for astronomical autofocus based on FWHM analysis
     """
     
-    def __init__(self, star_detection_threshold=3, min_stars=5, max_stars = 50,  window_size=2):
+    def __init__(self, star_detection_threshold=3, min_stars=5, max_stars = 50,  window_size=2, mode="fast"):
         """
         Initializes the autofocus library
+
+        Args:
+            mode: "fast" (vectorized HFR / second moment FWHM) or "accurate" (photutils PSF fit of every star)
         """
         self.logger = logger
         
@@ -25,6 +30,8 @@ class AutoFocusLib:
         self.min_stars = min_stars  # Nombre minimum d'étoiles requises
         self.max_stars = max_stars  # Nombre maximum d'étoiles à analyser
         self.window_size=window_size
+        self.mode = mode
+        self.star_measure = StarMeasure(threshold=star_detection_threshold, max_stars=max_stars)
         # Stockage des mesures
         self.measurements: List[Dict[str, Any]] = []
         self.result: Dict[str, Any] = {}
@@ -61,12 +68,17 @@ class AutoFocusLib:
             image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         
         # Detect stars and compute FWHM
-        fwhm, num_stars = self._calculate_image_fwhm_detailed(image)
+        if self.mode == "accurate":
+            fwhm, num_stars = self._calculate_image_fwhm_detailed(image)
+            hfr = None
+        else:
+            fwhm, hfr, num_stars = self._measure_image_fast(image)
         
         # Create result
         result = {
             'focus_position': focus_position,
             'fwhm': fwhm,
+            'hfr': hfr,
             'num_stars': num_stars,
             'valid': fwhm is not None and num_stars >= self.min_stars
         }
@@ -93,6 +105,8 @@ class AutoFocusLib:
         """
         if len(image.shape) == 3:
             image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if self.mode != "accurate":
+            return len(self.star_measure.measure(image))
         
         mean_bg = np.median(image)
         std_bg = np.std(image)
@@ -101,8 +115,85 @@ class AutoFocusLib:
         sources = daofind(image - mean_bg)
         
         return len(sources) if sources is not None else 0   
+
+    def select_roi(self, image: np.ndarray, size: int, align: int = 2) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Finds the square region of the image holding the most stars, used to
+        capture only a sub frame at every focuser position
+
+        Args:
+            image: Grayscale or color full frame
+            size: Side of the region in pixels (clipped to the image)
+            align: The region corner and size are multiples of align (2 keeps the Bayer pattern phase)
+
+        Returns:
+            (x, y, width, height) of the region, None if it holds less than min_stars stars
+        """
+        if len(image.shape) == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        h, w = image.shape
+        size = min(size, h, w) // align * align
+        if size <= 0:
+            return None
+
+        mean_bg = np.median(image)
+        std_bg = np.std(image)
+        # Pas de limite "brightest" : on veut la densité d'étoiles de toute l'image
+        daofind = DAOStarFinder(threshold=self.star_detection_threshold * std_bg, fwhm=6.0, exclude_border=True)
+        sources = daofind(image - mean_bg)
+        if sources is None or len(sources) < self.min_stars:
+            return None
+
+        # Comptage des étoiles par cellule puis somme glissante sur les fenêtres de `size` pixels
+        cell = max(align, size // 8 // align * align)
+        cells_y, cells_x = h // cell, w // cell
+        window = size // cell
+        xs = np.clip((np.asarray(sources['xcentroid']) // cell).astype(int), 0, cells_x - 1)
+        ys = np.clip((np.asarray(sources['ycentroid']) // cell).astype(int), 0, cells_y - 1)
+        counts = np.zeros((cells_y + 1, cells_x + 1))
+        np.add.at(counts, (ys + 1, xs + 1), 1)
+        integral = counts.cumsum(0).cumsum(1)
+        windows = (integral[window:, window:] - integral[:-window, window:]
+                   - integral[window:, :-window] + integral[:-window, :-window])
+
+        best_y, best_x = np.unravel_index(np.argmax(windows), windows.shape)
+        stars = int(windows[best_y, best_x])
+        if stars < self.min_stars:
+            self.logger.info(f"[AutoFocus] - Best {size}px region holds only {stars} stars")
+            return None
+        x = min(best_x * cell, w - size) // align * align
+        y = min(best_y * cell, h - size) // align * align
+        self.logger.info(f"[AutoFocus] - Focus region {x},{y} {size}x{size} with {stars} stars")
+        return int(x), int(y), size, size
     
     
+    @staticmethod
+    def _reject_outliers(values: np.ndarray) -> np.ndarray:
+        """Removes the values outside [q1 - 1.5 IQR, q3 + 1.5 IQR], unless less than 3 would remain"""
+        q1, q3 = np.percentile(values, [25, 75])
+        iqr = q3 - q1
+        filtered = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+        return filtered if len(filtered) >= 3 else values
+
+    def _measure_image_fast(self, image: np.ndarray) -> Tuple[Optional[float], Optional[float], int]:
+        """
+        Measures all the stars of an image in one vectorized pass (StarMeasure)
+
+        Args:
+            image: Grayscale image
+
+        Returns:
+            Tuple (average FWHM, average HFR, number of stars measured)
+        """
+        try:
+            stars = self.star_measure.measure(image)
+            if len(stars) < self.min_stars:
+                return None, None, 0
+            return float(np.mean(self._reject_outliers(stars.fwhm))), float(np.mean(self._reject_outliers(stars.hfr))), len(stars)
+        except Exception as e:
+            self.logger.error(f"Erreur lors du calcul FWHM: {e}")
+            return None, None, 0
+
     def _calculate_image_fwhm_detailed(self, image: np.ndarray) -> Tuple[Optional[float], int]:
         """
         Calculates the average FWHM of an image with detailed information
@@ -135,17 +226,7 @@ class AutoFocusLib:
             fwhm_values = fit_fwhm(image, xypos=xypos, fit_shape=(5, 5), fwhm=2)
 
             # outliers filters
-            q1, q3 = np.percentile(fwhm_values, [25, 75])
-            iqr = q3 - q1
-            lower_bound = q1 - 1.5 * iqr
-            upper_bound = q3 + 1.5 * iqr
-            
-            filtered_fwhm = [f for f in fwhm_values if lower_bound <= f <= upper_bound]
-            
-            if len(filtered_fwhm) < 3:
-                filtered_fwhm = fwhm_values
-            
-            return np.mean(filtered_fwhm), len(sources)
+            return np.mean(self._reject_outliers(np.asarray(fwhm_values))), len(sources)
             
         except Exception as e:
             self.logger.error(f"Erreur lors du calcul FWHM: {e}")
@@ -168,6 +249,27 @@ class AutoFocusLib:
             List of valid measurements
         """
         return [m for m in self.measurements if m['valid']]
+
+    def fwhm_at(self, position: int) -> Optional[float]:
+        """
+        FWHM at a focuser position: value of the curve fitted by calculate_best_focus,
+        mean FWHM measured at the nearest position if no curve was fitted
+
+        Returns:
+            FWHM, None without valid measurement
+        """
+        valid = self.get_valid_measurements()
+        if not valid:
+            return None
+        _, method, details = self.calculate_best_focus()
+        model = {"parabolic": self._parabolic_model, "hyperbolic": self._hyperbolic_model}.get(method)
+        if model is not None:
+            fwhm = float(model(float(position), *details['fit_info']['coefficients']))
+            if np.isfinite(fwhm) and fwhm > 0:
+                return fwhm
+        positions = np.array([m['focus_position'] for m in valid])
+        nearest = positions[np.argmin(np.abs(positions - position))]
+        return float(np.mean([m['fwhm'] for m in valid if m['focus_position'] == nearest]))
     
     def calculate_best_focus(self) -> Tuple[Optional[int], Optional[str], Dict[str, Any]]:
         """
@@ -415,7 +517,212 @@ class AutoFocusLib:
         }
 
 
+class FocusSearch:
+    """
+    Adaptive V-curve search driving an AutoFocusLib.
+
+    A coarse bracket of 3 positions (current - range, current, current + range)
+    is measured first, in one batch so that the captures can be pipelined.
+    The bracket is extended while the smallest FWHM sits on one of its edges.
+    The minimum is then refined one position at a time: the vertex of the
+    hyperbola sqrt(a² + s²(x - c)²) fitted on the curve is measured when it
+    brings something new, otherwise a golden-section point of the widest side
+    of the bracket. The search stops as soon as the fit is tight (standard
+    error of the vertex below min_step / 2 with at least 5 positions), when
+    two successive estimates agree within min_step (after two refinement
+    positions), when the bracket is narrower than 2 * min_step, or after
+    max_refine positions. A well centered run thus takes 5 exposures, half
+    of the default fixed sweep.
+
+    The direction of the move that led to each position is recorded. If the
+    focuser was moved both ways, a V-curve with a position offset for
+    downward moves is fitted: a significant offset is the focuser backlash,
+    the best position is then given for an upward approach.
+    """
 
+    COARSE_POINTS = 3
+    MAX_EXTENSIONS = 4
+    GOLDEN = 0.381966
+
+    def __init__(self, autofocus: AutoFocusLib, center: int, focus_range: int, min_step: int, max_refine: int = 6, max_position: Optional[int] = None):
+        """
+        Args:
+            autofocus: Library receiving the measurements (analyze_image)
+            center: Current focuser position
+            focus_range: Half width of the coarse bracket
+            min_step: Smallest meaningful focuser move, also the convergence tolerance
+            max_refine: Maximum number of refinement positions
+            max_position: Highest focuser position, if known
+        """
+        self.autofocus = autofocus
+        self.coarse_step = max(1, focus_range * 2 // (self.COARSE_POINTS - 1))
+        self.min_step = max(1, min_step)
+        self.max_refine = max_refine
+        self.max_position = max_position
+        self.directions: Dict[int, int] = {}
+        self.estimates: List[int] = []
+        self.extensions = 0
+        self.refined = 0
+        self.backlash: Optional[float] = None
+        self.backlash_focus: Optional[int] = None
+        self.vertex: Optional[float] = None
+        self.vertex_error = np.inf
+        self.done = False
+        self._pending = [self._clip(center + (i - self.COARSE_POINTS // 2) * self.coarse_step) for i in range(self.COARSE_POINTS)]
+
+    def _clip(self, position: float) -> int:
+        position = max(0, int(round(position)))
+        return min(position, self.max_position) if self.max_position else position
+
+    def record(self, position: int, direction: int) -> None:
+        """Records the direction (+1 upward, -1 downward) of the move that reached a measured position"""
+        self.directions[position] = direction
+
+    def _curve(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Mean FWHM of each valid measured position, sorted by position"""
+        valid = self.autofocus.get_valid_measurements()
+        if not valid:
+            return np.array([]), np.array([])
+        positions = np.array([m['focus_position'] for m in valid])
+        fwhm = np.array([m['fwhm'] for m in valid])
+        unique, inverse = np.unique(positions, return_inverse=True)
+        return unique, np.bincount(inverse, weights=fwhm) / np.bincount(inverse)
+
+    def _fit_vertex(self, positions: np.ndarray, fwhm: np.ndarray) -> Tuple[Optional[float], float]:
+        """
+        Fits sqrt(a² + s²(x - c)²) on the curve
+
+        Returns:
+            (c, standard error of c), (None, inf) if the fit fails
+        """
+        def model(x, a, s, c):
+            return np.sqrt(a ** 2 + (s * (x - c)) ** 2)
+
+        best = int(np.argmin(fwhm))
+        slope = (fwhm.max() - fwhm.min()) / max(np.ptp(positions) / 2, 1)
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                (a, s, c), covariance = curve_fit(model, positions.astype(float), fwhm,
+                                                  p0=[fwhm.min(), slope, positions[best]], maxfev=2000)
+        except Exception:
+            return None, np.inf
+        error = float(np.sqrt(covariance[2, 2])) if np.isfinite(covariance[2, 2]) else np.inf
+        # Sommet hors de l'encadrement mesuré : extrapolation non fiable
+        if not positions[0] <= c <= positions[-1]:
+            return None, np.inf
+        return float(c), error
+
+    def next_positions(self) -> List[int]:
+        """
+        Positions to measure next, all of them can be captured before the results are known.
+        Empty when the search is over.
+        """
+        if self._pending:
+            pending, self._pending = self._pending, []
+            return pending
+        if self.done:
+            return []
+
+        positions, fwhm = self._curve()
+        if len(positions) < 3:
+            self.autofocus.logger.error("[AutoFocus] - Not enough valid measurements for an adaptive search")
+            self.done = True
+            return []
+
+        best = int(np.argmin(fwhm))
+        # Minimum sur un bord : on étend l'encadrement de ce côté
+        if best in (0, len(positions) - 1) and self.extensions < self.MAX_EXTENSIONS:
+            side = -1 if best == 0 else 1
+            position = self._clip(positions[best] + side * self.coarse_step)
+            if position not in self.directions:
+                self.extensions += 1
+                return [position]
+
+        if self.refined >= self.max_refine:
+            self.done = True
+            return []
+        left = positions[max(best - 1, 0)]
+        right = positions[min(best + 1, len(positions) - 1)]
+        if right - left <= 2 * self.min_step:
+            self.done = True
+            return []
+
+        self.vertex, self.vertex_error = self._fit_vertex(positions, fwhm)
+        estimate = self.vertex
+        if estimate is None:
+            estimate, _, _ = self.autofocus.calculate_best_focus()
+        if estimate is not None:
+            # Ajustement serré : au moins 2 degrés de liberté pour que l'erreur du sommet ait un sens
+            tight = self.vertex is not None and len(positions) >= 5 and self.vertex_error <= self.min_step / 2
+            agree = self.refined >= 2 and bool(self.estimates) and abs(estimate - self.estimates[-1]) <= self.min_step
+            self.estimates.append(int(round(estimate)))
+            if self.refined >= 1 and (tight or agree):
+                self.autofocus.logger.info(f"[AutoFocus] - Search converged at {estimate:.0f} (±{self.vertex_error:.1f})")
+                self.done = True
+                return []
+
+        measured = np.array(list(self.directions))
+        candidate = None
+        if estimate is not None and left < estimate < right and np.min(np.abs(measured - estimate)) >= self.min_step:
+            candidate = estimate
+        else:
+            # Section dorée du côté le plus large de l'encadrement
+            center = positions[best]
+            if right - center >= center - left:
+                candidate = center + self.GOLDEN * (right - center)
+            else:
+                candidate = center - self.GOLDEN * (center - left)
+        candidate = self._clip(candidate)
+        if np.min(np.abs(measured - candidate)) < self.min_step:
+            self.done = True
+            return []
+        self.refined += 1
+        return [candidate]
+
+    def detect_backlash(self) -> Optional[float]:
+        """
+        Fits sqrt(a² + s²(x - c - δ·downward)²) when both move directions were measured
+
+        Returns:
+            δ, the backlash in focuser steps, None if it cannot be estimated or is below min_step
+        """
+        valid = [m for m in self.autofocus.get_valid_measurements() if m['focus_position'] in self.directions]
+        downward = np.array([self.directions[m['focus_position']] < 0 for m in valid], dtype=float)
+        if len(valid) < 5 or downward.sum() < 2 or (1 - downward).sum() < 2:
+            return None
+        x = np.array([m['focus_position'] for m in valid], dtype=float)
+        y = np.array([m['fwhm'] for m in valid], dtype=float)
+
+        def model(data, a, s, c, delta):
+            position, shifted = data
+            return np.sqrt(a ** 2 + (s * (position - c - delta * shifted)) ** 2)
+
+        best = int(np.argmin(y))
+        slope = (y.max() - y.min()) / max(np.ptp(x) / 2, 1)
+        try:
+            (a, s, c, delta), _ = curve_fit(model, (x, downward), y, p0=[y.min(), slope, x[best], 0.0], maxfev=2000)
+        except Exception as e:
+            self.autofocus.logger.warning(f"[AutoFocus] - Backlash fit failed: {e}")
+            return None
+        if abs(delta) < self.min_step:
+            return None
+        self.backlash = float(delta)
+        self.backlash_focus = self._clip(c)
+        self.autofocus.logger.info(f"[AutoFocus] - Backlash of about {delta:.0f} steps on downward moves, best focus {c:.0f}")
+        return self.backlash
+
+    def best_position(self) -> Optional[int]:
+        """Final position, to be reached by an upward move when a backlash was detected"""
+        if self.backlash_focus is not None:
+            return self.backlash_focus
+        best, _, _ = self.autofocus.calculate_best_focus()
+        positions, fwhm = self._curve()
+        if len(positions) >= 3:
+            self.vertex, self.vertex_error = self._fit_vertex(positions, fwhm)
+        if self.vertex is not None and self.vertex_error <= self.min_step:
+            return self._clip(self.vertex)
+        return None if best is None else int(best)
 
 
 
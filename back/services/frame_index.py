@@ -0,0 +1,250 @@
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from astropy.io import fits
+from services.configurator import CURRENT_DIR
+from utils.logger import logger
+
+
+FITS_EXTENSIONS = (".fit", ".fits")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frames (
+    path TEXT PRIMARY KEY,
+    directory TEXT NOT NULL,
+    target TEXT,
+    filter TEXT,
+    exposure REAL,
+    gain INTEGER,
+    temperature REAL,
+    timestamp TEXT,
+    width INTEGER,
+    height INTEGER,
+    channels INTEGER,
+    file_size INTEGER,
+    mtime REAL,
+    fwhm REAL,
+    num_stars INTEGER,
+    background REAL
+);
+CREATE INDEX IF NOT EXISTS idx_frames_directory ON frames(directory);
+CREATE INDEX IF NOT EXISTS idx_frames_target ON frames(target, filter);
+CREATE INDEX IF NOT EXISTS idx_frames_calibration ON frames(exposure, gain, temperature);
+"""
+
+QUALITY_COLUMNS = ("fwhm", "num_stars", "background")
+
+
+class FrameIndex:
+    """
+    SQLite index of the FITS frames captured by the application.
+
+    Every frame written by capture_to_fit is recorded with its acquisition
+    metadata, so that re-stacking, dark matching and history browsing are
+    index lookups instead of directory scans and FITS header reads.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def _upsert(self, record: Dict[str, Any]) -> None:
+        columns = ", ".join(record.keys())
+        placeholders = ", ".join("?" for _ in record)
+        updates = ", ".join(f"{column}=excluded.{column}" for column in record if column != "path")
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                f"INSERT INTO frames ({columns}) VALUES ({placeholders}) ON CONFLICT(path) DO UPDATE SET {updates}",
+                tuple(record.values())
+            )
+            connection.commit()
+
+    @staticmethod
+    def _record_from_header(path: Path, header: Dict[str, Any], shape: Tuple[int, ...]) -> Dict[str, Any]:
+        """Build an index record from a FITS header and the (H, W[, C]) shape of the image."""
+        stat = path.stat()
+        return {
+            "path": str(path.resolve()),
+            "directory": str(path.resolve().parent),
+            "target": header.get("OBJECT"),
+            "filter": header.get("FILTER"),
+            "exposure": header.get("EXPTIME"),
+            "gain": header.get("GAIN"),
+            "temperature": header.get("CCD-TEMP"),
+            "timestamp": header.get("DATE-OBS"),
+            "width": shape[1] if len(shape) > 1 else None,
+            "height": shape[0] if len(shape) > 0 else None,
+            "channels": shape[2] if len(shape) > 2 else 1,
+            "file_size": stat.st_size,
+            "mtime": stat.st_mtime,
+        }
+
+    def add_frame(self, path: Path, header: Dict[str, Any], shape: Tuple[int, ...]) -> None:
+        """
+        Records a frame that has just been written to disk.
+
+        Args:
+            path: Path of the FITS file
+            header: Header written in the file
+            shape: Shape of the image data (H, W) or (H, W, C)
+        """
+        self._upsert(self._record_from_header(Path(path), header, shape))
+
+    def add_from_file(self, path: Path) -> None:
+        """
+        Records a FITS file already on disk, reading only its header.
+
+        Args:
+            path: Path of the FITS file
+        """
+        header = fits.getheader(path)
+        naxis = header.get("NAXIS", 0)
+        # FITS axes are stored (W, H[, C]), color images are saved channel first
+        if naxis == 3:
+            shape = (header.get("NAXIS2"), header.get("NAXIS1"), header.get("NAXIS3"))
+        elif naxis == 2:
+            shape = (header.get("NAXIS2"), header.get("NAXIS1"))
+        else:
+            shape = ()
+        self._upsert(self._record_from_header(Path(path), header, shape))
+
+    def update_quality(self, path: Path, **metrics: Any) -> None:
+        """
+        Stores quality metrics for an indexed frame.
+
+        Args:
+            path: Path of the FITS file
+            metrics: Any of fwhm, num_stars, background
+        """
+        metrics = {key: value for key, value in metrics.items() if key in QUALITY_COLUMNS}
+        if not metrics:
+            return
+        assignments = ", ".join(f"{column}=?" for column in metrics)
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                f"UPDATE frames SET {assignments} WHERE path=?",
+                tuple(metrics.values()) + (str(Path(path).resolve()),)
+            )
+            connection.commit()
+
+    def remove(self, path: Path) -> None:
+        with self._lock:
+            connection = self._connect()
+            connection.execute("DELETE FROM frames WHERE path=?", (str(Path(path).resolve()),))
+            connection.commit()
+
+    def backfill(self, directory: Path) -> int:
+        """
+        Incrementally indexes the FITS files found under a directory.
+        Only new or modified files (size or mtime changed) have their header read,
+        entries whose file has disappeared are removed.
+
+        Args:
+            directory: Root directory to scan
+
+        Returns:
+            Number of files added or refreshed
+        """
+        directory = Path(directory).resolve()
+        if not directory.exists():
+            return 0
+
+        root = str(directory)
+        prefix = root + os.sep
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT path, file_size, mtime FROM frames WHERE directory=? OR substr(directory, 1, ?)=?",
+                (root, len(prefix), prefix)
+            ).fetchall()
+        known = {row["path"]: (row["file_size"], row["mtime"]) for row in rows}
+
+        updated = 0
+        seen = set()
+        for path in directory.rglob("*"):
+            if path.suffix.lower() not in FITS_EXTENSIONS or not path.is_file():
+                continue
+            key = str(path.resolve())
+            seen.add(key)
+            stat = path.stat()
+            if known.get(key) == (stat.st_size, stat.st_mtime):
+                continue
+            try:
+                self.add_from_file(path)
+                updated += 1
+            except Exception as e:
+                logger.warning(f"[FRAMEINDEX] - Unable to index {path}: {e}")
+
+        for missing in set(known) - seen:
+            self.remove(Path(missing))
+
+        logger.info(f"[FRAMEINDEX] - Backfill of {directory}: {updated} frame(s) indexed, {len(set(known) - seen)} removed")
+        return updated
+
+    def find_frames(
+        self,
+        target: Optional[str] = None,
+        filter_name: Optional[str] = None,
+        exposure: Optional[float] = None,
+        gain: Optional[int] = None,
+        temperature: Optional[float] = None,
+        directory: Optional[Path] = None,
+        exposure_tolerance: float = 1e-3,
+        temperature_tolerance: float = 1.0,
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns the indexed frames matching all the given criteria, ordered by timestamp.
+
+        Exposure and temperature are REAL columns read from the headers (a -10 °C
+        setpoint is rarely stored as exactly -10.0): they match within a range.
+
+        Args:
+            exposure_tolerance: Accepted exposure difference (s)
+            temperature_tolerance: Accepted sensor temperature difference (°C)
+        """
+        clauses = []
+        params = []
+        for column, value in (
+            ("target", target),
+            ("filter", filter_name),
+            ("gain", gain),
+        ):
+            if value is not None:
+                clauses.append(f"{column}=?")
+                params.append(value)
+        for column, value, tolerance in (
+            ("exposure", exposure, exposure_tolerance),
+            ("temperature", temperature, temperature_tolerance),
+        ):
+            if value is not None:
+                clauses.append(f"{column} BETWEEN ? AND ?")
+                params.extend((value - tolerance, value + tolerance))
+        if directory is not None:
+            clauses.append("directory=?")
+            params.append(str(Path(directory).resolve()))
+
+        query = "SELECT * FROM frames"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY timestamp, path"
+
+        with self._lock:
+            rows = self._connect().execute(query, params).fetchall()
+        return [dict(row) for row in rows]
+
+
+frame_index = FrameIndex(CURRENT_DIR.parent / "config" / "frames.sqlite3")
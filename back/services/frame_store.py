@@ -0,0 +1,102 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+import numpy as np
+
+
+class FrameStore:
+    """
+    Holds the last captured frame as an immutable, versioned array and caches
+    the products derived from it (debayered, binned, stretched, encoded...).
+
+    Every product is computed at most once per frame version, even when several
+    requests ask for it at the same time, and is evicted in LRU order or as soon
+    as its frame is older than `keep_versions` versions.
+
+    Ownership: publish() stores a read-only view of the array, the producer must
+    not modify the array afterwards (publish a new frame instead). Products
+    returned by get_product() are shared between callers and must be treated
+    as read-only too.
+    """
+
+    def __init__(self, max_products: int = 16, keep_versions: int = 2):
+        self.max_products = max_products
+        self.keep_versions = keep_versions
+        self._lock = threading.Lock()
+        self._version = 0
+        self._data: Optional[np.ndarray] = None
+        self._products: "OrderedDict[Tuple[int, Hashable], Any]" = OrderedDict()
+        self._pending: dict = {}
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def data(self) -> Optional[np.ndarray]:
+        return self._data
+
+    def publish(self, data: Optional[np.ndarray]) -> int:
+        """
+        Publishes a new raw frame.
+
+        Args:
+            data: Image array, None to clear the store
+
+        Returns:
+            Version of the published frame
+        """
+        if data is not None:
+            data = data.view()
+            data.flags.writeable = False
+        with self._lock:
+            self._version += 1
+            self._data = data
+            oldest = self._version - self.keep_versions
+            for key in [key for key in self._products if key[0] <= oldest]:
+                del self._products[key]
+            return self._version
+
+    def snapshot(self) -> Tuple[int, Optional[np.ndarray]]:
+        """Returns the current (version, data) pair atomically."""
+        with self._lock:
+            return self._version, self._data
+
+    def get_product(self, version: int, name: Hashable, builder: Callable[[], Any]) -> Any:
+        """
+        Returns a product derived from a frame version, computing it with
+        `builder` only if it is not cached yet.
+
+        Args:
+            version: Frame version the product derives from (see snapshot())
+            name: Product name, including any parameter it depends on
+            builder: Function computing the product
+
+        Returns:
+            The cached or freshly computed product
+        """
+        key = (version, name)
+        with self._lock:
+            if key in self._products:
+                self._products.move_to_end(key)
+                return self._products[key]
+            key_lock = self._pending.setdefault(key, threading.Lock())
+
+        # Concurrent requests for the same product wait for the first one
+        with key_lock:
+            with self._lock:
+                if key in self._products:
+                    self._products.move_to_end(key)
+                    return self._products[key]
+
+            try:
+                product = builder()
+                with self._lock:
+                    if version > self._version - self.keep_versions:
+                        self._products[key] = product
+                        while len(self._products) > self.max_products:
+                            self._products.popitem(last=False)
+            finally:
+                with self._lock:
+                    self._pending.pop(key, None)
+            return product
@@ -12,6 +12,12 @@ class AlpacaTelescope(TelescopeInterface):
 
     def __init__(self):
         super().__init__()
+        self._exposure_start = 0.0
+        self._exposure_duration = 0.0
+        self._readout_time = 0.0
+        self._exposure_error = None
+        # (roi, binning, géométrie sauvegardée, fast readout) entre camera_begin_roi et camera_end_roi
+        self._roi_session = None
 
     """def camera_capture(self, expo: float, light: bool = True):
         try:
@@ -37,91 +43,121 @@ class AlpacaTelescope(TelescopeInterface):
     
 
 
-    def camera_capture(self, expo: float, light: bool = True):
-        t_all0 = perf_counter()
+    # Attente de fin de pose : sommeil jusqu'à l'échéance estimée, puis interrogation rapide de plus en plus espacée
+    POLL_MARGIN = 0.05
+    POLL_MIN = 0.02
+    POLL_MAX = 0.5
+
+    def camera_start_exposure(self, expo: float, light: bool = True):
+        # Une erreur au démarrage est rendue par camera_read_image (None), comme pour camera_capture
+        self._exposure_error = None
+        self._exposure_duration = expo
         try:
-            logger.info(f"[CAMERA] - Capture start | requested_expo={expo:.3f}s light={light}")
+            alpaca_camera_client.start_exposure(ExposureSettings(duration=expo, light=light))
+        except Exception as e:
+            self._exposure_error = e
+        self._exposure_start = perf_counter()
 
-            # --- 1) Démarrage de l'expo
-            t0 = perf_counter()
-            expo_params = ExposureSettings(duration=expo, light=light)
-            alpaca_camera_client.start_exposure(expo_params)
-            t1 = perf_counter()
-            dt_start_call_ms = (t1 - t0) * 1000.0
-            logger.info(f"[CAMERA] - start_exposure call done in {dt_start_call_ms:.1f} ms")
-
-            # --- 2) Attente "brute" de l'expo demandée (tel que dans ton code)
-            t_sleep0 = perf_counter()
-            sleep(expo+0.1)
-            t_sleep1 = perf_counter()
-            dt_sleep_s = (t_sleep1 - t_sleep0)
-            logger.info(f"[CAMERA] - slept for requested exposure: {dt_sleep_s:.3f} s")
-
-            # --- 3) Boucle: tant que CameraState == EXPOSING
-            t_exposing_wait0 = perf_counter()
-            loops_exposing = 0
-            while alpaca_camera_client.get_camera_state() == CameraState.EXPOSING:
-                loops_exposing += 1
-                sleep(0.1)
-            t_exposing_wait1 = perf_counter()
-            dt_exposing_wait_ms = (t_exposing_wait1 - t_exposing_wait0) * 1000.0
-            logger.info(f"[CAMERA] - extra wait while EXPOSING: {dt_exposing_wait_ms:.1f} ms | loops={loops_exposing}")
-
-            # Marque la fin d'exposition (transition hors état EXPOSING)
-            t_exposure_done = t_exposing_wait1
-            dt_exposure_total_s = t_exposure_done - t1
-            logger.info(f"[CAMERA] - exposure phase total (from end start call): {dt_exposure_total_s:.3f} s "
-                        f"(requested {expo:.3f}s, delta {(dt_exposure_total_s - expo):+.3f}s)")
-
-            # --- 4) Attente ImageReady
-            t_ready_wait0 = perf_counter()
-            loops_ready = 0
-            while not alpaca_camera_client.is_image_ready():
-                loops_ready += 1
-                sleep(0.1)
-            t_ready_wait1 = perf_counter()
-            dt_ready_wait_ms = (t_ready_wait1 - t_ready_wait0) * 1000.0
-            logger.info(f"[CAMERA] - wait for ImageReady: {dt_ready_wait_ms:.1f} ms | loops={loops_ready}")
+    def _wait_image_ready(self) -> float:
+        """
+        Waits for ImageReady after the exposure started by camera_start_exposure
 
-            # Délai entre fin d'exposition et ImageReady (lecture/transfert)
-            dt_readout_ms = (t_ready_wait1 - t_exposure_done) * 1000.0
-            logger.info(f"[CAMERA] - readout+transfer (post-expo -> ImageReady): {dt_readout_ms:.1f} ms")
+        The camera is not polled during the exposure: the first request is sent
+        just before the expected end (duration + readout time learnt from the
+        previous frames), then at intervals growing from POLL_MIN to POLL_MAX.
 
-            # --- 5) Récupération de l'image
-            t_get0 = perf_counter()
+        Returns:
+            Readout time of the frame (s)
+        """
+        deadline = self._exposure_start + self._exposure_duration + self._readout_time
+        delay = deadline - self.POLL_MARGIN - perf_counter()
+        if delay > 0:
+            sleep(delay)
+        timeout = deadline + CONFIG['global'].get('camera_readout_timeout', 60)
+        interval = 0
+        while not alpaca_camera_client.is_image_ready():
+            if perf_counter() > timeout:
+                raise TimeoutError("Image not ready")
+            if interval >= self.POLL_MAX and alpaca_camera_client.get_camera_state() == CameraState.ERROR:
+                raise RuntimeError("Camera in error state")
+            interval = min(max(interval * 2, self.POLL_MIN), self.POLL_MAX)
+            sleep(interval)
+        # Le retard de la dernière interrogation (interval / 2 en moyenne) n'est pas du temps de lecture
+        readout = max(0.0, perf_counter() - self._exposure_start - self._exposure_duration - interval / 2)
+        self._readout_time = 0.5 * (self._readout_time + readout) if self._readout_time else readout
+        return readout
+
+    def camera_read_image(self):
+        try:
+            if self._exposure_error is not None:
+                raise self._exposure_error
+            readout = self._wait_image_ready()
+            t0 = perf_counter()
             image = alpaca_camera_client.get_image_array()
-            image.data = np.array(image.data)
-            t_get1 = perf_counter()
-            dt_get_ms = (t_get1 - t_get0) * 1000.0
-            logger.info(f"[CAMERA] - GET imagearray: {dt_get_ms:.1f} ms "
-                        f"(w={image.width} h={image.height})")
-
-            # --- 6) Conversion / transposition numpy
-            t_np0 = perf_counter()
+            # Vues sur le tampon de réception (lecture seule), aucune copie de l'image
             if image.data.ndim == 2:
                 image.data = image.data.T
             else:
                 image.data = np.transpose(image.data, (1, 0, 2))
-            t_np1 = perf_counter()
-            dt_np_ms = (t_np1 - t_np0) * 1000.0
-            logger.info(f"[CAMERA] - numpy convert/transpose: {dt_np_ms:.1f} ms")
+            logger.info(f"[CAMERA] - Exposure {self._exposure_duration:.3f}s | readout {readout * 1000:.0f} ms | "
+                        f"download {(perf_counter() - t0) * 1000:.0f} ms (w={image.width} h={image.height})")
+            telescope_state.last_picture = image.data
+            return image
+        except Exception as e:
+            logger.error(f"[CAMERA] - Alpaca Error {e}")
+            return None
 
-            # --- 7) Totaux utiles
-            t_all1 = perf_counter()
-            dt_total_ms = (t_all1 - t_all0) * 1000.0
+    def camera_capture(self, expo: float, light: bool = True):
+        self.camera_start_exposure(expo, light)
+        return self.camera_read_image()
 
-            # temps jusqu’à ImageReady (inclut expo réelle + readout)
-            dt_until_ready_ms = (t_ready_wait1 - t1) * 1000.0
-            logger.info(f"[CAMERA] - total until ImageReady (from end start call): {dt_until_ready_ms:.1f} ms")
-            logger.info(f"[CAMERA] - TOTAL capture path: {dt_total_ms:.1f} ms")
 
-            telescope_state.last_picture = image.data
-            return image
+    def camera_begin_roi(self, roi: tuple, binning: int = 1, fast_readout: bool = False) -> bool:
+        """
+        Reads only a region of the sensor (Alpaca StartX/StartY/NumX/NumY, in binned pixels)
+        until camera_end_roi, which restores the binning and geometry saved here
+        """
+        self.camera_end_roi()
+        x, y, width, height = roi
+        saved = None
+        try:
+            saved = alpaca_camera_client.get_subframe()
+            alpaca_camera_client.set_subframe(x // binning, y // binning, width // binning, height // binning, binning)
+            fast_readout = bool(fast_readout and alpaca_camera_client.camera_info.can_fast_readout)
+            if fast_readout:
+                self.set_fast_read_out(True)
+        except Exception as e:
+            logger.error(f"[CAMERA] - Sub frame setup error {e}")
+            if saved is not None:
+                self._roi_session = (None, None, saved, False)
+                self.camera_end_roi()
+            return False
+        self._roi_session = (tuple(roi), binning, saved, fast_readout)
+        return True
 
+    def camera_end_roi(self):
+        if self._roi_session is None:
+            return
+        _, _, saved, fast_readout = self._roi_session
+        self._roi_session = None
+        try:
+            alpaca_camera_client.restore_subframe(saved)
+            telescope_state.bin_x, telescope_state.bin_y = saved[4], saved[5]
+            if fast_readout:
+                self.set_fast_read_out(False)
         except Exception as e:
-            logger.error(f"[CAMERA] - Alpaca Error {e}")
+            logger.error(f"[CAMERA] - Unable to restore the sensor geometry {e}")
+
+    def camera_capture_roi(self, expo: float, roi: tuple, binning: int = 1, fast_readout: bool = False):
+        if self._roi_session is not None and self._roi_session[:2] == (tuple(roi), binning):
+            return self.camera_capture(expo)
+        # Capture isolée : la région n'est configurée que le temps de cette pose
+        if not self.camera_begin_roi(roi, binning, fast_readout):
             return None
-    
+        try:
+            return self.camera_capture(expo)
+        finally:
+            self.camera_end_roi()
 
     def set_gain(self, gain: int):
         logger.info(f"[CAMERA] - Setting gain to {gain}")
@@ -138,8 +174,9 @@ class AlpacaTelescope(TelescopeInterface):
     def move_focuser(self, position: int):
         alpaca_focuser_client.move_absolute(position)
         while alpaca_focuser_client.is_moving():
-            sleep(1)
-        sleep(1)
+            sleep(0.2)
+        # Temps de stabilisation du train optique après l'arrêt du moteur
+        sleep(CONFIG['global'].get('focuser_settle_time', 1))
 
     def focuser_connect(self):
         alpaca_focuser_client.connect()
@@ -148,6 +185,13 @@ class AlpacaTelescope(TelescopeInterface):
     def focuser_get_current_position(self):
         return alpaca_focuser_client.get_position()
 
+    def focuser_get_temperature(self):
+        try:
+            return alpaca_focuser_client.get_temperature()
+        except Exception as e:
+            logger.warning(f"[FOCUSER] - No focuser temperature: {e}")
+            return None
+
     def telescope_connect(self):
         try:
             alpaca_telescope_client.connect()
@@ -199,6 +243,14 @@ class AlpacaTelescope(TelescopeInterface):
         except:
             return False
 
+    def get_filter_focus_offsets(self) -> dict:
+        try:
+            offsets = alpaca_fw_client.get_focus_offsets()
+            return dict(zip(CONFIG['filterwheel'].get("filters", []), offsets))
+        except Exception as e:
+            logger.warning(f"[FILTERWHEEL] - No focus offsets: {e}")
+            return {}
+
     def change_filter(self, filter)-> bool:
         #self.has_fw = self.telescope_interface.fw_connect() if len(CONFIG['filterwheel'].get("filters", []))>1 else False
         try:
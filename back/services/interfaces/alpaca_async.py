@@ -0,0 +1,108 @@
+import asyncio
+from time import perf_counter
+import numpy as np
+from services.drivers.alpaca_client_async import alpaca_camera_client, alpaca_focuser_client, ExposureSettings, CameraState
+from services.configurator import CONFIG
+from models.state import telescope_state
+from utils.logger import logger
+
+
+class AsyncAlpacaTelescope:
+    """
+    Alpaca devices for the API routes, on the asyncio client.
+
+    A route awaiting a capture or a focuser move does not hold a threadpool
+    worker while the device works. Only the calls made by the routes are
+    available, the automates (scheduler, autofocus, darks) run in their own
+    threads on the synchronous AlpacaTelescope. Results and errors follow the
+    synchronous interface (None on capture error).
+    """
+
+    # Même attente de fin de pose que AlpacaTelescope : pas de requête pendant la pose
+    POLL_MARGIN = 0.05
+    POLL_MIN = 0.02
+    POLL_MAX = 0.5
+
+    def __init__(self):
+        self._readout_time = 0.0
+
+    # ===========================================
+    # Caméra
+    # ===========================================
+    async def set_gain(self, gain: int):
+        logger.info(f"[CAMERA] - Setting gain to {gain}")
+        await alpaca_camera_client.set_camera_gain(gain)
+
+    async def _wait_image_ready(self, start: float, expo: float) -> float:
+        """Waits for ImageReady, returns the readout time of the frame (s)"""
+        deadline = start + expo + self._readout_time
+        delay = deadline - self.POLL_MARGIN - perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        timeout = deadline + CONFIG['global'].get('camera_readout_timeout', 60)
+        interval = 0
+        while not await alpaca_camera_client.is_image_ready():
+            if perf_counter() > timeout:
+                raise TimeoutError("Image not ready")
+            if interval >= self.POLL_MAX and await alpaca_camera_client.get_camera_state() == CameraState.ERROR:
+                raise RuntimeError("Camera in error state")
+            interval = min(max(interval * 2, self.POLL_MIN), self.POLL_MAX)
+            await asyncio.sleep(interval)
+        readout = max(0.0, perf_counter() - start - expo - interval / 2)
+        self._readout_time = 0.5 * (self._readout_time + readout) if self._readout_time else readout
+        return readout
+
+    async def camera_capture(self, expo: float, light: bool = True):
+        try:
+            await alpaca_camera_client.start_exposure(ExposureSettings(duration=expo, light=light))
+            start = perf_counter()
+            readout = await self._wait_image_ready(start, expo)
+            t0 = perf_counter()
+            image = await alpaca_camera_client.get_image_array()
+            # Vues sur le tampon de réception (lecture seule), aucune copie de l'image
+            if image.data.ndim == 2:
+                image.data = image.data.T
+            else:
+                image.data = np.transpose(image.data, (1, 0, 2))
+            logger.info(f"[CAMERA] - Exposure {expo:.3f}s | readout {readout * 1000:.0f} ms | "
+                        f"download {(perf_counter() - t0) * 1000:.0f} ms (w={image.width} h={image.height})")
+            telescope_state.last_picture = image.data
+            return image
+        except Exception as e:
+            logger.error(f"[CAMERA] - Alpaca Error {e}")
+            return None
+
+    async def get_ccd_temperature(self) -> int:
+        return round(await alpaca_camera_client.get_ccd_temperature())
+
+    # ===========================================
+    # Focuser
+    # ===========================================
+    async def move_focuser(self, position: int):
+        await alpaca_focuser_client.move_absolute(position)
+        while await alpaca_focuser_client.is_moving():
+            await asyncio.sleep(0.2)
+        # Temps de stabilisation du train optique après l'arrêt du moteur
+        await asyncio.sleep(CONFIG['global'].get('focuser_settle_time', 1))
+
+    async def focuser_get_current_position(self):
+        return await alpaca_focuser_client.get_position()
+
+    async def focuser_get_temperature(self):
+        try:
+            return await alpaca_focuser_client.get_temperature()
+        except Exception as e:
+            logger.warning(f"[FOCUSER] - No focuser temperature: {e}")
+            return None
+
+    async def get_max_focuser_step(self):
+        try:
+            return await alpaca_focuser_client.get_max_step()
+        except Exception as e:
+            logger.error(f"[FOCUSER] - Focuser error: {e}")
+
+    async def focuser_halt(self):
+        try:
+            return await alpaca_focuser_client.halt()
+        except Exception as e:
+            logger.error(f"[FOCUSER] - Focuser error: {e}")
@@ -0,0 +1,33 @@
+from typing import NamedTuple, Optional
+import cv2
+import numpy as np
+
+
+class PreviewEncoding(NamedTuple):
+    """Size, quality and format of an encoded preview"""
+    width: Optional[int] = None
+    quality: int = 95
+    format: str = "jpeg"
+
+
+# Extension, paramètre de qualité OpenCV et type MIME de chaque format d'aperçu
+PREVIEW_FORMATS = {
+    "jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY, "image/jpeg"),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY, "image/webp"),
+}
+
+
+def encode_preview(image: np.ndarray, encoding: PreviewEncoding = PreviewEncoding()) -> bytes:
+    """
+    Resize (never enlarge) and encode an uint8 RGB or grayscale image with OpenCV
+    """
+    extension, quality_flag, _ = PREVIEW_FORMATS[encoding.format]
+    h, w = image.shape[:2]
+    if encoding.width and encoding.width < w:
+        image = cv2.resize(image, (encoding.width, max(1, round(h * encoding.width / w))), interpolation=cv2.INTER_AREA)
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    ok, buffer = cv2.imencode(extension, image, [quality_flag, encoding.quality])
+    if not ok:
+        raise ValueError(f"Unable to encode the preview as {encoding.format}")
+    return buffer.tobytes()
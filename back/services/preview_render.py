@@ -0,0 +1,47 @@
+import threading
+import numpy as np
+from imageprocessing.astrofilters import AstroFilters
+from imageprocessing.imagestats import ImageStats
+from imageprocessing.pipeline import FilterPipeline
+from models.api import ImageSettings
+from services.configurator import CONFIG
+from utils.section_timer import SectionTimer
+
+
+astro_filters = AstroFilters(tile_size=CONFIG['global'].get("filter_tile_size", 1024), workers=CONFIG['global'].get("filter_workers", 0))
+
+
+def settings_key(settings: ImageSettings) -> tuple:
+    """Hashable key of everything in the image settings that changes the rendered preview"""
+    pipeline = None
+    if settings.pipeline is not None:
+        pipeline = tuple((step.name, tuple(sorted(step.params.items()))) for step in settings.pipeline)
+    return (settings.stretch, settings.black_point, pipeline)
+
+# Pipelines construits, un seul réglage étant actif à la fois le cache est vidé à chaque changement
+preview_pipelines = {}
+_preview_pipelines_lock = threading.Lock()
+
+def get_preview_pipeline(settings: ImageSettings):
+    if settings.pipeline is None:
+        return None
+    key = settings_key(settings)
+    with _preview_pipelines_lock:
+        pipeline = preview_pipelines.get(key)
+        if pipeline is None:
+            pipeline = FilterPipeline.from_spec(settings.pipeline, filters=astro_filters)
+            preview_pipelines.clear()
+            preview_pipelines[key] = pipeline
+    return pipeline
+
+def render_uint8(image: np.ndarray, settings: ImageSettings, timer: SectionTimer = None, stats: ImageStats = None) -> np.ndarray:
+    """
+    Stretch an image with the given settings to uint8
+    The image settings pipeline is used when defined
+    The ImageStats of the image, if given, spares the histogram computation
+    """
+    pipeline = get_preview_pipeline(settings)
+    if pipeline is not None:
+        return pipeline.run(image, to_uint8=True, timer=timer)
+    # Étirement, point noir et conversion uint8 en une passe d'histogramme par canal
+    return astro_filters.stretch_to_uint8(image, settings.stretch, settings.black_point, stats=stats)
@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 import time
 from models.observation import StopScheduler, Observation
@@ -12,10 +13,13 @@ from imageprocessing.astrofilters import AstroFilters
 from services.dark_manager import DarkManager
 from ws.websocket_manager import ws_manager
 from services.history_manager import HistoryManager
+from services.tile_pyramid import tile_pyramid
+from services.thumbnail_cache import thumbnail_cache
 from models.basic_automate import BasicAutomate
 from numpy import uint16
 from imageprocessing.stacker.fitsstacker_python import ImageStacker
 from models.constants import AUTOMATE_STEP
+from services.capture_stats import capture_stats
 
 
 class Scheduler(BasicAutomate):
@@ -25,12 +29,18 @@ class Scheduler(BasicAutomate):
         self.fit_path = Path(CONFIG['global'].get("fits_storage_dir")).resolve()
         self.fit_path.mkdir(parents=True, exist_ok=True)
         self.fits_manager=FitsImageManager(True, True)
-        self.astro_filters=AstroFilters()
+        self.astro_filters=AstroFilters(
+            tile_size=CONFIG['global'].get("filter_tile_size", 1024),
+            workers=CONFIG['global'].get("filter_workers", 0),
+            combine_memory_budget=CONFIG['global'].get("combine_memory_budget_mb", 512) * 2**20,
+            combine_processes=CONFIG['global'].get("combine_processes", 1)
+        )
         self.dark_config = Path(CONFIG['global'].get("dark_directory")) / Path("config.json")
         self.history = HistoryManager()
         self.captures_done=0
         self.image_error = 0
         self.has_to_slew = False
+        self.current_filter = None
     """
     def _on_image_stack(self, path: Path):
         try:
@@ -65,6 +75,10 @@ class Scheduler(BasicAutomate):
                     Path(path) / Path(f"stacked_image_{self.captures_done:03d}.fits"), 
                     []
                 )
+                try:
+                    tile_pyramid.register(Path(path) / Path(f"stacked_image_{self.captures_done:03d}.fits"), stacked_image.shape, kind="stacked")
+                except Exception as e:
+                    logger.error(f"[SCHEDULER] - Error registering tiles of the stacked image: {e}")
                 self.history.update_obs_image(None, Path(path) / Path(f"stacked_image_{self.captures_done:03d}.fits"))
                 ws_manager.broadcast_sync(ws_manager.format_message("SCHEDULER","NEWIMAGE"))
             else:
@@ -88,8 +102,75 @@ class Scheduler(BasicAutomate):
     
             last_call = tb[-1]
 
+    def _reorder_filters(self, plan: list[Observation], current_filter: str = None) -> list[Observation]:
+        """
+        Reorders the consecutive observations of a same target to reduce filter
+        changes and focuser moves: the filter already in place first, then the
+        others by increasing focus offset, identical filters grouped. The time
+        slots of the group are kept, each observation keeps its own duration.
+
+        Args:
+            plan: Observations sorted by start
+            current_filter: Filter in the wheel before the plan
+
+        Returns:
+            New plan, observations are copied when their start changes
+        """
+        offsets = self.filter_offsets()
+        result = []
+        i = 0
+        while i < len(plan):
+            j = i + 1
+            while j < len(plan) and (plan[j].object, plan[j].ra, plan[j].dec) == (plan[i].object, plan[i].ra, plan[i].dec):
+                j += 1
+            group = plan[i:j]
+            # Durée de chaque créneau : jusqu'au suivant, la durée des poses pour le dernier du plan
+            end = plan[j].start if j < len(plan) else group[-1].start + group[-1].number * group[-1].expo / 3600
+            lengths = [after.start - obs.start for obs, after in zip(group, group[1:])] + [end - group[-1].start]
+            first_seen = {}
+            for obs in group:
+                first_seen.setdefault(obs.filter, len(first_seen))
+            order = sorted(range(len(group)), key=lambda k: (
+                group[k].filter != current_filter,
+                offsets.get(group[k].filter, float("inf")),
+                first_seen[group[k].filter],
+            ))
+            start = group[0].start
+            for k in order:
+                result.append(group[k] if group[k].start == start else group[k].model_copy(update={"start": start}))
+                start += lengths[k]
+            current_filter = result[-1].filter
+            i = j
+        return result
+
+    def _start_capture(self, obs: Observation) -> dict:
+        """Starts the exposure of a light frame, returns its FITS header (read from the devices during the exposure)"""
+        self.telescope_interface.camera_start_exposure(obs.expo)
+        capture_stats.exposure_started(obs.expo)
+        return self.telescope_interface.capture_header(obs.expo, obs.ra, obs.dec, obs.filter, obs.object, obs.gain)
+
+    def _can_chain(self, obs: Observation, next_time) -> bool:
+        """True if the next frame of the observation can start right now, without slew"""
+        return (
+            self.captures_done < obs.number
+            and not self._stop_requested
+            and not self.has_to_slew
+            and not (next_time and datetime.now() >= next_time)
+        )
+
+    def _store_capture(self, image, header: dict, directory: Path, index: int):
+        """Writes a frame and sends it to the live stacker (writer thread)"""
+        try:
+            path = self.telescope_interface.save_capture(image, header, directory)
+            self.stacker.process_new_image(path)
+            self.history.update_obs_image(index)
+        except Exception as e:
+            logger.error(f"[SCHEDULER] - Error storing capture {index}: {e}")
+
     def _execute_plan(self, plan: list[Observation]):
         plan = sorted(self.plan, key=lambda obs: obs.start)
+        if self.has_fw and CONFIG['global'].get('filter_reorder', True):
+            plan = self._reorder_filters(plan, self.current_filter)
         self.history.add_plan(plan)
         self.is_running=True
 
@@ -103,7 +184,8 @@ class Scheduler(BasicAutomate):
             
             if self.has_fw:
                 logger.info("[SCHEDULER] - Changing filter")
-                self.telescope_interface.change_filter(obs.filter)
+                self.change_filter(self.current_filter, obs.filter)
+                self.current_filter = obs.filter
 
             now = datetime.now()
             start_hour = int(obs.start)
@@ -149,7 +231,7 @@ class Scheduler(BasicAutomate):
             if CONFIG["telescope"].get("has_focuser", False) and (not telescope_state.is_focused or obs.focus):
                 logger.info("[SCHEDULER] - FOCUS process")
                 self.set_status("focusing")
-                self.get_focus(obs.ra, obs.dec)
+                self.focus(obs.ra, obs.dec, obs.filter)
                 telescope_state.is_focused = True
                         
             dark=DarkManager.choose_dark(self.dark_config, obs.expo, obs.gain, temperature, CONFIG.get('camera',{}).get("id",""))
@@ -168,43 +250,53 @@ class Scheduler(BasicAutomate):
             self.has_to_slew = True
             self.history.new_obs()
 
+            # La pose N+1 démarre dès la fin du téléchargement de la pose N,
+            # l'écriture, l'indexation et l'empilement de N se font pendant qu'elle s'expose
+            writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="capture")
+            stored = None
+            header = None
+            capture_stats.new_sequence()
+            self.telescope_interface.set_gain(obs.gain)
+            try:
+                while self.captures_done < obs.number:
+                    self.automate_step = AUTOMATE_STEP["TEMPERATURE"]
+
+                    if header is None:
+                        if self._stop_requested:
+                            logger.info("[SCHEDULER] Stop requested during capture.")
+                            break
+
+                        if self.has_to_slew:
+                            if not self.slew_to_target(obs.ra, obs.dec):
+                                logger.error("[SCHEDULER] - Failed to slew to target")
+                                time.sleep(min(60*5,next_time - datetime.now()))
+                                continue
+                            self.has_to_slew = False
+                            self.image_error = 0
+                            capture_stats.new_sequence()
+
+                        self.set_status("capturing")
+
+                        if next_time and datetime.now() >= next_time:
+
+                            logger.info(f"[SCHEDULER] Next observation time reached. Skipping remaining captures.")
+                            break
+
+                        header = self._start_capture(obs)
+
+                    logger.info(f"[SCHEDULER] Capture {self.captures_done+1}/{obs.number} of {obs.object}")
+                    image = self.telescope_interface.camera_read_image()
+                    self.captures_done += 1
+                    current, header = header, None
+                    if self._can_chain(obs, next_time):
+                        header = self._start_capture(obs)
+
+                    if stored is not None:
+                        stored.result()
+                    stored = writer.submit(self._store_capture, image, current, directory, self.captures_done)
+            finally:
+                writer.shutdown(wait=True)
 
-            while self.captures_done < obs.number:
-                self.automate_step = AUTOMATE_STEP["TEMPERATURE"]
-
-                if self._stop_requested:
-                    logger.info("[SCHEDULER] Stop requested during capture.")
-                    break
-
-                if self.has_to_slew:
-                    if not self.slew_to_target(obs.ra, obs.dec):
-                        logger.error("[SCHEDULER] - Failed to slew to target")
-                        time.sleep(min(60*5,next_time - datetime.now()))
-                        continue
-                    self.has_to_slew = False
-                    self.image_error = 0
-                
-                self.set_status("capturing")
-
-                if next_time and datetime.now() >= next_time:
-                    
-                    logger.info(f"[SCHEDULER] Next observation time reached. Skipping remaining captures.")
-                    break
-
-                logger.info(f"[SCHEDULER] Capture {self.captures_done+1}/{obs.number} of {obs.object}")
-                image= self.telescope_interface.capture_to_fit(
-                    exposure=obs.expo,
-                    gain=obs.gain,
-                    ra=obs.ra,
-                    dec=obs.dec,
-                    filter_name=obs.filter,
-                    target_name=obs.object,
-                    path=directory
-                )
-                self.stacker.process_new_image(image)
-                self.captures_done += 1
-                self.history.update_obs_image(self.captures_done)
-            
             # Update History for plan information
 
 
@@ -213,6 +305,11 @@ class Scheduler(BasicAutomate):
             ws_manager.broadcast_sync(ws_manager.format_message("SCHEDULER","REFRESHINFO"))
             self.stacker.stop_live_stacking()
 
+            # Aperçus de l'historique générés une fois pour toutes à la clôture de l'observation
+            stacked = self.history.history[self.history.index - 1].jpg
+            if stacked:
+                thumbnail_cache.generate_async(Path(stacked), telescope_state.image_settings)
+
         logger.info("[SCHEDULER] Execution completed.")
         if temperature:
             logger.info("[SCHEDULER] - Turning off cooler")
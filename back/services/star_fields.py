@@ -0,0 +1,143 @@
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import NamedTuple, Optional, Tuple
+import duckdb
+import numpy as np
+from starplot.data import DataFiles
+from services.configurator import CURRENT_DIR
+from utils.logger import logger
+
+
+class StarField(NamedTuple):
+    ra: float  # heures
+    dec: float  # degrés
+    altitude: float  # degrés
+    density: float  # étoiles par degré carré
+
+
+class StarFieldIndex:
+    """
+    Star density of the whole sky, used to choose a focusing field in a single query.
+
+    The index counts the stars of the offline catalog shipped with starplot
+    (Big Sky, magnitude <= 11) in cells of CELL degrees. It is built once and
+    cached as a .npy file. The density of a cell is averaged with its
+    neighbours, so that a field is chosen for its surroundings and not for a
+    single cluster.
+    """
+
+    CELL = 1.0
+
+    def __init__(self, cache_path: Path, catalog: Path = DataFiles.BIG_SKY_MAG11):
+        self.cache_path = cache_path
+        self.catalog = catalog
+        self._lock = threading.Lock()
+        self._density: Optional[np.ndarray] = None
+
+    def _build(self) -> np.ndarray:
+        """Counts the catalog stars by cell, (dec, ra) array"""
+        rows, columns = int(180 / self.CELL), int(360 / self.CELL)
+        counts = np.zeros((rows, columns), dtype=np.int32)
+        query = f"""
+            SELECT
+                LEAST(CAST(FLOOR((dec_degrees + 90) / {self.CELL}) AS INTEGER), {rows - 1}) AS row,
+                CAST(FLOOR(ra_degrees / {self.CELL}) AS INTEGER) % {columns} AS col,
+                COUNT(*) AS stars
+            FROM read_parquet('{Path(self.catalog).as_posix()}')
+            GROUP BY row, col
+        """
+        for row, column, stars in duckdb.sql(query).fetchall():
+            counts[row, column] = stars
+        return counts
+
+    @property
+    def density(self) -> np.ndarray:
+        """Smoothed density (stars / deg²) of each cell"""
+        with self._lock:
+            if self._density is None:
+                try:
+                    counts = np.load(self.cache_path)
+                except (OSError, ValueError):
+                    logger.info(f"[STARFIELDS] - Building the star density index from {self.catalog}")
+                    counts = self._build()
+                    try:
+                        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+                        np.save(self.cache_path, counts)
+                    except OSError as e:
+                        logger.warning(f"[STARFIELDS] - Unable to cache the star density index: {e}")
+                dec = self.dec_centers()[:, None]
+                area = self.CELL ** 2 * np.cos(np.radians(dec))
+                # Moyenne 3x3 (l'ascension droite boucle, la déclinaison non)
+                padded_counts = np.pad(np.pad(counts.astype(np.float64), ((0, 0), (1, 1)), mode='wrap'), ((1, 1), (0, 0)))
+                padded_area = np.pad(np.broadcast_to(area, counts.shape), ((1, 1), (1, 1)))
+                total_counts = sum(padded_counts[i:i + counts.shape[0], j:j + counts.shape[1]] for i in range(3) for j in range(3))
+                total_area = sum(padded_area[i:i + counts.shape[0], j:j + counts.shape[1]] for i in range(3) for j in range(3))
+                self._density = total_counts / np.maximum(total_area, 1e-9)
+            return self._density
+
+    def dec_centers(self) -> np.ndarray:
+        return -90 + (np.arange(int(180 / self.CELL)) + 0.5) * self.CELL
+
+    def ra_centers(self) -> np.ndarray:
+        return (np.arange(int(360 / self.CELL)) + 0.5) * self.CELL
+
+    @staticmethod
+    def local_sidereal_time(longitude: float, when: Optional[datetime] = None) -> float:
+        """Local mean sidereal time in degrees"""
+        when = when or datetime.now(timezone.utc)
+        julian_day = when.timestamp() / 86400.0 + 2440587.5
+        return (280.46061837 + 360.98564736629 * (julian_day - 2451545.0) + longitude) % 360
+
+    def best_field(
+        self,
+        latitude: float,
+        longitude: float,
+        min_altitude: float = 40,
+        near: Optional[Tuple[float, float]] = None,
+        max_distance: float = 30,
+        when: Optional[datetime] = None,
+    ) -> Optional[StarField]:
+        """
+        Densest field above min_altitude, within max_distance degrees of `near` if possible
+
+        Args:
+            latitude, longitude: Observatory (degrees, east positive)
+            min_altitude: Lowest altitude of the field (degrees)
+            near: (ra hours, dec degrees) of the target, the field is searched around it first
+            max_distance: Search radius around the target (degrees)
+            when: Date of the observation (UTC), now if None
+
+        Returns:
+            StarField, None if no cell is high enough
+        """
+        density = self.density
+        dec = np.radians(self.dec_centers())[:, None]
+        ra = np.radians(self.ra_centers())[None, :]
+        lat = np.radians(latitude)
+        hour_angle = np.radians(self.local_sidereal_time(longitude, when)) - ra
+        altitude = np.degrees(np.arcsin(np.clip(
+            np.sin(dec) * np.sin(lat) + np.cos(dec) * np.cos(lat) * np.cos(hour_angle), -1, 1)))
+        candidates = altitude >= min_altitude
+        if not candidates.any():
+            return None
+
+        if near is not None:
+            target_ra, target_dec = np.radians(near[0] * 15), np.radians(near[1])
+            distance = np.degrees(np.arccos(np.clip(
+                np.sin(dec) * np.sin(target_dec) + np.cos(dec) * np.cos(target_dec) * np.cos(ra - target_ra), -1, 1)))
+            close = candidates & (distance <= max_distance)
+            if close.any():
+                candidates = close
+
+        score = np.where(candidates, density, -1)
+        row, column = np.unravel_index(np.argmax(score), score.shape)
+        return StarField(
+            ra=float(self.ra_centers()[column] / 15),
+            dec=float(self.dec_centers()[row]),
+            altitude=float(altitude[row, column]),
+            density=float(density[row, column]),
+        )
+
+
+star_fields = StarFieldIndex(CURRENT_DIR.parent / "config" / "star_density.npy")
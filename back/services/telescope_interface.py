@@ -2,6 +2,8 @@
 from services.configurator import CONFIG
 from utils.logger import logger
 
+# Interface asyncio pour les routes de l'API, None en simulation (les routes passent alors par telescope_interface)
+async_telescope_interface = None
 if CONFIG["global"].get("mode_simulator", False):
     logger.info("[TELESCOPE] - Running in simulator mode")
     from services.interfaces.simulator import SimulatorTelescope
@@ -9,8 +11,10 @@ if CONFIG["global"].get("mode_simulator", False):
     telescope_interface = SimulatorTelescope()
 else:
     from services.interfaces.alpaca import AlpacaTelescope
+    from services.interfaces.alpaca_async import AsyncAlpacaTelescope
 
     telescope_interface = AlpacaTelescope()
+    async_telescope_interface = AsyncAlpacaTelescope()
 if not CONFIG["global"].get("mode_debug", False):
     telescope_interface.connect()
 
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Iterable
+import numpy as np
+from imageprocessing.fitsprocessor import FitsImageManager
+from models.api import ImageSettings
+from services.preview_encoding import PreviewEncoding, PREVIEW_FORMATS, encode_preview
+from services.preview_render import render_uint8, settings_key
+from utils.logger import logger
+
+
+# Variantes générées à la clôture d'une observation : miniature de la liste et aperçu plein écran
+DEFAULT_VARIANTS = (
+    PreviewEncoding(width=400, quality=80),
+    PreviewEncoding(),
+)
+
+
+class ThumbnailCache:
+    """
+    Encoded previews of the stacked FITS of the history, stored next to them.
+
+    Each variant (size, quality, format, image settings including the filter
+    pipeline) is rendered like the live preview (render_uint8) and written as
+    `<stem>.<content hash>.<variant hash><ext>` beside `<stem>.fits`. The
+    content hash of the FITS file is kept in `<stem>.thumbs.json` and only
+    recomputed when the file size or mtime changes; previews of an older
+    content are removed when the new ones are written. The content and
+    variant hashes also make a stable ETag.
+    """
+
+    def __init__(self):
+        self.fits_manager = FitsImageManager(auto_debayer=True)
+        self._lock = threading.Lock()
+        self._path_locks: Dict[str, threading.Lock] = {}
+
+    def _path_lock(self, path: Path) -> threading.Lock:
+        with self._lock:
+            return self._path_locks.setdefault(str(path), threading.Lock())
+
+    @staticmethod
+    def _sidecar(path: Path) -> Path:
+        return path.with_name(f"{path.stem}.thumbs.json")
+
+    def content_hash(self, path: Path) -> str:
+        """
+        SHA-1 of the FITS file, cached in the sidecar file while its size and mtime are unchanged
+        """
+        stat = path.stat()
+        sidecar = self._sidecar(path)
+        try:
+            cached = json.loads(sidecar.read_text())
+            if cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+                return cached["sha1"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        sha1 = digest.hexdigest()
+        try:
+            sidecar.write_text(json.dumps({"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha1": sha1}))
+        except OSError as e:
+            logger.warning(f"[THUMBNAILS] - Unable to write {sidecar}: {e}")
+        return sha1
+
+    @staticmethod
+    def _variant_hash(encoding: PreviewEncoding, settings: ImageSettings) -> str:
+        return hashlib.sha1(repr((tuple(encoding), settings_key(settings))).encode()).hexdigest()[:8]
+
+    def _variant_path(self, path: Path, content: str, encoding: PreviewEncoding, settings: ImageSettings) -> Path:
+        extension = PREVIEW_FORMATS[encoding.format][0]
+        return path.with_name(f"{path.stem}.{content[:12]}.{self._variant_hash(encoding, settings)}{extension}")
+
+    def _remove_stale(self, path: Path, content: str) -> None:
+        """Removes the previews of an older content of the FITS file"""
+        pattern = re.compile(rf"^{re.escape(path.stem)}\.([0-9a-f]{{12}})\.[0-9a-f]{{8}}\.(jpg|webp)$")
+        for candidate in path.parent.glob(f"{path.stem}.*"):
+            match = pattern.match(candidate.name)
+            if match and match.group(1) != content[:12]:
+                candidate.unlink(missing_ok=True)
+
+    def _render(self, path: Path, settings: ImageSettings) -> np.ndarray:
+        image = self.fits_manager.open_fits(str(path)).data
+        return render_uint8(image, settings)
+
+    def generate(
+        self,
+        path: Path,
+        settings: ImageSettings,
+        encodings: Iterable[PreviewEncoding] = DEFAULT_VARIANTS,
+    ) -> Dict[PreviewEncoding, Path]:
+        """
+        Writes the missing previews of a FITS file, the FITS is read and stretched at most once.
+
+        Args:
+            path: Stacked FITS file
+            settings: Image settings (stretch, black point, filter pipeline)
+            encodings: Variants to generate
+
+        Returns:
+            Path of each variant
+        """
+        path = Path(path)
+        with self._path_lock(path):
+            content = self.content_hash(path)
+            targets = {encoding: self._variant_path(path, content, encoding, settings) for encoding in encodings}
+            missing = [encoding for encoding, target in targets.items() if not target.exists()]
+            if missing:
+                rendered = self._render(path, settings)
+                self._remove_stale(path, content)
+                for encoding in missing:
+                    temporary = targets[encoding].with_name(targets[encoding].name + ".tmp")
+                    temporary.write_bytes(encode_preview(rendered, encoding))
+                    os.replace(temporary, targets[encoding])
+            return targets
+
+    def etag(self, path: Path, encoding: PreviewEncoding, settings: ImageSettings) -> str:
+        """ETag of a preview, known without generating it"""
+        return f'"{self.content_hash(Path(path))[:12]}-{self._variant_hash(encoding, settings)}"'
+
+    def get(self, path: Path, encoding: PreviewEncoding, settings: ImageSettings) -> Path:
+        """
+        Returns a preview of a FITS file, generated on first use
+
+        Raises:
+            OSError: FITS file missing or unreadable
+        """
+        path = Path(path)
+        target = self._variant_path(path, self.content_hash(path), encoding, settings)
+        if not target.exists():
+            target = self.generate(path, settings, (encoding,))[encoding]
+        return target
+
+    def generate_async(self, path: Path, settings: ImageSettings) -> None:
+        """Generates the default variants in a background thread (end of an observation)"""
+        settings = settings.model_copy(deep=True)
+        def run():
+            try:
+                self.generate(path, settings)
+            except Exception as e:
+                logger.error(f"[THUMBNAILS] - Unable to generate the previews of {path}: {e}")
+        threading.Thread(target=run, daemon=True).start()
+
+
+thumbnail_cache = ThumbnailCache()
@@ -0,0 +1,348 @@
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+from astropy.io import fits
+from imageprocessing.astrofilters import AstroFilters
+from imageprocessing.fitsprocessor import FitsImageManager
+from services.configurator import CONFIG
+
+
+PYRAMID_ID = re.compile(r"^[0-9a-f]{16}$")
+
+
+class TilePyramid:
+    """
+    Deep-zoom pyramids of stretched JPEG tiles for full resolution frames.
+
+    Frames are registered in memory when they are saved, only the latest
+    frame and stacked image are kept. A pyramid is created on disk
+    (`cache_dir/<id>/meta.json`) by the first describe() or tile() request,
+    tiles are rendered lazily and cached under
+    `cache_dir/<id>/<settings>/<z>/<x>_<y>.jpg`. Level `max_zoom` is the
+    full resolution image, every level below halves it, level 0 fits in a
+    single tile. Edge tiles are padded with black to the full tile size.
+
+    The stretched levels of the most recently used pyramids are kept in
+    memory so that panning through a frame does not reload its FITS file.
+    A pyramid is discarded when its source file changes (size or mtime).
+    The disk cache is pruned (see prune()): settings variants unused for
+    max_age seconds go first, then the least recently used ones while the
+    cache is larger than max_bytes, and pyramids left without tiles.
+    """
+
+    # Intervalle minimal entre deux élagages du cache disque (s)
+    PRUNE_INTERVAL = 60
+
+    def __init__(self, cache_dir: Path, tile_size: int = 256, quality: int = 85, memory_pyramids: int = 1,
+                 max_bytes: int = 1 << 30, max_age: float = 7 * 86400):
+        self.cache_dir = Path(cache_dir)
+        self.tile_size = tile_size
+        self.quality = quality
+        self.memory_pyramids = memory_pyramids
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.latest: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._build_locks: Dict[str, threading.Lock] = {}
+        # Images déclarées dont la pyramide n'est pas encore créée : id -> (chemin, forme)
+        self._pending: Dict[str, Tuple[Path, Optional[Tuple[int, ...]]]] = {}
+        self._last_prune = 0.0
+        self._levels: "OrderedDict[Tuple[str, Tuple], List[Optional[np.ndarray]]]" = OrderedDict()
+        self._fits_manager = FitsImageManager(auto_debayer=True)
+        self._filters = AstroFilters()
+
+    @staticmethod
+    def pyramid_id(path: Path) -> str:
+        return hashlib.sha1(str(Path(path).resolve()).encode()).hexdigest()[:16]
+
+    def _meta_path(self, pyramid_id: str) -> Path:
+        return self.cache_dir / pyramid_id / "meta.json"
+
+    def register(self, path: Path, shape: Optional[Tuple[int, ...]] = None, kind: Optional[str] = "frame") -> str:
+        """
+        Declares a saved frame, nothing is written: its pyramid is created by the
+        first describe() or tile() request. Only the latest frame of each kind
+        (and the frame just declared) stay declared.
+
+        Args:
+            path: FITS file
+            shape: Image shape (H, W[, C]) if already known, otherwise read from the header
+            kind: "frame" or "stacked", the latest registered id of each kind is kept in `latest`;
+                  None registers the pyramid without changing `latest` (history)
+
+        Returns:
+            Pyramid id
+        """
+        path = Path(path).resolve()
+        pyramid_id = self.pyramid_id(path)
+        with self._lock:
+            self._pending[pyramid_id] = (path, shape)
+            if kind is not None:
+                self.latest[kind] = pyramid_id
+            keep = set(self.latest.values()) | {pyramid_id}
+            for other in [other for other in self._pending if other not in keep]:
+                del self._pending[other]
+        return pyramid_id
+
+    def _create(self, path: Path, shape: Optional[Tuple[int, ...]] = None) -> Dict[str, Any]:
+        """Writes the description of a pyramid, its tiles are discarded if the source file changed"""
+        pyramid_id = self.pyramid_id(path)
+        if shape is None:
+            header = fits.getheader(path)
+            shape = (header.get("NAXIS2"), header.get("NAXIS1"))
+        height, width = int(shape[0]), int(shape[1])
+        stat = path.stat()
+        meta = {
+            "id": pyramid_id,
+            "path": str(path),
+            "width": width,
+            "height": height,
+            "tile_size": self.tile_size,
+            "max_zoom": max(0, math.ceil(math.log2(max(width, height) / self.tile_size))),
+            "file_size": stat.st_size,
+            "mtime": stat.st_mtime,
+        }
+        with self._build_lock(pyramid_id):
+            previous = self._read_meta(pyramid_id)
+            if previous != meta:
+                self._discard(pyramid_id)
+                meta_path = self._meta_path(pyramid_id)
+                meta_path.parent.mkdir(parents=True, exist_ok=True)
+                meta_path.write_text(json.dumps(meta))
+        self.prune()
+        return {key: meta[key] for key in ("id", "width", "height", "tile_size", "max_zoom")}
+
+    def _read_meta(self, pyramid_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(self._meta_path(pyramid_id).read_text())
+        except (OSError, ValueError):
+            return None
+
+    def _discard(self, pyramid_id: str) -> None:
+        """Removes the cached tiles and levels of a pyramid"""
+        with self._lock:
+            for key in [key for key in self._levels if key[0] == pyramid_id]:
+                del self._levels[key]
+        shutil.rmtree(self.cache_dir / pyramid_id, ignore_errors=True)
+
+    def _build_lock(self, pyramid_id: str) -> threading.Lock:
+        with self._lock:
+            return self._build_locks.setdefault(pyramid_id, threading.Lock())
+
+    def describe(self, pyramid_id: str) -> Dict[str, Any]:
+        """
+        Returns the description of a registered pyramid (size, tile size, zoom levels)
+
+        Raises:
+            KeyError: Unknown id or source file gone
+        """
+        if not PYRAMID_ID.match(pyramid_id):
+            raise KeyError(pyramid_id)
+        with self._lock:
+            pending = self._pending.pop(pyramid_id, None)
+        if pending is not None:
+            try:
+                return self._create(*pending)
+            except OSError:
+                raise KeyError(pyramid_id)
+        meta = self._read_meta(pyramid_id)
+        if meta is None or not Path(meta["path"]).exists():
+            raise KeyError(pyramid_id)
+        stat = Path(meta["path"]).stat()
+        if (stat.st_size, stat.st_mtime) != (meta["file_size"], meta["mtime"]):
+            # Le fichier a été réécrit (nouvel empilement) : tuiles et dimensions à refaire
+            return self._create(Path(meta["path"]))
+        return {key: meta[key] for key in ("id", "width", "height", "tile_size", "max_zoom")}
+
+    # ===========================================
+    # Rendu
+    # ===========================================
+    def _render_levels(self, meta: Dict[str, Any], settings: Tuple) -> List[Optional[np.ndarray]]:
+        """Stretched full resolution image, lower levels are derived on demand"""
+        image = self._fits_manager.open_fits(meta["path"]).data
+        stretch, black_point = settings
+        levels: List[Optional[np.ndarray]] = [None] * (meta["max_zoom"] + 1)
+        levels[-1] = self._filters.stretch_to_uint8(image, stretch, black_point)
+        return levels
+
+    def _level(self, levels: List[Optional[np.ndarray]], z: int) -> np.ndarray:
+        if levels[z] is None:
+            upper = self._level(levels, z + 1)
+            h, w = upper.shape[:2]
+            levels[z] = cv2.resize(upper, ((w + 1) // 2, (h + 1) // 2), interpolation=cv2.INTER_AREA)
+        return levels[z]
+
+    def _get_levels(self, meta: Dict[str, Any], settings: Tuple) -> List[Optional[np.ndarray]]:
+        key = (meta["id"], settings)
+        with self._lock:
+            if key in self._levels:
+                self._levels.move_to_end(key)
+                return self._levels[key]
+        levels = self._render_levels(meta, settings)
+        with self._lock:
+            self._levels[key] = levels
+            while len(self._levels) > self.memory_pyramids:
+                self._levels.popitem(last=False)
+        return levels
+
+    def _encode_tile(self, level: np.ndarray, x: int, y: int) -> bytes:
+        size = self.tile_size
+        tile = level[y * size:(y + 1) * size, x * size:(x + 1) * size]
+        if tile.shape[0] != size or tile.shape[1] != size:
+            padded = np.zeros((size, size) + tile.shape[2:], dtype=np.uint8)
+            padded[:tile.shape[0], :tile.shape[1]] = tile
+            tile = padded
+        if tile.ndim == 3:
+            tile = cv2.cvtColor(tile, cv2.COLOR_RGB2BGR)
+        ok, buffer = cv2.imencode(".jpg", tile, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            raise ValueError("Unable to encode tile")
+        return buffer.tobytes()
+
+    def tile(self, pyramid_id: str, z: int, x: int, y: int, stretch: float, black_point: int) -> Path:
+        """
+        Returns the path of a tile, rendering it if it is not cached yet.
+
+        Args:
+            pyramid_id: Id returned by register()
+            z: Zoom level, 0 (whole image in one tile) to max_zoom (full resolution)
+            x, y: Tile column and row in the level
+            stretch, black_point: Stretch settings, tiles are cached per settings
+
+        Raises:
+            KeyError: Unknown pyramid
+            IndexError: Tile outside the pyramid
+        """
+        self.describe(pyramid_id)
+        meta = self._read_meta(pyramid_id)
+        if not 0 <= z <= meta["max_zoom"]:
+            raise IndexError(f"Zoom {z} outside [0, {meta['max_zoom']}]")
+        scale = 2 ** (meta["max_zoom"] - z)
+        columns = math.ceil(math.ceil(meta["width"] / scale) / self.tile_size)
+        rows = math.ceil(math.ceil(meta["height"] / scale) / self.tile_size)
+        if not (0 <= x < columns and 0 <= y < rows):
+            raise IndexError(f"Tile {x},{y} outside {columns}x{rows}")
+
+        settings = (float(stretch), int(black_point))
+        settings_dir = hashlib.sha1(repr(settings).encode()).hexdigest()[:8]
+        tile_path = self.cache_dir / pyramid_id / settings_dir / str(z) / f"{x}_{y}.jpg"
+        if tile_path.exists():
+            self._touch(tile_path.parent.parent)
+            return tile_path
+
+        with self._build_lock(pyramid_id):
+            if tile_path.exists():
+                return tile_path
+            levels = self._get_levels(meta, settings)
+            data = self._encode_tile(self._level(levels, z), x, y)
+            tile_path.parent.mkdir(parents=True, exist_ok=True)
+            temporary = tile_path.with_suffix(".tmp")
+            temporary.write_bytes(data)
+            os.replace(temporary, tile_path)
+            self._touch(tile_path.parent.parent)
+        self.prune()
+        return tile_path
+
+    # ===========================================
+    # Élagage du cache disque
+    # ===========================================
+    @staticmethod
+    def _touch(variant_dir: Path) -> None:
+        """Marks a settings variant as used (mtime of its directory)"""
+        try:
+            os.utime(variant_dir)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _tree_size(directory: Path) -> int:
+        total = 0
+        for root, _, files in os.walk(directory):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    def prune(self, force: bool = False) -> None:
+        """
+        Bounds the disk cache, at most once every PRUNE_INTERVAL seconds unless forced:
+        removes the pyramids whose source file is gone, the settings variants unused
+        for max_age seconds, then the least recently used variants while the cache
+        exceeds max_bytes, and the pyramids left without variant for max_age seconds.
+        """
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_prune < self.PRUNE_INTERVAL:
+                return
+            self._last_prune = now
+        if not self.cache_dir.exists():
+            return
+
+        variants = []
+        for pyramid_dir in self.cache_dir.iterdir():
+            if not pyramid_dir.is_dir() or not PYRAMID_ID.match(pyramid_dir.name):
+                continue
+            try:
+                meta = self._read_meta(pyramid_dir.name)
+                if meta is None and now - pyramid_dir.stat().st_mtime < self.PRUNE_INTERVAL:
+                    # Pyramide en cours de création
+                    continue
+                if meta is None or not Path(meta["path"]).exists():
+                    self._discard(pyramid_dir.name)
+                    continue
+                for variant_dir in pyramid_dir.iterdir():
+                    if variant_dir.is_dir():
+                        variants.append((variant_dir.stat().st_mtime, variant_dir))
+            except OSError:
+                continue
+
+        variants.sort()
+        kept = []
+        for mtime, variant_dir in variants:
+            if now - mtime > self.max_age:
+                shutil.rmtree(variant_dir, ignore_errors=True)
+            else:
+                kept.append((mtime, variant_dir, self._tree_size(variant_dir)))
+        total = sum(size for _, _, size in kept)
+        for _, variant_dir, size in kept:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(variant_dir, ignore_errors=True)
+            total -= size
+
+        for pyramid_dir in self.cache_dir.iterdir():
+            if not pyramid_dir.is_dir() or not PYRAMID_ID.match(pyramid_dir.name):
+                continue
+            try:
+                empty = not any(child.is_dir() for child in pyramid_dir.iterdir())
+                if empty and now - self._meta_path(pyramid_dir.name).stat().st_mtime > self.max_age:
+                    self._discard(pyramid_dir.name)
+            except OSError:
+                continue
+
+        with self._lock:
+            # Verrous des pyramides disparues (jamais ceux en cours d'utilisation)
+            for pyramid_id in [key for key, lock in self._build_locks.items()
+                               if not lock.locked() and not (self.cache_dir / key).exists()]:
+                del self._build_locks[pyramid_id]
+
+
+tile_pyramid = TilePyramid(
+    Path(CONFIG['global'].get("fits_storage_dir", "fits/")).resolve() / ".tiles",
+    tile_size=CONFIG['global'].get("zoom_tile_size", 256),
+    quality=CONFIG['global'].get("zoom_tile_quality", 85),
+    max_bytes=int(CONFIG['global'].get("zoom_tile_cache_size", 1024)) << 20,
+    max_age=CONFIG['global'].get("zoom_tile_cache_days", 7) * 86400,
+)
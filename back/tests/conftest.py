@@ -0,0 +1,14 @@
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def black_background_frame():
+    """Factory of frames whose median is 0: 70 % black background and a few bright stars"""
+    def make(shape=(200, 300), dtype=np.uint8, maximum=255):
+        rng = np.random.default_rng(0)
+        frame = np.zeros(shape, dtype=dtype)
+        stars = rng.random(frame.shape) > 0.7
+        frame[stars] = rng.integers(1, maximum, size=int(stars.sum())).astype(dtype)
+        return frame
+    return make
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from imageprocessing.fitsprocessor import FitsImageManager
+
+
+@pytest.mark.parametrize("method", ["auto", "numpy"])
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16, np.float32])
+@pytest.mark.parametrize("shape", [(60, 96), (60, 96, 3), (60, 96, 8)])
+@pytest.mark.parametrize("factor", [2, 3, 4])
+def test_bin_image_average_rounds_to_nearest(method, dtype, shape, factor):
+    rng = np.random.default_rng(0)
+    image = (rng.random(shape) * 200).astype(dtype)
+    binned = FitsImageManager.bin_image(image, factor, method=method)
+    h, w = 60 // factor, 96 // factor
+    exact = image[:h * factor, :w * factor].astype(np.float64).reshape(h, factor, w, factor, *shape[2:]).mean(axis=(1, 3))
+    assert binned.shape == exact.shape
+    assert binned.dtype == image.dtype
+    # Entiers : arrondi au plus proche, les égalités à .5 peuvent différer entre cv2 et numpy
+    tolerance = 0.5 if np.issubdtype(dtype, np.integer) else 1e-4
+    assert np.abs(binned - exact).max() <= tolerance
+
+
+def test_bin_image_bayer_keeps_pattern():
+    # Motif RGGB constant par plan : chaque plan binné garde sa valeur
+    image = np.tile(np.array([[10, 20], [30, 40]], dtype=np.uint16), (16, 24))
+    binned = FitsImageManager.bin_image(image, 2, bayer=True)
+    assert binned.shape == (16, 24)
+    np.testing.assert_array_equal(binned[:2, :2], [[10, 20], [30, 40]])
+    summed = FitsImageManager.bin_image(image, 2, mode='sum', bayer=True)
+    np.testing.assert_array_equal(summed[:2, :2], [[40, 80], [120, 160]])
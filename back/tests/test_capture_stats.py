@@ -0,0 +1,49 @@
+import pytest
+import services.capture_stats
+from services.capture_stats import CaptureStats
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(services.capture_stats, "perf_counter", lambda: now[0])
+    return now
+
+
+def test_dead_time_between_chained_exposures(clock):
+    stats = CaptureStats()
+    assert stats.summary()["efficiency"] is None
+    assert stats.exposure_started(10) is None
+    clock[0] += 10.5
+    assert stats.exposure_started(10) == pytest.approx(0.5)
+    clock[0] += 11.5
+    assert stats.exposure_started(10) == pytest.approx(1.5)
+    summary = stats.summary()
+    assert summary["frames"] == 3
+    assert summary["last_dead_time"] == pytest.approx(1.5)
+    assert summary["mean_dead_time"] == pytest.approx(1.0)
+    assert summary["max_dead_time"] == pytest.approx(1.5)
+    assert summary["efficiency"] == pytest.approx(20 / 22)
+
+
+def test_new_sequence_and_early_start(clock):
+    stats = CaptureStats()
+    stats.exposure_started(5)
+    stats.new_sequence()
+    clock[0] += 60
+    # Après un pointage, la première pose n'a pas de temps mort
+    assert stats.exposure_started(5) is None
+    clock[0] += 4
+    # Démarrage avant la fin annoncée (durée arrondie par le driver) : pas de temps mort négatif
+    assert stats.exposure_started(5) == 0.0
+
+
+def test_summary_covers_the_last_frames_only(clock):
+    stats = CaptureStats(window=2)
+    for dead_time in (3.0, 0.2, 0.2):
+        stats.exposure_started(1)
+        clock[0] += 1 + dead_time
+    stats.exposure_started(1)
+    summary = stats.summary()
+    assert summary["frames"] == 4
+    assert summary["max_dead_time"] == pytest.approx(0.2)
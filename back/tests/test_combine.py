@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from astropy.io import fits
+from imageprocessing.astrofilters import AstroFilters
+
+
+def _stack(count=5, shape=(37, 23)):
+    rng = np.random.default_rng(0)
+    images = [rng.normal(100, 5, shape).astype(np.float32) for _ in range(count)]
+    images[2][10, 10] = 5000  # rayon cosmique
+    return images
+
+
+def _clipped_mean(stack, sigma):
+    mean, std = stack.mean(axis=0), stack.std(axis=0)
+    return np.nanmean(np.where(np.abs(stack - mean) <= sigma * std, stack, np.nan), axis=0)
+
+
+def test_bands_match_the_whole_stack():
+    images = _stack()
+    stack = np.stack(images)
+    weights = [1, 2, 3, 2, 1]
+    # Budget minuscule : une bande d'une ligne à la fois
+    filters = AstroFilters(combine_memory_budget=1)
+    np.testing.assert_allclose(filters.combine_images_median(images), np.median(stack, axis=0))
+    np.testing.assert_allclose(filters.combine_images_mean(images), stack.mean(axis=0), rtol=1e-6)
+    np.testing.assert_allclose(filters.combine_images_mean(images, weights=weights),
+                               np.average(stack, axis=0, weights=weights), rtol=1e-6)
+    clipped = filters.combine_images_sigma_clip(images, sigma=1.5)
+    np.testing.assert_allclose(clipped, _clipped_mean(stack, 1.5), rtol=1e-6)
+    assert clipped[10, 10] < 200
+
+
+def test_files_are_read_by_bands(tmp_path):
+    images = _stack(3, shape=(19, 11, 3))
+    paths = []
+    for i, image in enumerate(images):
+        if i % 2:
+            path = tmp_path / f"frame{i}.npy"
+            np.save(path, image)
+        else:
+            # Les FITS couleur sont enregistrés canal en premier
+            path = tmp_path / f"frame{i}.fits"
+            fits.writeto(path, np.moveaxis(image, -1, 0))
+        paths.append(path)
+    result = AstroFilters(combine_memory_budget=2000).combine_images_median(paths)
+    np.testing.assert_allclose(result, np.median(np.stack(images), axis=0))
+
+
+def test_process_pool_matches_a_single_process():
+    images = _stack()
+    single = AstroFilters(combine_memory_budget=4000).combine_images_sigma_clip(images)
+    pooled = AstroFilters(combine_memory_budget=4000, combine_processes=2).combine_images_sigma_clip(images)
+    np.testing.assert_array_equal(pooled, single)
+
+
+def test_invalid_inputs_are_rejected():
+    filters = AstroFilters()
+    with pytest.raises(ValueError):
+        filters.combine_images_median([])
+    with pytest.raises(ValueError):
+        filters.combine_images_mean([np.zeros((4, 4)), np.zeros((4, 5))])
+    with pytest.raises(ValueError):
+        filters.combine_images_mean([np.zeros((4, 4))] * 2, weights=[1])
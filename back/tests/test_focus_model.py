@@ -0,0 +1,55 @@
+import pytest
+from services.configurator import CONFIG
+from services.focus_model import FocusModel
+
+
+@pytest.fixture
+def model(tmp_path, monkeypatch):
+    monkeypatch.setitem(CONFIG['global'], 'focuser_temperature_coefficient', -7)
+    return FocusModel(tmp_path / "focus_model.json")
+
+
+def test_empty_model_predicts_nothing(model):
+    assert model.fit("scope/cam") is None
+    assert model.predict("scope/cam", "L", 10) is None
+
+
+def test_slope_is_fitted_across_filters(model):
+    # position = intercept[filtre] - 20 * température, R est 50 pas plus loin que L
+    for temperature in (0, 5, 10):
+        model.add("scope/cam", "L", temperature, 10000 - 20 * temperature, 2.0)
+    model.add("scope/cam", "R", 4, 10050 - 20 * 4, 2.4)
+    model.add("other/cam", "L", 0, 500, None)
+    fit = model.fit("scope/cam")
+    assert fit.slope == pytest.approx(-20)
+    assert fit.intercepts == pytest.approx({"L": 10000, "R": 10050})
+    assert fit.fwhm == {"L": 2.0, "R": 2.4} and fit.count == 4
+    assert model.predict("scope/cam", "R", 8) == (10050 - 160, 2.4)
+    # Température inconnue : celle du dernier passage du filtre
+    assert model.predict("scope/cam", "L", None) == (10000 - 200, 2.0)
+
+
+def test_small_temperature_spread_uses_the_configured_coefficient(model):
+    model.add("scope/cam", "L", 10.0, 9000, 2.0)
+    model.add("scope/cam", "L", 10.5, 9010, 2.2)
+    fit = model.fit("scope/cam")
+    assert fit.slope == -7
+    # Le dernier passage fait foi
+    assert model.predict("scope/cam", "L", 12.5) == (9010 - 14, 2.1)
+
+
+def test_unfocused_filter_is_predicted_from_offsets(model):
+    model.add("scope/cam", "L", 5, 9000, 2.0)
+    offsets = model.filter_offsets("scope/cam", {"L": 0, "Ha": 120, "OIII": 80})
+    # Intercepts à 0 °C, les offsets configurés sont recalés sur celui de L
+    assert offsets == {"L": 9035, "Ha": 9155, "OIII": 9115}
+    assert model.predict("scope/cam", "Ha", 5, offsets) == (9120, 2.0)
+    assert model.predict("scope/cam", "SII", 5, offsets) is None
+
+
+def test_records_persist_and_expire(model, tmp_path):
+    model.add("scope/cam", "L", 5, 9000, 2.0)
+    reloaded = FocusModel(tmp_path / "focus_model.json")
+    assert reloaded.fit("scope/cam").intercepts == {"L": 9000 - (-7) * 5}
+    reloaded.records[0]["date"] = "2000-01-01T00.00.00"
+    assert reloaded.fit("scope/cam") is None
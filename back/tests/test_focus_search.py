@@ -0,0 +1,45 @@
+import logging
+import numpy as np
+from services.focuser import AutoFocusLib, FocusSearch
+
+CENTER = 10000
+RANGE = 250
+MIN_STEP = 12
+# Balayage fixe par défaut : range(current - 250, current + 250, 50)
+FIXED_SWEEP = 10
+
+
+def _run(focus, noise, rng):
+    """Runs a search on the V-curve sqrt(2.5² + (0.03 (x - focus))²), returns (exposures, error)"""
+    autofocus = AutoFocusLib()
+    autofocus.logger = logging.getLogger("test_focus_search")
+    search = FocusSearch(autofocus, CENTER, RANGE, min_step=MIN_STEP)
+    exposures, current = 0, CENTER
+    batch = search.next_positions()
+    while batch:
+        for position in batch:
+            search.record(position, 1 if position >= current else -1)
+            current = position
+            fwhm = np.hypot(2.5, 0.03 * (position - focus)) * (1 + rng.normal(0, noise))
+            autofocus.measurements.append({'focus_position': position, 'fwhm': fwhm, 'hfr': None, 'num_stars': 20, 'valid': True})
+            exposures += 1
+        batch = search.next_positions()
+    return exposures, abs(search.best_position() - focus)
+
+
+def test_focus_search_takes_half_the_exposures():
+    rng = np.random.default_rng(0)
+    runs = [_run(CENTER + offset, 0.02, rng) for offset in rng.uniform(-150, 150, 50)]
+    exposures = np.array([run[0] for run in runs])
+    errors = np.array([run[1] for run in runs])
+    assert exposures.max() <= 6
+    assert exposures.mean() <= FIXED_SWEEP / 2 + 0.5
+    assert np.median(errors) <= MIN_STEP / 2
+    assert errors.max() <= 2 * MIN_STEP
+
+
+def test_focus_search_extends_the_bracket():
+    rng = np.random.default_rng(1)
+    exposures, error = _run(CENTER + 420, 0.0, rng)
+    assert exposures <= 7
+    assert error <= 1
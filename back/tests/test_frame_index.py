@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+from astropy.io import fits
+from services.frame_index import FrameIndex
+
+
+def _write_frame(path, target="M31", exposure=30.0, temperature=-9.8, channels=1, date="2024-01-01T22:00:00"):
+    shape = (channels, 20, 30) if channels > 1 else (20, 30)
+    header = fits.Header({"OBJECT": target, "FILTER": "L", "EXPTIME": exposure, "GAIN": 100,
+                          "CCD-TEMP": temperature, "DATE-OBS": date})
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fits.writeto(path, np.zeros(shape, dtype=np.uint16), header, overwrite=True)
+    return path
+
+
+def test_add_from_file_reads_the_header(tmp_path):
+    index = FrameIndex(tmp_path / "frames.sqlite3")
+    path = _write_frame(tmp_path / "color.fits", channels=3)
+    index.add_from_file(path)
+    [frame] = index.find_frames(target="M31")
+    assert frame["path"] == str(path.resolve())
+    assert (frame["height"], frame["width"], frame["channels"]) == (20, 30, 3)
+    assert frame["exposure"] == 30.0 and frame["gain"] == 100
+
+
+def test_find_frames_matches_exposure_and_temperature_within_tolerance(tmp_path):
+    index = FrameIndex(tmp_path / "frames.sqlite3")
+    for name, exposure, temperature, date in (("a", 30.0, -9.8, "2024-01-01T22:02:00"),
+                                              ("b", 30.0004, -10.6, "2024-01-01T22:01:00"),
+                                              ("c", 60.0, -10.0, "2024-01-01T22:00:00"),
+                                              ("d", 30.0, -5.0, "2024-01-01T21:00:00")):
+        path = _write_frame(tmp_path / f"{name}.fits", exposure=exposure, temperature=temperature, date=date)
+        index.add_frame(path, fits.getheader(path), (20, 30))
+    frames = index.find_frames(exposure=30, temperature=-10)
+    assert [os.path.basename(frame["path"]) for frame in frames] == ["b.fits", "a.fits"]
+    assert index.find_frames(target="M42") == []
+
+
+def test_update_quality_ignores_unknown_metrics(tmp_path):
+    index = FrameIndex(tmp_path / "frames.sqlite3")
+    path = _write_frame(tmp_path / "a.fits")
+    index.add_from_file(path)
+    index.update_quality(path, fwhm=2.5, num_stars=120, airmass=1.2)
+    [frame] = index.find_frames()
+    assert frame["fwhm"] == 2.5 and frame["num_stars"] == 120 and frame["background"] is None
+
+
+def test_backfill_is_incremental(tmp_path):
+    index = FrameIndex(tmp_path / "frames.sqlite3")
+    root = tmp_path / "captures"
+    first = _write_frame(root / "night1" / "a.fit")
+    second = _write_frame(root / "night2" / "b.FITS")
+    (root / "notes.txt").write_text("not a frame")
+    assert index.backfill(root) == 2
+    assert index.backfill(root) == 0
+
+    _write_frame(first, target="M33")
+    os.utime(first, (1, 1))
+    second.unlink()
+    assert index.backfill(root) == 1
+    frames = index.find_frames()
+    assert [(frame["path"], frame["target"]) for frame in frames] == [(str(first.resolve()), "M33")]
+    assert index.backfill(tmp_path / "missing") == 0
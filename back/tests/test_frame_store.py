@@ -0,0 +1,79 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from services.frame_store import FrameStore
+
+
+def test_publish_stores_a_read_only_view():
+    store = FrameStore()
+    frame = np.zeros((4, 5), dtype=np.uint16)
+    version = store.publish(frame)
+    assert version == store.version == 1
+    snapshot_version, data = store.snapshot()
+    assert snapshot_version == 1 and np.shares_memory(data, frame)
+    assert not data.flags.writeable and frame.flags.writeable
+    assert store.publish(None) == 2 and store.data is None
+
+
+def test_product_is_built_once_per_version():
+    store = FrameStore()
+    calls = []
+    version = store.publish(np.ones(3))
+
+    def build():
+        calls.append(version)
+        return len(calls)
+
+    assert store.get_product(version, "stretch", build) == 1
+    assert store.get_product(version, "stretch", build) == 1
+    assert store.get_product(version, ("bin", 2), build) == 2
+    assert len(calls) == 2
+
+
+def test_concurrent_requests_share_one_build():
+    store = FrameStore()
+    version = store.publish(np.ones(3))
+    calls = []
+
+    def build():
+        calls.append(1)
+        time.sleep(0.05)
+        return object()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        products = list(executor.map(lambda _: store.get_product(version, "jpeg", build), range(8)))
+    assert len(calls) == 1
+    assert all(product is products[0] for product in products)
+
+
+def test_old_versions_and_least_recent_products_are_evicted():
+    store = FrameStore(max_products=2, keep_versions=2)
+    first = store.publish(np.ones(3))
+    store.get_product(first, "a", lambda: "a1")
+    second = store.publish(np.ones(3))
+    store.get_product(second, "a", lambda: "a2")
+    assert store.get_product(first, "a", lambda: "rebuilt") == "a1"
+    # Version 1 sort de la fenêtre keep_versions : son produit est oublié et n'est plus mis en cache
+    store.publish(np.ones(3))
+    assert store.get_product(first, "a", lambda: "rebuilt") == "rebuilt"
+    assert store.get_product(first, "a", lambda: "again") == "again"
+    third = store.version
+    store.get_product(third, "a", lambda: "a3")
+    store.get_product(third, "b", lambda: "b3")
+    # max_products = 2 : le produit le moins récemment utilisé (version 2) est évincé
+    assert store.get_product(second, "a", lambda: "rebuilt") == "rebuilt"
+
+
+def test_failed_build_is_not_cached():
+    store = FrameStore()
+    version = store.publish(np.ones(3))
+
+    def fail():
+        raise RuntimeError("decode error")
+
+    with pytest.raises(RuntimeError):
+        store.get_product(version, "png", fail)
+    assert store.get_product(version, "png", lambda: "ok") == "ok"
+    assert not store._pending
@@ -0,0 +1,43 @@
+import numpy as np
+from services.drivers.alpaca_client import ImageBufferPool
+
+
+def test_free_buffer_is_reused():
+    pool = ImageBufferPool(2)
+    view = pool.acquire(16)
+    buffer = view.obj
+    view.release()
+    # Un tampon plus grand que nécessaire sert aussi les sous-images
+    assert pool.acquire(8).obj is buffer
+    assert len(pool) == 1
+
+
+def test_buffer_referenced_by_an_image_is_not_reused():
+    pool = ImageBufferPool(2)
+    view = pool.acquire(16)
+    image = np.frombuffer(view, dtype=np.uint16)
+    view.release()
+    first = image.base.obj
+    assert ImageBufferPool.in_use(first)
+    other = pool.acquire(16)
+    assert other.obj is not first and len(pool) == 2
+    image2 = np.frombuffer(other, dtype=np.uint16)
+    other.release()
+    # Pool plein et tampons occupés : allocation hors pool
+    extra = pool.acquire(16)
+    assert extra.obj is not first and extra.obj is not image2.base.obj
+    assert len(pool) == 2
+    extra.release()
+    # L'image libérée rend son tampon au pool
+    del image
+    assert pool.acquire(16).obj is first
+
+
+def test_too_small_free_buffer_is_replaced():
+    pool = ImageBufferPool(1)
+    pool.acquire(8).release()
+    large = pool.acquire(32)
+    buffer = large.obj
+    assert len(large) == 32 and len(pool) == 1
+    large.release()
+    assert pool.acquire(32).obj is buffer
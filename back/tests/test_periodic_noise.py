@@ -0,0 +1,19 @@
+import numpy as np
+from imageprocessing.astrofilters import AstroFilters
+
+
+def _reference(image, threshold):
+    """Former complex fft2 implementation of the automatic detection"""
+    spectrum = np.fft.fftshift(np.fft.fft2(image))
+    magnitude = np.abs(spectrum)
+    mask = magnitude < (np.mean(magnitude) + threshold * np.max(magnitude))
+    return np.real(np.fft.ifft2(np.fft.ifftshift(spectrum * mask)))
+
+
+def test_remove_periodic_noise_odd_size_matches_fft2():
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[:301, :417]
+    image = 0.2 + 0.05 * rng.random((301, 417)) + 0.02 * np.sin(2 * np.pi * x / 7.3)
+    result = AstroFilters().remove_periodic_noise(image, threshold=0.01)
+    expected = _reference(image, 0.01)
+    assert np.abs(result - expected).max() < 1e-5
@@ -0,0 +1,37 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from imageprocessing.pipeline import FilterPipeline
+
+
+def test_mtf_then_gaussian_zero_median_has_no_nan(black_background_frame):
+    pipeline = FilterPipeline.from_spec([
+        {"name": "mtf", "params": {}},
+        {"name": "denoise_gaussian", "params": {"sigma": 1.0}},
+    ])
+    mono = black_background_frame((120, 160))
+    for frame in (mono, mono.astype(np.float32)):
+        result = pipeline.run(frame)
+        assert not np.isnan(result).any()
+
+
+def test_from_spec_rejects_unknown_params():
+    for spec in ({"name": "mtf", "params": {"target": 0.2}}, {"name": "denoise_gaussian", "params": {"radius": 2}},
+                 {"name": "normalize", "params": {"strength": 1}}):
+        with pytest.raises(ValueError):
+            FilterPipeline.from_spec([spec])
+    FilterPipeline.from_spec([{"name": "unsharp_masking", "params": {"radius": 2.0, "amount": 0.5}}])
+
+
+def test_concurrent_runs_share_a_pipeline():
+    pipeline = FilterPipeline.from_spec([
+        {"name": "mtf", "params": {}},
+        {"name": "denoise_gaussian", "params": {"sigma": 1.0}},
+    ])
+    rng = np.random.default_rng(1)
+    frames = [(rng.random((90, 110)) * 60000).astype(np.uint16) for _ in range(8)]
+    expected = [pipeline.run(frame, to_uint8=True) for frame in frames]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda frame: pipeline.run(frame, to_uint8=True), frames * 4))
+    for index, result in enumerate(results):
+        assert np.array_equal(result, expected[index % len(frames)])
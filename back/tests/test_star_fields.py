@@ -0,0 +1,53 @@
+from datetime import datetime, timezone
+
+import duckdb
+import numpy as np
+import pytest
+from services.star_fields import StarFieldIndex
+
+WHEN = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    """Catalogue synthétique : trois amas de densités différentes et une étoile au pôle"""
+    path = tmp_path / "stars.parquet"
+    duckdb.sql(f"""
+        COPY (
+            SELECT 100.5 AS ra_degrees, 60.5 AS dec_degrees FROM range(500)
+            UNION ALL SELECT 200.5, 30.5 FROM range(800)
+            UNION ALL SELECT 300.5, 70.5 FROM range(100)
+            UNION ALL SELECT 0.0, 90.0
+        ) TO '{path.as_posix()}' (FORMAT PARQUET)
+    """)
+    return path
+
+
+def test_density_is_built_then_read_from_the_cache(tmp_path, catalog):
+    cache = tmp_path / "cache" / "density.npy"
+    index = StarFieldIndex(cache, catalog)
+    density = index.density
+    assert density.shape == (180, 360) and cache.exists()
+    counts = np.load(cache)
+    assert counts.sum() == 1401 and counts[150, 100] == 500 and counts[179, 0] == 1
+    # Moyenne 3x3 : l'amas est réparti sur ses voisines (la surface des cellules diminue vers le pôle)
+    row, column = np.unravel_index(np.argmax(density), density.shape)
+    assert abs(row - 150) <= 1 and abs(column - 100) <= 1
+    assert density[150, 101] > 0 and density[150, 102] == 0
+    np.testing.assert_array_equal(StarFieldIndex(cache, tmp_path / "missing.parquet").density, density)
+
+
+def test_best_field_is_the_densest_cell_high_enough(tmp_path, catalog):
+    index = StarFieldIndex(tmp_path / "density.npy", catalog)
+    # Au pôle nord, l'altitude d'un champ est sa déclinaison : l'amas de 800 étoiles (30°) est trop bas
+    field = index.best_field(latitude=90, longitude=0, min_altitude=40, when=WHEN)
+    assert abs(field.ra * 15 - 100.5) <= 1 and abs(field.dec - 60.5) <= 1
+    assert field.altitude == pytest.approx(field.dec)
+    assert field.density == pytest.approx(index.density.max())
+
+
+def test_best_field_prefers_the_surroundings_of_the_target(tmp_path, catalog):
+    index = StarFieldIndex(tmp_path / "density.npy", catalog)
+    field = index.best_field(latitude=90, longitude=0, near=(300 / 15, 70), max_distance=10, when=WHEN)
+    assert abs(field.ra * 15 - 300.5) <= 1 and abs(field.dec - 70.5) <= 1
+    assert index.best_field(latitude=90, longitude=0, min_altitude=95, when=WHEN) is None
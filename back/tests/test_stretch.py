@@ -0,0 +1,31 @@
+import numpy as np
+from imageprocessing.astrofilters import Stretch
+
+
+def test_mtf_zero_midtones_maps_zero_to_zero():
+    x = np.array([0.0, 0.25, 1.0], dtype=np.float32)
+    for m in (0.0, 1.0):
+        result = Stretch._mtf(m, x)
+        assert not np.isnan(result).any()
+        assert result[0] == 0 and np.isclose(result[-1], 1)
+
+
+def test_stretch_zero_median_uint8_has_no_nan(black_background_frame):
+    frame = black_background_frame()
+    assert np.median(frame) == 0
+    result = Stretch().stretch(frame)
+    assert not np.isnan(result).any()
+    assert (result[frame == 0] == 0).all()
+
+
+def test_stretch_zero_median_float_has_no_nan(black_background_frame):
+    frame = black_background_frame().astype(np.float32)
+    result = Stretch().stretch(frame)
+    assert not np.isnan(result).any()
+    assert (result[frame == 0] == 0).all()
+
+
+def test_stretch_zero_median_rgb_has_no_nan(black_background_frame):
+    frame = np.dstack([black_background_frame(dtype=np.uint16, maximum=65535)] * 3)
+    result = Stretch().stretch(frame)
+    assert not np.isnan(result).any()
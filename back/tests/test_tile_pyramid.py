@@ -0,0 +1,49 @@
+import os
+import time
+import numpy as np
+from astropy.io import fits
+from services.tile_pyramid import TilePyramid
+
+
+def _frame(directory, name, shape=(300, 520)):
+    path = directory / name
+    fits.writeto(path, (np.random.default_rng(0).random(shape) * 60000).astype(np.uint16))
+    return path
+
+
+def test_register_is_lazy_and_keeps_only_latest(tmp_path):
+    pyramid = TilePyramid(tmp_path / ".tiles", tile_size=128)
+    ids = [pyramid.register(_frame(tmp_path, f"f{i}.fits"), kind="frame") for i in range(3)]
+    assert not (tmp_path / ".tiles").exists()
+    assert list(pyramid._pending) == [ids[-1]]
+    description = pyramid.describe(pyramid.latest["frame"])
+    assert (description["width"], description["height"], description["max_zoom"]) == (520, 300, 3)
+    assert (tmp_path / ".tiles" / ids[-1] / "meta.json").exists()
+
+
+def test_history_registration_keeps_latest(tmp_path):
+    pyramid = TilePyramid(tmp_path / ".tiles", tile_size=128)
+    latest = pyramid.register(_frame(tmp_path, "stacked.fits"), kind="stacked")
+    pyramid.register(_frame(tmp_path, "history.fits"), kind=None)
+    assert pyramid.latest["stacked"] == latest
+
+
+def test_prune_removes_stale_variants_and_pyramids(tmp_path):
+    pyramid = TilePyramid(tmp_path / ".tiles", tile_size=128, max_age=3600)
+    source = _frame(tmp_path, "f.fits")
+    pyramid_id = pyramid.register(source)
+    old = pyramid.tile(pyramid_id, 0, 0, 0, 0.2, 80).parent.parent
+    new = pyramid.tile(pyramid_id, 0, 0, 0, 0.5, 50).parent.parent
+    stale = time.time() - 7200
+    os.utime(old, (stale, stale))
+    pyramid.prune(force=True)
+    assert not old.exists() and new.exists()
+
+    pyramid.max_bytes = 0
+    pyramid.prune(force=True)
+    assert not new.exists()
+
+    source.unlink()
+    pyramid.prune(force=True)
+    assert not (tmp_path / ".tiles" / pyramid_id).exists()
+    assert pyramid_id not in pyramid._build_locks
@@ -0,0 +1,30 @@
+import warnings
+
+import numpy as np
+import pytest
+from imageprocessing.astrofilters import AstroFilters
+
+
+def _star_field(channels):
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[:600, :700]
+    base = 0.1 + 0.3 * np.exp(-((x - 350) ** 2 + (y - 300) ** 2) / (2 * 150 ** 2))
+    for _ in range(50):
+        cx, cy = rng.uniform(0, 700), rng.uniform(0, 600)
+        base += 0.5 * np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / (2 * 1.5 ** 2))
+    if channels == 1:
+        return (base + 0.002 * rng.standard_normal(base.shape)).astype(np.float32)
+    return np.stack([base * k + 0.002 * rng.standard_normal(base.shape) for k in (1, 0.8, 0.6)], -1).astype(np.float32)
+
+
+@pytest.mark.parametrize("channels", [1, 3])
+def test_wavelet_denoise_tiled_matches_whole_frame(channels):
+    image = _star_field(channels)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        tiled = AstroFilters(tile_size=256, workers=4).wavelet_denoise(image)
+        whole = AstroFilters(tile_size=0).wavelet_denoise(image)
+    assert tiled.shape == image.shape
+    correction = np.sqrt(np.mean((whole - image) ** 2))
+    difference = np.sqrt(np.mean((tiled - whole) ** 2))
+    assert difference < 0.1 * correction
@@ -1,5 +1,5 @@
 // services/api.ts
-import type { PlanType, DarkLibraryType, DarkLibraryProcessType, PlansHistory, ImageSettings, FhwmType, FwhmResults} from "../types/api.type";
+import type { PlanType, DarkLibraryType, DarkLibraryProcessType, PlansHistory, ImageSettings, ImageStats, TilePyramid, FhwmType, FwhmResults} from "../types/api.type";
 import type { ConfigItems } from "../store/config.type";
 import type {Field} from '../types/dynamicform.type'
 
@@ -190,6 +190,28 @@ export class ApiService {
 
   }
 
+  async getLastImageStats(stacked: boolean = false, bins: number = 256): Promise<ImageStats> {
+    return this.request<ImageStats>(`/observation/${stacked ? 'last_stacked_image' : 'last_image'}/stats?bins=${bins}`, {
+      method: 'GET',
+    });
+  }
+
+  async getLastTilePyramid(stacked: boolean = true): Promise<TilePyramid> {
+    return this.request<TilePyramid>(`/observation/tiles/last/${stacked ? 'stacked' : 'frame'}`, {
+      method: 'GET',
+    });
+  }
+
+  async getHistoryTilePyramid(index: number): Promise<TilePyramid> {
+    return this.request<TilePyramid>(`/observation/history/${index}/tiles`, {
+      method: 'GET',
+    });
+  }
+
+  getTileUrl(pyramid: TilePyramid, z: number, x: number, y: number): string {
+    return `${this.getBaseUrl()}/observation/tiles/${pyramid.id}/${z}/${x}/${y}.jpg`;
+  }
+
   async getCameras(): Promise<ConfigItems[]> {
     return this.request<ConfigItems[]>('/cameras', {
       method: 'GET'
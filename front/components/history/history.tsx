@@ -58,7 +58,7 @@ export default function History({ refreshKey }: { refreshKey: number }) {
                 </div>
                 {plan.jpg && plan.end &&(
                   <img
-                    src={apiService.getBaseUrl() + `/observation/history/${index}?t=${index}`}
+                    src={apiService.getBaseUrl() + `/observation/history/${index}?t=${index}&width=400&quality=80`}
                     alt="Miniature"
                     className="w-32 h-20 object-cover rounded border mt-2 md:mt-0 cursor-pointer"
                     onClick={() => setModalImage(apiService.getBaseUrl() + `/observation/history/${index}?t=${randomRef}i=${index}`)}
@@ -45,9 +45,43 @@ export interface PlanHistory {
 
 export type PlansHistory = PlanHistory[];
 
+export interface PipelineStep {
+  name: string;
+  params?: Record<string, number|string|boolean>;
+}
+
+export interface ChannelStats {
+  min: number;
+  max: number;
+  mean: number;
+  std: number;
+  median: number;
+  mad: number;
+  noise: number;
+  percentile_1: number;
+  percentile_99: number;
+  histogram: {min: number; max: number; counts: number[]};
+}
+
+export interface ImageStats {
+  version: number;
+  shape: number[];
+  dtype: string;
+  channels: ChannelStats[];
+}
+
+export interface TilePyramid {
+  id: string;
+  width: number;
+  height: number;
+  tile_size: number;
+  max_zoom: number;
+}
+
 export interface ImageSettings {
   stretch: number;
   black_point: number;
+  pipeline?: PipelineStep[] | null;
 }
 
 export type FhwmType = Record<string, number|string>|null;